@@ -0,0 +1,394 @@
+# analytics.py
+"""Historical traffic patterns from precomputed per-day aggregates.
+
+Observations are reduced to per-day aggregates. For each intersection and
+hour of the day, an aggregate holds the sums of vehicle counts and speeds,
+the number of observations, and a count per congestion level. A city's
+patterns (hour-of-day x day-of-week profiles, peaks, hotspots, road-class
+speeds) are then computed with NumPy from the aggregates of the analysis
+window, never from raw documents. The same aggregates give the hour-of-week
+baseline that incident detection (incidents.py) compares live traffic with.
+
+Aggregates come from two places:
+
+- Complete days are read from the Parquet training-data store
+  (training_data.py), projecting the needed columns. Each day is aggregated
+  once and kept, so a refresh only reads partitions exported since the last
+  one.
+- Days not exported yet (normally just today, or the whole window before the
+  first export) are grouped server-side by a MongoDB aggregation pipeline,
+  which returns at most one row per intersection, day and hour.
+
+The computed patterns are cached per city for refresh_seconds. With no
+observations at all, the profile the training data is generated from is
+used instead and reported as the source.
+"""
+import asyncio
+import logging
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence
+
+from offload import run_blocking
+
+logger = logging.getLogger(__name__)
+
+LEVELS = ["Low", "Medium", "High", "Critical"]
+DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# A peak hour carries this many standard deviations above the day's mean volume
+PEAK_THRESHOLD_STD = 0.75
+HOTSPOTS = 3
+
+
+class DayAggregate:
+    """Sums per intersection x hour for one day"""
+
+    __slots__ = ("vehicles", "speed", "count", "congestion")
+
+    def __init__(self, intersections: int):
+        import numpy as np
+        self.vehicles = np.zeros((intersections, 24))
+        self.speed = np.zeros((intersections, 24))
+        self.count = np.zeros((intersections, 24))
+        self.congestion = np.zeros((intersections, 24, len(LEVELS)))
+
+
+def aggregate_frame(frame, index: Dict[str, int]) -> Dict[date, DayAggregate]:
+    """Per-day aggregates of a columnar frame of observations (as stored by TrainingDataStore)"""
+    import numpy as np
+    import pandas as pd
+
+    positions = frame["intersection_id"].map(index)
+    frame = frame[positions.notna()]
+    positions = positions[positions.notna()].astype(int).to_numpy()
+    timestamps = pd.DatetimeIndex(frame["timestamp"])
+    hours = timestamps.hour.to_numpy()
+    levels = frame["congestion_level"].map({level: n for n, level in enumerate(LEVELS)}).fillna(1).astype(int).to_numpy()
+    days = timestamps.normalize()
+
+    aggregates = {}
+    for day in days.unique():
+        rows = np.flatnonzero(days == day)
+        aggregate = aggregates[day.date()] = DayAggregate(len(index))
+        at = (positions[rows], hours[rows])
+        np.add.at(aggregate.vehicles, at, frame["vehicle_count"].to_numpy()[rows])
+        np.add.at(aggregate.speed, at, frame["average_speed"].to_numpy()[rows])
+        np.add.at(aggregate.count, at, 1)
+        np.add.at(aggregate.congestion, at + (levels[rows],), 1)
+    return aggregates
+
+
+def aggregate_pipeline(city: str, since: datetime) -> List[Dict]:
+    """MongoDB pipeline grouping traffic_data by intersection, day and hour"""
+    return [
+        {"$match": {"city": city, "timestamp": {"$gte": since}}},
+        {"$group": {
+            "_id": {
+                "intersection_id": "$intersection_id",
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
+                "hour": {"$hour": "$timestamp"},
+            },
+            "vehicles": {"$sum": "$vehicle_count"},
+            "speed": {"$sum": "$average_speed"},
+            "count": {"$sum": 1},
+            **{level: {"$sum": {"$cond": [{"$eq": ["$congestion_level", level]}, 1, 0]}} for level in LEVELS},
+        }},
+    ]
+
+
+def aggregate_groups(groups: Sequence[Dict], index: Dict[str, int]) -> Dict[date, DayAggregate]:
+    """Per-day aggregates from the documents aggregate_pipeline returns"""
+    aggregates = {}
+    for group in groups:
+        key = group["_id"]
+        position = index.get(key["intersection_id"])
+        if position is None:
+            continue
+        day = date.fromisoformat(key["day"])
+        aggregate = aggregates.get(day) or aggregates.setdefault(day, DayAggregate(len(index)))
+        hour = key["hour"]
+        aggregate.vehicles[position, hour] += group["vehicles"]
+        aggregate.speed[position, hour] += group["speed"]
+        aggregate.count[position, hour] += group["count"]
+        aggregate.congestion[position, hour] += [group[level] for level in LEVELS]
+    return aggregates
+
+
+def peak_hours(volume) -> List[int]:
+    """Hours that are local maxima of a 24-hour volume profile and well above its mean"""
+    import numpy as np
+
+    if not np.any(volume):
+        return []
+    threshold = volume.mean() + PEAK_THRESHOLD_STD * volume.std()
+    previous, following = np.roll(volume, 1), np.roll(volume, -1)
+    return [int(h) for h in np.flatnonzero((volume >= previous) & (volume >= following) & (volume > threshold))]
+
+
+def _ratio(a, b):
+    import numpy as np
+    return np.divide(a, b, out=np.zeros_like(a, dtype=float), where=b > 0)
+
+
+def summarize(city: str, registry: Sequence[Dict], aggregates: Dict[date, DayAggregate], source: str) -> Dict:
+    """Patterns of a city from its per-day aggregates"""
+    import numpy as np
+
+    n = len(registry)
+    # (intersection, weekday, hour) cubes
+    vehicles, speed, count = np.zeros((n, 7, 24)), np.zeros((n, 7, 24)), np.zeros((n, 7, 24))
+    congestion = np.zeros((n, 7, 24, len(LEVELS)))
+    for day, aggregate in aggregates.items():
+        weekday = day.weekday()
+        vehicles[:, weekday] += aggregate.vehicles
+        speed[:, weekday] += aggregate.speed
+        count[:, weekday] += aggregate.count
+        congestion[:, weekday] += aggregate.congestion
+
+    city_count = count.sum(axis=0)
+    mean_vehicles = _ratio(vehicles.sum(axis=0), city_count)
+    mean_speed = _ratio(speed.sum(axis=0), city_count)
+    congested_share = _ratio(congestion[..., 2:].sum(axis=(0, 3)), city_count)
+    typical_level = congestion.sum(axis=0).argmax(axis=2)
+
+    weekday_volume = _ratio(vehicles[:, :5].sum(axis=(0, 1)), count[:, :5].sum(axis=(0, 1)))
+    weekend_volume = _ratio(vehicles[:, 5:].sum(axis=(0, 1)), count[:, 5:].sum(axis=(0, 1)))
+
+    # Hotspots: share of observations at High/Critical, and the worst slot of each
+    per_intersection = count.sum(axis=(1, 2))
+    shares = _ratio(congestion[..., 2:].sum(axis=(1, 2, 3)), per_intersection)
+    slot_shares = _ratio(congestion[..., 2:].sum(axis=3), count)
+    hotspots = []
+    for i in np.argsort(-shares, kind="stable")[:HOTSPOTS]:
+        worst_day, worst_hour = np.unravel_index(slot_shares[i].argmax(), slot_shares[i].shape)
+        hotspots.append({
+            "intersection_id": registry[i]["id"],
+            "name": registry[i]["name"],
+            "congested_share": round(float(shares[i]), 3),
+            "average_vehicle_count": round(float(_ratio(vehicles[i].sum(), per_intersection[i])), 1),
+            "average_speed": round(float(_ratio(speed[i].sum(), per_intersection[i])), 1),
+            "worst_time": {"day": DAY_NAMES[worst_day], "hour": int(worst_hour)},
+        })
+
+    # Road classes by volume: busiest third of intersections are main roads, quietest residential
+    volume_order = np.argsort(-_ratio(vehicles.sum(axis=(1, 2)), per_intersection), kind="stable")
+    road_speeds = {}
+    for road_class, members in zip(["main_roads", "secondary_roads", "residential"], np.array_split(volume_order, 3)):
+        road_speeds[road_class] = round(float(_ratio(speed[members].sum(), count[members].sum())), 1) if len(members) else None
+
+    days = sorted(aggregates)
+    return {
+        "city": city,
+        "source": source,
+        "time_period": {
+            "from": days[0].isoformat() if days else None,
+            "to": days[-1].isoformat() if days else None,
+            "days": len(days),
+            "observations": int(count.sum()),
+        },
+        "by_day_hour": {
+            "vehicle_count": np.round(mean_vehicles, 1).tolist(),
+            "average_speed": np.round(mean_speed, 1).tolist(),
+            "congested_share": np.round(congested_share, 3).tolist(),
+            "typical_congestion": [[LEVELS[level] for level in row] for row in typical_level],
+        },
+        "hourly_profile": {"weekday": np.round(weekday_volume, 1).tolist(), "weekend": np.round(weekend_volume, 1).tolist()},
+        "peak_hours": {"weekday": peak_hours(weekday_volume), "weekend": peak_hours(weekend_volume)},
+        "congestion_hotspots": hotspots,
+        "average_speeds": road_speeds,
+        "city_average": {
+            "vehicle_count": round(float(_ratio(vehicles.sum(), count.sum())), 1),
+            "average_speed": round(float(_ratio(speed.sum(), count.sum())), 1),
+            "congested_share": round(float(_ratio(congestion[..., 2:].sum(), count.sum())), 3),
+        },
+        "computed_at": datetime.utcnow().isoformat(),
+    }
+
+
+def hour_of_week_baseline(intersections: int, aggregates: Dict[date, DayAggregate]) -> Dict:
+    """Expected vehicle count and speed per intersection and hour of week (0 = Monday 00:00).
+
+    Hours never observed on that weekday use the same hour on any day, then
+    the city-wide mean of the hour of week.
+    """
+    import numpy as np
+
+    sums = {"vehicle_count": np.zeros((intersections, 7, 24)), "average_speed": np.zeros((intersections, 7, 24))}
+    count = np.zeros((intersections, 7, 24))
+    for day, aggregate in aggregates.items():
+        sums["vehicle_count"][:, day.weekday()] += aggregate.vehicles
+        sums["average_speed"][:, day.weekday()] += aggregate.speed
+        count[:, day.weekday()] += aggregate.count
+
+    baseline = {}
+    for field, total in sums.items():
+        expected = _ratio(total, count)
+        any_day = np.broadcast_to(_ratio(total.sum(axis=1), count.sum(axis=1))[:, None, :], expected.shape)
+        expected = np.where(count > 0, expected, any_day)
+        city_wide = np.broadcast_to(_ratio(total.sum(axis=0), count.sum(axis=0)), expected.shape)
+        expected = np.where(count.sum(axis=1, keepdims=True) > 0, expected, city_wide)
+        baseline[field] = expected.reshape(intersections, 7 * 24)
+    return baseline
+
+
+def next_peak(patterns: Dict, now: datetime) -> Optional[datetime]:
+    """Start of the next peak hour after now, from the weekday/weekend profiles"""
+    for offset in range(1, 24 * 7 + 1):
+        when = (now + timedelta(hours=offset)).replace(minute=0, second=0, microsecond=0)
+        if when.hour in patterns["peak_hours"]["weekend" if when.weekday() >= 5 else "weekday"]:
+            return when
+    return None
+
+
+def typical_congestion(patterns: Dict, when: datetime) -> str:
+    """Most common congestion level at this weekday and hour"""
+    return patterns["by_day_hour"]["typical_congestion"][when.weekday()][when.hour]
+
+
+def compare(patterns: Dict, other: Dict) -> Dict:
+    """How a city's averages and peaks compare with another city's"""
+    def change(key):
+        base = other["city_average"][key]
+        return round((patterns["city_average"][key] - base) / base * 100, 1) if base else None
+
+    def peak_volume(p):
+        profile = p["hourly_profile"]["weekday"]
+        return max(profile[h] for h in p["peak_hours"]["weekday"]) if p["peak_hours"]["weekday"] else max(profile, default=0)
+
+    base_peak = peak_volume(other)
+    return {
+        "city": other["city"],
+        "vehicle_count_difference_pct": change("vehicle_count"),
+        "average_speed_difference_pct": change("average_speed"),
+        "congested_share_difference": round(patterns["city_average"]["congested_share"]
+                                            - other["city_average"]["congested_share"], 3),
+        "peak_volume_difference_pct": round((peak_volume(patterns) - base_peak) / base_peak * 100, 1) if base_peak else None,
+    }
+
+
+def peak_periods(hours: Sequence[int]) -> List[str]:
+    """Consecutive peak hours as "HH:00-HH:00" periods"""
+    periods = []
+    for hour in sorted(hours):
+        if periods and periods[-1][1] == hour:
+            periods[-1][1] = hour + 1
+        else:
+            periods.append([hour, hour + 1])
+    return [f"{start:02d}:00-{end % 24:02d}:00" for start, end in periods]
+
+
+def pattern_insights(patterns: Dict, comparison: Optional[Dict] = None, other: Optional[Dict] = None) -> List[str]:
+    """Plain-language findings from the patterns"""
+    insights = []
+    weekday_peaks = peak_periods(patterns["peak_hours"]["weekday"])
+    if weekday_peaks:
+        insights.append(f"Weekday traffic in {patterns['city']} peaks {' and '.join(weekday_peaks)}.")
+    if patterns["source"] != "observed":
+        insights.append("No observed traffic has been aggregated yet; patterns follow the modelled daily profile.")
+        return insights
+
+    for hotspot in patterns["congestion_hotspots"][:2]:
+        if hotspot["congested_share"] > 0:
+            worst = hotspot["worst_time"]
+            insights.append(f"{hotspot['name']} is congested {hotspot['congested_share']:.0%} of the time, "
+                            f"worst on {worst['day']}s at {worst['hour']:02d}:00.")
+    if comparison and comparison["peak_volume_difference_pct"] is not None and (other or {}).get("source") == "observed":
+        difference = comparison["peak_volume_difference_pct"]
+        relation = "more" if difference >= 0 else "fewer"
+        insights.append(f"At weekday peaks {patterns['city']} carries {abs(difference):.0f}% {relation} "
+                        f"vehicles per intersection than {comparison['city']}.")
+    return insights
+
+
+class PatternAnalytics:
+    """Per-city pattern cache, refreshed incrementally from the store and MongoDB"""
+
+    def __init__(self, store, intersections: Dict[str, Sequence[Dict]], profile: Callable[[datetime], Dict],
+                 window_days: int = 90, refresh_seconds: float = 300, query_timeout: float = 5.0):
+        self.store = store
+        self.intersections = intersections
+        self.profile = profile
+        self.window_days = window_days
+        self.refresh_seconds = refresh_seconds
+        self.query_timeout = query_timeout
+        self._days: Dict[str, Dict[date, DayAggregate]] = {city: {} for city in intersections}
+        self._patterns: Dict[str, tuple] = {}
+        self._baselines: Dict[str, Dict] = {}
+        self._locks = {city: asyncio.Lock() for city in intersections}
+
+    def _index(self, city: str) -> Dict[str, int]:
+        return {i["id"]: n for n, i in enumerate(self.intersections[city])}
+
+    def load_partitions(self, city: str, since: date) -> int:
+        """Aggregate exported days not aggregated yet; returns how many were added"""
+        days = self._days[city]
+        new = [d for d in self.store.partitions(city) if d >= since and d not in days]
+        if not new:
+            return 0
+        frame = self.store.load(city, columns=["timestamp", "intersection_id", "vehicle_count",
+                                               "average_speed", "congestion_level"], since=new[0])
+        aggregates = aggregate_frame(frame, self._index(city))
+        for day in new:
+            days[day] = aggregates.get(day) or DayAggregate(len(self.intersections[city]))
+        return len(new)
+
+    async def _recent(self, city: str, db, since: date) -> Dict[date, DayAggregate]:
+        """Aggregates of days not in the store yet, grouped by MongoDB"""
+        cursor = db.traffic_data.aggregate(aggregate_pipeline(city, datetime.combine(since, datetime.min.time())))
+        groups = await asyncio.wait_for(cursor.to_list(None), self.query_timeout)
+        return aggregate_groups(groups, self._index(city))
+
+    def _profile_aggregates(self, city: str, today: date) -> Dict[date, DayAggregate]:
+        """One synthetic week from the generating profile, for cities with no observations"""
+        aggregates = {}
+        for offset in range(7):
+            day = today - timedelta(days=offset + 1)
+            aggregate = aggregates[day] = DayAggregate(len(self.intersections[city]))
+            for hour in range(24):
+                profile = self.profile(datetime.combine(day, datetime.min.time()) + timedelta(hours=hour))
+                aggregate.vehicles[:, hour] = profile["vehicle_count"]
+                aggregate.speed[:, hour] = profile["average_speed"]
+                aggregate.count[:, hour] = 1
+                aggregate.congestion[:, hour, LEVELS.index(profile["congestion_level"])] = 1
+        return aggregates
+
+    async def patterns(self, city: str, db=None) -> Dict:
+        """The city's patterns, recomputed at most every refresh_seconds"""
+        cached = self._patterns.get(city)
+        if cached and time.monotonic() - cached[0] < self.refresh_seconds:
+            return cached[1]
+
+        async with self._locks[city]:
+            cached = self._patterns.get(city)
+            if cached and time.monotonic() - cached[0] < self.refresh_seconds:
+                return cached[1]
+
+            today = datetime.utcnow().date()
+            window_start = today - timedelta(days=self.window_days)
+            days = self._days[city]
+            for old in [d for d in days if d < window_start]:
+                del days[old]
+            await run_blocking("cpu", self.load_partitions, city, window_start)
+
+            aggregates = {d: a for d, a in days.items() if d >= window_start}
+            if db is not None:
+                since = max(max(aggregates) + timedelta(days=1) if aggregates else window_start, window_start)
+                try:
+                    aggregates.update(await self._recent(city, db, since))
+                except Exception as e:
+                    logger.warning(f"Could not aggregate recent {city} traffic: {e!r}")
+
+            source = "observed"
+            if not aggregates:
+                aggregates, source = self._profile_aggregates(city, today), "historical_profile"
+            patterns = await run_blocking("cpu", summarize, city, self.intersections[city], aggregates, source)
+            self._baselines[city] = await run_blocking(
+                "cpu", hour_of_week_baseline, len(self.intersections[city]), aggregates)
+            self._patterns[city] = (time.monotonic(), patterns)
+            return patterns
+
+    async def baseline(self, city: str, db=None) -> Dict:
+        """hour_of_week_baseline of the same aggregates as the city's patterns"""
+        await self.patterns(city, db)
+        return self._baselines[city]
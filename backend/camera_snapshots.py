@@ -0,0 +1,96 @@
+# camera_snapshots.py
+"""Camera thumbnails taken from the HLS segments already on disk.
+
+A camera tile does not need a live stream: the latest completed segment of
+the camera's playlist starts with a keyframe, and FFmpeg can decode that
+single frame (-skip_frame nokey), scale it and encode it as JPEG or WebP
+without touching the RTSP source. Thumbnails are cached per segment, size
+and format, so every tile showing a camera shares one extraction per
+segment, and the cache key doubles as the ETag.
+"""
+import asyncio
+import collections
+import hashlib
+import subprocess
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+FORMATS = {"jpeg": ("mjpeg", "image/jpeg"), "webp": ("libwebp", "image/webp")}
+# FFmpeg quality per format: mjpeg's -q:v runs 2 (best) to 31, libwebp's 0 to 100 (best)
+QUALITY = {"jpeg": ["-q:v", "5"], "webp": ["-quality", "75"]}
+
+
+def latest_segment(playlist: Path) -> Optional[Path]:
+    """The newest complete media segment listed in an HLS playlist"""
+    try:
+        lines = playlist.read_text().splitlines()
+    except OSError:
+        return None
+    # Segment URIs are the non-tag lines; partial segments (LL-HLS) only appear in tags
+    uris = [line.strip() for line in lines if line.strip() and not line.startswith("#")]
+    if not uris:
+        return None
+    latest = playlist.parent / uris[-1].split("?")[0]
+    if latest.suffix == ".m3u8":
+        # A master playlist: its last variant is the lowest rendition, the cheapest to decode
+        return latest_segment(latest)
+    return latest
+
+
+def extract_keyframe(segment: Path, width: int, image_format: str) -> bytes:
+    """First keyframe of a segment, scaled to `width`, as a JPEG or WebP image"""
+    codec, _ = FORMATS[image_format]
+    cmd = [
+        "ffmpeg", "-v", "error",
+        "-skip_frame", "nokey",
+        "-i", str(segment),
+        "-frames:v", "1",
+        "-vf", f"scale={width}:-2",
+        "-c:v", codec, *QUALITY[image_format],
+        "-f", "image2pipe", "pipe:1",
+    ]
+    result = subprocess.run(cmd, capture_output=True, timeout=10)
+    if result.returncode != 0 or not result.stdout:
+        raise RuntimeError(result.stderr.decode(errors="replace").strip() or "no frame decoded")
+    return result.stdout
+
+
+class CameraSnapshots:
+    """Per-segment thumbnail cache with one extraction in flight per key"""
+
+    def __init__(self, stream_dir: Path, extract: Callable[[Path, int, str], Awaitable[bytes]],
+                 max_entries: int = 256):
+        self.stream_dir = stream_dir
+        self.extract = extract
+        self.max_entries = max_entries
+        self._images: "collections.OrderedDict[str, bytes]" = collections.OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    def current(self, cam_id: str, width: int, image_format: str) -> Optional[Tuple[Path, str]]:
+        """The camera's latest segment and the ETag of its thumbnail, or None before any video"""
+        segment = latest_segment(self.stream_dir / f"{cam_id}.m3u8")
+        if segment is None:
+            return None
+        # Segment names are reused once the playlist wraps; the mtime tells the versions apart
+        try:
+            stat = segment.stat()
+        except OSError:  # deleted by FFmpeg since the playlist was read
+            return None
+        key = f"{cam_id}:{segment.name}:{stat.st_mtime_ns}:{stat.st_size}:{width}:{image_format}"
+        return segment, hashlib.sha1(key.encode()).hexdigest()[:20]
+
+    async def image(self, segment: Path, etag: str, width: int, image_format: str) -> bytes:
+        if etag in self._images:
+            self._images.move_to_end(etag)
+            return self._images[etag]
+        if etag not in self._pending:
+            self._pending[etag] = asyncio.ensure_future(self.extract(segment, width, image_format))
+        try:
+            image = await asyncio.shield(self._pending[etag])
+        finally:
+            if self._pending.get(etag) is not None and self._pending[etag].done():
+                self._pending.pop(etag, None)
+        self._images[etag] = image
+        while len(self._images) > self.max_entries:
+            self._images.popitem(last=False)
+        return image
@@ -0,0 +1,273 @@
+# chat_gateway.py
+"""Chat gateway between /api/chat and the LLM backend.
+
+A question goes through these steps:
+
+1. The city and the intersections it mentions are resolved, e.g. "how is
+   traffic at Circle" -> Accra, ACC_002.
+2. The response cache is checked. Its key is the question's content words,
+   with intersection names replaced by their ids, plus the id of the city
+   snapshot the answer was based on. So "How's traffic at Circle?" and
+   "traffic at kwame nkrumah circle" share an entry until the snapshot
+   refreshes.
+3. A compact context is built from the city snapshot: one summary line,
+   plus one line per mentioned or most congested intersection. Snapshots
+   come from the shared SnapshotCache (snapshots.py), so every chat between
+   two refreshes uses the same one.
+4. The backend is called under a concurrency limit, with a timeout for the
+   first token and another for the whole reply. Its tokens are streamed to
+   the caller as they arrive.
+
+Backends: GeminiBackend (google-generativeai, imported on first use) and
+FakeBackend, which answers from the context alone so that the whole path
+runs offline and in tests.
+"""
+import asyncio
+import collections
+import logging
+import re
+import time
+from typing import AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+import metrics
+from snapshots import Snapshot, SnapshotCache
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = (
+    "You are the assistant of a traffic management system for Accra and Kumasi, Ghana. "
+    "Answer briefly and concretely from the traffic snapshot given with each question; "
+    "if the snapshot does not cover something, say so rather than guessing."
+)
+
+# Words that don't change what a traffic question asks for
+STOPWORDS = frozenset("""
+    a an and any are at be can could currently do does for from how how's hows i in is it it's its
+    like look looking me my near now of on please right s show tell the there this to today what
+    what's whats with would you
+""".split())
+
+# Name words shared by many intersections, which don't identify one
+GENERIC_NAME_WORDS = frozenset(["junction", "market", "roundabout", "station"])
+
+# Intersections given in full in the context besides the ones asked about
+CONTEXT_HOTSPOTS = 3
+
+CONGESTION_RANK = {"Critical": 3, "High": 2, "Medium": 1, "Low": 0}
+
+
+class ChatBusy(Exception):
+    """No backend slot became free within the queue timeout"""
+
+
+class ChatTimeout(Exception):
+    """The backend did not answer in time"""
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9']+", text.lower())
+
+
+class ChatBackend:
+    """Streams the reply to a prompt"""
+
+    name = "base"
+
+    def stream(self, prompt: str) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+
+class GeminiBackend(ChatBackend):
+    """Google Gemini through google-generativeai's async streaming API"""
+
+    name = "gemini"
+
+    def __init__(self, get_genai: Callable, model_name: str = "gemini-1.5-flash"):
+        self._get_genai = get_genai
+        self.model_name = model_name
+        self._model = None
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        if self._model is None:
+            genai = self._get_genai()
+            if genai is None:
+                raise RuntimeError("Gemini is not configured (GEMINI_API_KEY)")
+            # The system prompt is fixed, so it is a stable prefix across requests
+            self._model = genai.GenerativeModel(self.model_name, system_instruction=SYSTEM_PROMPT)
+        response = await self._model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:  # chunk without text parts (e.g. safety stop)
+                continue
+            if text:
+                yield text
+
+
+class FakeBackend(ChatBackend):
+    """Offline backend: restates the snapshot lines of the prompt, a word at a time"""
+
+    name = "fake"
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = 0
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        self.calls += 1
+        context, _, _ = prompt.partition("\nQuestion:")
+        lines = context.strip().splitlines()
+        answer = f"{lines[0]} " + " ".join(line.strip() + "." for line in lines[1:])
+        for n, word in enumerate(answer.split(" ")):
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            yield word if n == 0 else " " + word
+
+
+class ResponseCache:
+    """LRU of complete replies by normalised question and snapshot"""
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries: "collections.OrderedDict[tuple, str]" = collections.OrderedDict()
+
+    def get(self, key: tuple) -> Optional[str]:
+        reply = self._entries.get(key)
+        if reply is not None:
+            self._entries.move_to_end(key)
+        return reply
+
+    def put(self, key: tuple, reply: str):
+        self._entries[key] = reply
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ChatGateway:
+    """Answers traffic questions through a backend, with caching, limits and timeouts"""
+
+    def __init__(self, backend: ChatBackend, snapshots: SnapshotCache, intersections: Dict[str, Sequence[Dict]],
+                 cache_entries: int = 512, max_concurrency: int = 8, queue_timeout: float = 2.0,
+                 first_token_timeout: float = 10.0, timeout: float = 30.0):
+        self.backend = backend
+        self.snapshots = snapshots
+        self.intersections = intersections
+        self.cache = ResponseCache(cache_entries)
+        self.queue_timeout = queue_timeout
+        self.first_token_timeout = first_token_timeout
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(max_concurrency)
+        # Distinctive name words -> (city, intersection id)
+        self._aliases = {
+            word: (city, i["id"])
+            for city, registry in intersections.items() for i in registry
+            for word in _words(i["name"]) if word not in GENERIC_NAME_WORDS
+        }
+
+    def resolve(self, message: str, city: Optional[str] = None) -> Tuple[str, List[str], tuple]:
+        """City, mentioned intersection ids and cache key terms of a question"""
+        terms, mentioned, cities = set(), [], []
+        for word in _words(message):
+            if word.capitalize() in self.intersections:
+                cities.append(word.capitalize())
+            elif word in self._aliases:
+                alias_city, intersection_id = self._aliases[word]
+                cities.append(alias_city)
+                if intersection_id not in mentioned:
+                    mentioned.append(intersection_id)
+                terms.add(intersection_id)
+            elif word not in STOPWORDS:
+                terms.add(word.rstrip("s") if len(word) > 3 else word)
+        city = city or (cities[0] if cities else next(iter(self.intersections)))
+        mentioned = [i for i in mentioned if any(x["id"] == i for x in self.intersections[city])]
+        return city, mentioned, tuple(sorted(terms))
+
+    def context(self, snapshot: Snapshot, mentioned: Sequence[str]) -> str:
+        """Compact text form of the snapshot: a summary, then the relevant intersections"""
+        records = snapshot.records
+        names = {i["id"]: i["name"] for i in self.intersections[snapshot.city]}
+        congested = sum(1 for r in records if r["congestion_level"] in ("High", "Critical"))
+        average_speed = sum(r["average_speed"] for r in records) / len(records) if records else 0.0
+        lines = [f"Traffic in {snapshot.city} at {snapshot.taken_at:%H:%M} UTC: {len(records)} intersections, "
+                 f"{congested} with high or critical congestion, average speed {average_speed:.1f} km/h"]
+
+        hotspots = sorted(records, key=lambda r: (-CONGESTION_RANK.get(r["congestion_level"], 0), r["average_speed"]))
+        wanted = [r for i in mentioned for r in records if r["intersection_id"] == i]
+        wanted += [r for r in hotspots[:CONTEXT_HOTSPOTS] if r not in wanted]
+        for r in wanted:
+            lines.append(f"- {names.get(r['intersection_id'], r['intersection_id'])}: {r['congestion_level']} "
+                         f"congestion, {r['vehicle_count']} vehicles, {r['average_speed']:.1f} km/h")
+        return "\n".join(lines)
+
+    async def stream(self, message: str, city: Optional[str] = None) -> AsyncIterator[Dict]:
+        """Events of one answer: {"delta": text}... then {"done": True, ...}"""
+        city, mentioned, terms = self.resolve(message, city)
+        snapshot = self.snapshots.get(city)
+        key = (snapshot.id, terms)
+        done = {"done": True, "city": city, "snapshot_at": snapshot.taken_at.isoformat()}
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            metrics.CHAT_REQUESTS.labels("cache_hit").inc()
+            yield {"delta": cached}
+            yield {**done, "cached": True}
+            return
+
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            metrics.CHAT_REQUESTS.labels("rejected").inc()
+            raise ChatBusy()
+
+        prompt = f"{self.context(snapshot, mentioned)}\nQuestion: {message.strip()}"
+        parts = []
+        started = time.monotonic()
+        deadline = started + self.timeout
+        chunks = self.backend.stream(prompt).__aiter__()
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                wait = min(remaining, self.first_token_timeout) if not parts else remaining
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), max(wait, 0))
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    metrics.CHAT_REQUESTS.labels("timeout").inc()
+                    raise ChatTimeout()
+                if not parts:
+                    metrics.CHAT_FIRST_TOKEN.labels(self.backend.name).observe(time.monotonic() - started)
+                parts.append(chunk)
+                yield {"delta": chunk}
+        except (ChatTimeout, GeneratorExit, asyncio.CancelledError):
+            raise
+        except Exception as e:
+            metrics.CHAT_REQUESTS.labels("error").inc()
+            logger.error(f"Chat backend {self.backend.name} failed: {e}")
+            raise
+        finally:
+            self._slots.release()
+            aclose = getattr(chunks, "aclose", None)
+            if aclose is not None:
+                try:
+                    await aclose()
+                except Exception:
+                    pass
+
+        self.cache.put(key, "".join(parts))
+        metrics.CHAT_REQUESTS.labels("ok").inc()
+        yield {**done, "cached": False}
+
+    async def reply(self, message: str, city: Optional[str] = None) -> Dict:
+        """The whole answer at once"""
+        parts, done = [], {}
+        async for event in self.stream(message, city):
+            if "delta" in event:
+                parts.append(event["delta"])
+            else:
+                done = event
+        return {"reply": "".join(parts), "city": done.get("city"), "cached": done.get("cached", False)}
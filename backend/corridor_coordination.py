@@ -0,0 +1,162 @@
+# corridor_coordination.py
+"""Green-wave coordination for signals along a corridor.
+
+All signals on a corridor share one cycle length; the solver picks that
+cycle and an offset per signal so that a platoon travelling at the
+predicted link speed meets as much green as possible in both directions
+(the green "bandwidth"). Time is discretised to one-second bins and each
+signal's green is a boolean mask over the cycle, so trying every offset of
+one signal against the rest of the corridor is a single NumPy operation.
+Offsets are improved by coordinate descent from a few seeded starts, which
+keeps a 20+ signal corridor well under a second per cycle length.
+"""
+import math
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from signal_optimizer import MAX_CYCLE
+
+# Roads are longer than the straight line between junctions
+ROAD_CIRCUITY = 1.25
+CYCLE_STEP = 5
+MAX_CYCLE_EXTENSION = 40
+MAX_SWEEPS = 8
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance between two points in km"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 6371.0 * 2 * math.asin(math.sqrt(a))
+
+
+def link_travel_time(start: Dict, end: Dict, speed_kmh: float) -> float:
+    """Travel time in seconds along the road between two intersections"""
+    distance = haversine_km(start["lat"], start["lng"], end["lat"], end["lng"]) * ROAD_CIRCUITY
+    return distance / max(speed_kmh, 5.0) * 3600
+
+
+class CorridorCoordinator:
+    """Choose a common cycle and offsets that maximise two-way green bandwidth"""
+
+    def __init__(self, inbound_weight: float = 1.0, time_budget_s: float = 5.0):
+        self.inbound_weight = inbound_weight
+        self.time_budget_s = time_budget_s
+
+    @staticmethod
+    def _green_masks(green: np.ndarray, cycle: int) -> np.ndarray:
+        """(signals, cycle) boolean masks with green starting at bin 0"""
+        bins = np.arange(cycle)
+        return bins[None, :] < green[:, None]
+
+    @staticmethod
+    def _shifted(masks: np.ndarray, shifts: np.ndarray, cycle: int) -> np.ndarray:
+        """Rotate each signal's mask right by its own shift"""
+        bins = np.arange(cycle)
+        idx = (bins[None, :] - shifts[:, None]) % cycle
+        return np.take_along_axis(masks, idx, axis=1)
+
+    def _bandwidths(self, masks: np.ndarray, offsets: np.ndarray, arrivals_out: np.ndarray,
+                    arrivals_in: np.ndarray, cycle: int):
+        out = self._shifted(masks, (offsets - arrivals_out) % cycle, cycle).all(axis=0).sum()
+        inb = self._shifted(masks, (offsets - arrivals_in) % cycle, cycle).all(axis=0).sum()
+        return int(out), int(inb)
+
+    def _solve_cycle(self, green_ratio: np.ndarray, travel: np.ndarray, cycle: int) -> Dict[str, Any]:
+        n = len(green_ratio)
+        green = np.maximum(1, np.round(green_ratio * cycle)).astype(int)
+        masks = self._green_masks(green, cycle)
+
+        # Platoon arrival time at each signal, measured from the first (outbound) or last (inbound)
+        arrivals_out = np.round(np.concatenate([[0.0], np.cumsum(travel)])).astype(int)
+        arrivals_in = arrivals_out[-1] - arrivals_out
+
+        # Every possible offset of one signal, as a (cycle offsets, cycle bins) index table
+        bins = np.arange(cycle)
+        candidates = np.arange(cycle)
+
+        starts = [
+            arrivals_out % cycle,                                   # perfect outbound wave
+            arrivals_in % cycle,                                    # perfect inbound wave
+            ((arrivals_out - arrivals_in) // 2) % cycle,            # split the difference
+        ]
+
+        best = None
+        for offsets in starts:
+            offsets = offsets.astype(int).copy()
+            for _ in range(MAX_SWEEPS):
+                improved = False
+                for i in range(n):
+                    others = np.arange(n) != i
+                    placed_out = self._shifted(masks, (offsets - arrivals_out) % cycle, cycle)
+                    placed_in = self._shifted(masks, (offsets - arrivals_in) % cycle, cycle)
+                    neighbours = [j for j in (i - 1, i + 1) if 0 <= j < n]
+
+                    # Signal i's mask rotated by every candidate offset at once
+                    own_out = masks[i][(bins[None, :] - (candidates[:, None] - arrivals_out[i])) % cycle]
+                    own_in = masks[i][(bins[None, :] - (candidates[:, None] - arrivals_in[i])) % cycle]
+
+                    # Through bandwidth dominates; progression to the adjacent signals
+                    # breaks ties and keeps the search moving while the band is still empty
+                    band = (own_out & placed_out[others].all(axis=0)).sum(axis=1) \
+                        + self.inbound_weight * (own_in & placed_in[others].all(axis=0)).sum(axis=1)
+                    local = sum((own_out & placed_out[j]).sum(axis=1)
+                                + self.inbound_weight * (own_in & placed_in[j]).sum(axis=1) for j in neighbours)
+                    scores = band * (2 * cycle) + local
+
+                    choice = int(np.argmax(scores))
+                    if scores[choice] > scores[offsets[i]]:
+                        offsets[i] = choice
+                        improved = True
+                if not improved:
+                    break
+
+            out_band, in_band = self._bandwidths(masks, offsets, arrivals_out, arrivals_in, cycle)
+            total = out_band + self.inbound_weight * in_band
+            if best is None or total > best["score"]:
+                best = {"score": total, "offsets": offsets, "outbound": out_band, "inbound": in_band}
+
+        # Offsets are reported relative to the first signal's green start
+        offsets = (best["offsets"] - best["offsets"][0]) % cycle
+        return {
+            "cycle_length": cycle,
+            "offsets": offsets.tolist(),
+            "green": green.tolist(),
+            "outbound_bandwidth": best["outbound"],
+            "inbound_bandwidth": best["inbound"],
+        }
+
+    def solve(self, green_ratios: List[float], travel_times: List[float],
+              min_cycle: float, max_cycle: Optional[float] = None) -> Dict[str, Any]:
+        """Coordinate a corridor
+
+        green_ratios: arterial green / cycle for each signal, in corridor order
+        travel_times: link travel time in seconds between consecutive signals
+        min_cycle: shortest cycle that still serves the critical intersection
+        """
+        if len(travel_times) != len(green_ratios) - 1:
+            raise ValueError("Need one travel time per link between consecutive signals")
+
+        started = time.perf_counter()
+        green_ratio = np.clip(np.asarray(green_ratios, dtype=float), 0.1, 0.9)
+        travel = np.asarray(travel_times, dtype=float)
+
+        low = int(math.ceil(min_cycle / CYCLE_STEP) * CYCLE_STEP)
+        high = int(min(max_cycle or MAX_CYCLE, low + MAX_CYCLE_EXTENSION))
+        cycles = list(range(low, max(low, high) + 1, CYCLE_STEP))
+
+        results = []
+        for cycle in cycles:
+            if results and time.perf_counter() - started > self.time_budget_s:
+                break
+            result = self._solve_cycle(green_ratio, travel, cycle)
+            result["efficiency"] = (result["outbound_bandwidth"] + result["inbound_bandwidth"]) / (2 * cycle)
+            results.append(result)
+
+        # Longer cycles add delay at every junction, so they must earn their bandwidth
+        best = max(results, key=lambda r: r["efficiency"] - 0.002 * (r["cycle_length"] - low))
+        best["cycles_evaluated"] = len(results)
+        best["computation_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return best
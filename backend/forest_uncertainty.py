@@ -0,0 +1,63 @@
+# forest_uncertainty.py
+"""Per-tree outputs of fitted random forests in one vectorized pass.
+
+A forest's prediction is the mean of its trees' predictions, so the spread
+of the trees comes for free with the point estimate: forest.apply() finds
+every sample's leaf in every tree, and a leaf-value table gathered with
+those indices gives the whole (samples x trees) matrix at once. The mean of
+that matrix is exactly forest.predict() / predict_proba(), so intervals and
+confidence cost no extra model evaluations.
+
+NumPy is imported lazily like the rest of the ML stack.
+"""
+from typing import Dict, Sequence, Tuple
+
+
+class ForestLeafTable:
+    """Leaf values of every tree in a fitted RandomForestRegressor/Classifier"""
+
+    def __init__(self, forest):
+        import numpy as np
+
+        self.forest = forest
+        trees = [estimator.tree_ for estimator in forest.estimators_]
+        max_nodes = max(tree.node_count for tree in trees)
+        # tree_.value is (nodes, outputs, classes); single-output forests only
+        width = trees[0].value.shape[2]
+
+        values = np.zeros((len(trees), max_nodes, width), dtype=np.float64)
+        for i, tree in enumerate(trees):
+            leaf_values = tree.value[:, 0, :]
+            if width > 1:
+                # Classifier leaves hold class counts (or weighted fractions); normalise
+                # to per-tree class probabilities, as predict_proba does
+                totals = leaf_values.sum(axis=1, keepdims=True)
+                leaf_values = np.divide(leaf_values, totals, out=np.zeros_like(leaf_values), where=totals > 0)
+            values[i, :tree.node_count] = leaf_values
+
+        self.values = values
+        self.tree_index = np.arange(len(trees))
+        self.classes = getattr(forest, "classes_", None)
+
+    def per_tree(self, X):
+        """(samples, trees) predictions for a regressor, (samples, trees, classes) for a classifier"""
+        leaves = self.forest.apply(X)
+        gathered = self.values[self.tree_index, leaves]
+        return gathered[:, :, 0] if gathered.shape[2] == 1 else gathered
+
+
+def regression_summary(per_tree, quantiles: Tuple[float, float]) -> Dict[str, Sequence[float]]:
+    """Mean and quantile interval across trees, per sample"""
+    import numpy as np
+
+    low, high = np.quantile(per_tree, quantiles, axis=1)
+    return {"mean": per_tree.mean(axis=1), "low": low, "high": high, "std": per_tree.std(axis=1)}
+
+
+def classification_summary(per_tree) -> Dict[str, Sequence]:
+    """Class probabilities (predict_proba), predicted class index and tree vote agreement"""
+    probabilities = per_tree.mean(axis=1)
+    predicted = probabilities.argmax(axis=1)
+    votes = per_tree.argmax(axis=2)
+    agreement = (votes == predicted[:, None]).mean(axis=1)
+    return {"probabilities": probabilities, "predicted": predicted, "agreement": agreement}
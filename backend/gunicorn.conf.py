@@ -0,0 +1,34 @@
+# gunicorn.conf.py
+"""Production server: one gunicorn master, several uvicorn workers.
+
+    gunicorn -c gunicorn.conf.py server:app
+    python roles.py --role api --production
+
+The app is imported once in the master (preload_app) and the published
+models are loaded there before forking, so all workers share the model
+memory copy-on-write instead of each unpickling (or retraining) its own
+copy. gc.freeze() moves those objects out of the collector's reach so
+garbage collection in the workers does not touch, and copy, their pages.
+Streams and training are left to a single leader worker (see leader.py).
+"""
+import gc
+import importlib
+import os
+
+bind = f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get("WORKERS", os.environ.get("WEB_CONCURRENCY", 2)))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+accesslog = "-"
+
+
+def when_ready(server):
+    # Runs in the master after the app module is imported and before workers fork
+    app_module = importlib.import_module("server")
+    app_module.preload_models()
+    gc.collect()
+    gc.freeze()
+    server.log.info("Models preloaded in master; forking workers")
@@ -0,0 +1,195 @@
+# history.py
+"""Historical traffic_data queries streamed as NDJSON.
+
+Two modes:
+
+- Pages of raw observations, using keyset pagination on (timestamp, _id).
+  Every page is one indexed range scan wherever it starts, and the last line
+  of a page carries the opaque cursor of the next one.
+- A series downsampled to about `points` rows for one intersection, either
+  as bucket averages computed by MongoDB ($group on fixed-width time
+  buckets), or with Largest-Triangle-Three-Buckets. LTTB keeps the real
+  observations that best preserve the shape of one value, e.g. the speed
+  drops. It runs in a single pass over the cursor and only ever holds two
+  buckets of points.
+
+Documents are encoded and sent as the cursor yields them, so memory stays
+flat however long the range is.
+"""
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Optional, Sequence
+
+# Fields a caller may project, and the numeric ones that can be averaged or
+# used as the LTTB value
+HISTORY_FIELDS = ["vehicle_count", "average_speed", "congestion_level", "weather_condition", "location"]
+NUMERIC_FIELDS = ["vehicle_count", "average_speed"]
+
+# Documents fetched per round trip while streaming
+CURSOR_BATCH_SIZE = 2000
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)  # ObjectId
+
+
+def ndjson(document: Dict) -> str:
+    return json.dumps(document, default=_json_default, separators=(",", ":")) + "\n"
+
+
+def encode_cursor(timestamp: datetime, document_id) -> str:
+    raw = json.dumps({"t": timestamp.isoformat(), "id": str(document_id)}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> tuple:
+    """(timestamp, ObjectId) of a cursor; ValueError if it is not one of ours"""
+    from bson import ObjectId
+    from bson.errors import InvalidId
+
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        return datetime.fromisoformat(raw["t"]), ObjectId(raw["id"])
+    except (ValueError, KeyError, TypeError, InvalidId) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def naive_utc(when: Optional[datetime]) -> Optional[datetime]:
+    """A time as the naive UTC datetime Mongo stores and returns; aware inputs are converted"""
+    if when is None or when.tzinfo is None:
+        return when
+    return when.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def history_filter(city: str, intersection_id: Optional[str], start: datetime, end: datetime,
+                   after: Optional[tuple] = None) -> Dict:
+    """Mongo filter for a time range, optionally continuing after a (timestamp, _id) key"""
+    query = {"city": city, "timestamp": {"$gte": start, "$lt": end}}
+    if intersection_id:
+        query["intersection_id"] = intersection_id
+    if after:
+        timestamp, document_id = after
+        query["$or"] = [{"timestamp": {"$gt": timestamp}}, {"timestamp": timestamp, "_id": {"$gt": document_id}}]
+    return query
+
+
+def projection(fields: Sequence[str]) -> Dict:
+    return {"_id": 1, "timestamp": 1, "intersection_id": 1, **{field: 1 for field in fields}}
+
+
+async def page_lines(cursor, limit: int) -> AsyncIterator[str]:
+    """NDJSON lines of one page (the cursor must ask for limit + 1 documents), then the next cursor"""
+    last = None
+    sent = 0
+    async for document in cursor:
+        if sent == limit:
+            # One more document exists, so there is a next page
+            yield ndjson({"next_cursor": encode_cursor(last["timestamp"], last["_id"]), "count": sent})
+            return
+        last = document
+        sent += 1
+        yield ndjson({**document, "_id": str(document["_id"])})
+    yield ndjson({"next_cursor": None, "count": sent})
+
+
+def bucket_pipeline(query: Dict, start: datetime, end: datetime, points: int, fields: Sequence[str]) -> List[Dict]:
+    """Mongo pipeline averaging numeric fields over `points` equal time buckets"""
+    width_ms = max(1, int((end - start).total_seconds() * 1000 / points))
+    return [
+        {"$match": query},
+        {"$group": {
+            "_id": {"$floor": {"$divide": [{"$subtract": ["$timestamp", start]}, width_ms]}},
+            "count": {"$sum": 1},
+            **{field: {"$avg": f"${field}"} for field in fields if field in NUMERIC_FIELDS},
+        }},
+        {"$sort": {"_id": 1}},
+        {"$addFields": {"timestamp": {"$add": [start, {"$multiply": ["$_id", width_ms]}]}}},
+        {"$project": {"_id": 0}},
+    ]
+
+
+async def bucket_lines(cursor) -> AsyncIterator[str]:
+    """NDJSON lines of bucket_pipeline results"""
+    sent = 0
+    async for bucket in cursor:
+        sent += 1
+        yield ndjson(bucket)
+    yield ndjson({"count": sent})
+
+
+class StreamingLTTB:
+    """Largest-Triangle-Three-Buckets over time-ordered points, one bucket at a time.
+
+    Buckets are fixed time slices of the range. A bucket's point is chosen
+    once the next bucket is complete. It is the point forming the largest
+    triangle with the previously chosen point and the next bucket's average.
+    The first and last points are always kept.
+    """
+
+    def __init__(self, start: datetime, end: datetime, points: int, value: str):
+        # The first and last points take two of the requested points
+        self.start = start
+        self.width = max((end - start) / max(points - 2, 1), timedelta(microseconds=1))
+        self.value = value
+        self.selected = None
+        self.last = None
+        self.pending: List[Dict] = []
+        self.current: List[Dict] = []
+        self.current_bucket = None
+
+    def _x(self, point: Dict) -> float:
+        return (point["timestamp"] - self.start).total_seconds()
+
+    def _select(self, bucket: List[Dict], following: List[Dict]) -> Dict:
+        """Point of `bucket` with the largest triangle between the last selection and the following average"""
+        ax, ay = self._x(self.selected), self.selected[self.value]
+        cx = sum(self._x(p) for p in following) / len(following)
+        cy = sum(p[self.value] for p in following) / len(following)
+        self.selected = max(bucket, key=lambda p: abs((ax - cx) * (p[self.value] - ay) - (ax - self._x(p)) * (cy - ay)))
+        return self.selected
+
+    def push(self, point: Dict) -> List[Dict]:
+        """Add the next point in time order; returns the points that became final"""
+        if point.get(self.value) is None:
+            return []
+        self.last = point
+        if self.selected is None:
+            self.selected = point
+            return [point]
+
+        bucket = int((point["timestamp"] - self.start) / self.width)
+        if bucket == self.current_bucket:
+            self.current.append(point)
+            return []
+        # The current bucket is complete, so the pending one can be decided
+        emitted = [self._select(self.pending, self.current)] if self.pending else []
+        self.pending, self.current, self.current_bucket = self.current, [point], bucket
+        return emitted
+
+    def finish(self) -> List[Dict]:
+        """The remaining selections, ending with the last point"""
+        emitted = [self._select(self.pending, self.current)] if self.pending else []
+        rest = [p for p in self.current if p is not self.last]
+        if rest:
+            emitted.append(self._select(rest, [self.last]))
+        if self.last is not None and self.last is not self.selected:
+            self.selected = self.last
+            emitted.append(self.last)
+        return emitted
+
+
+async def lttb_lines(cursor, start: datetime, end: datetime, points: int, value: str) -> AsyncIterator[str]:
+    """NDJSON lines of an LTTB-downsampled series, streamed as buckets complete"""
+    sampler = StreamingLTTB(start, end, points, value)
+    sent = 0
+    async for document in cursor:
+        for point in sampler.push(document):
+            sent += 1
+            yield ndjson({**point, "_id": str(point["_id"])})
+    for point in sampler.finish():
+        sent += 1
+        yield ndjson({**point, "_id": str(point["_id"])})
+    yield ndjson({"count": sent})
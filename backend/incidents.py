@@ -0,0 +1,261 @@
+# incidents.py
+"""Streaming incident detection over live traffic observations.
+
+Each observation is compared with the hour-of-week baseline of its
+intersection (analytics.hour_of_week_baseline). The detector keeps a few
+numbers per intersection and signal, in NumPy arrays indexed by intersection:
+
+- an EWMA of the relative residual (observed - expected) / expected;
+- a robust scale: an EWMA of absolute residual deviations, not updated while
+  the signal is anomalous, so an incident does not widen its own band;
+- a streak of consecutive anomalous observations;
+- whether an incident is open.
+
+The score is z = level / scale. An incident opens after `persistence`
+consecutive observations beyond the threshold: a speed drop (z below
+-threshold) or a vehicle count spike (z above threshold). It is resolved once
+|z| falls back under `clear`. A batch of observations is one vectorized
+update, whatever the number of intersections.
+
+IncidentMonitor stores incidents in the `incidents` collection and publishes
+them to an IncidentFeed. Detection runs where observations are recorded (the
+analyzer role). API processes tail the collection into their own feed, which
+the dashboard follows over server-sent events.
+"""
+import asyncio
+import collections
+import logging
+import uuid
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+# (kind, field, direction): the direction in which the residual is anomalous
+SIGNALS = [("speed_drop", "average_speed", -1), ("count_spike", "vehicle_count", 1)]
+
+# Mean absolute deviation to standard deviation, for normally distributed residuals
+MAD_TO_STD = 1.2533
+
+
+class IncidentDetector:
+    """O(1)-per-intersection EWMA / robust z-score state for one city"""
+
+    def __init__(self, intersection_ids: Sequence[str], alpha: float = 0.5, scale_alpha: float = 0.05,
+                 threshold: float = 3.0, clear: float = 1.0, persistence: int = 2, warmup: int = 3,
+                 initial_scale: float = 0.15, min_scale: float = 0.05):
+        import numpy as np
+
+        self.ids = list(intersection_ids)
+        self.index = {intersection_id: n for n, intersection_id in enumerate(self.ids)}
+        self.alpha, self.scale_alpha = alpha, scale_alpha
+        self.threshold, self.clear = threshold, clear
+        self.persistence, self.warmup, self.min_scale = persistence, warmup, min_scale
+        shape = (len(SIGNALS), len(self.ids))
+        self.direction = np.array([direction for _, _, direction in SIGNALS], dtype=float)[:, None]
+        self.level = np.zeros(shape)
+        self.scale = np.full(shape, initial_scale)
+        self.streak = np.zeros(shape, dtype=np.int32)
+        self.active = np.zeros(shape, dtype=bool)
+        self.seen = np.zeros(len(self.ids), dtype=np.int64)
+
+    def update(self, positions, observed, expected) -> List[Dict]:
+        """Fold one observation per position (no repeats) into the state.
+
+        observed and expected are (signals, len(positions)) arrays, in SIGNALS
+        order. Returns the incidents opened or resolved by this batch.
+        """
+        import numpy as np
+
+        positions = np.asarray(positions)
+        residual = (observed - expected) / np.maximum(expected, 1.0)
+        previous = self.level[:, positions]
+        level = previous + self.alpha * (residual - previous)
+        scale = np.maximum(self.scale[:, positions], self.min_scale)
+        z = level / scale
+
+        anomalous = self.direction * z > self.threshold
+        streak = np.where(anomalous, self.streak[:, positions] + 1, 0)
+        seen = self.seen[positions] + 1
+        active = self.active[:, positions]
+        opened = ~active & (streak >= self.persistence) & (seen >= self.warmup)
+        resolved = active & (np.abs(z) < self.clear)
+
+        # The scale only learns from normal observations
+        deviation = np.abs(residual - previous) * MAD_TO_STD
+        self.scale[:, positions] = np.where(anomalous, scale, scale + self.scale_alpha * (deviation - scale))
+        self.level[:, positions] = level
+        self.streak[:, positions] = streak
+        self.seen[positions] = seen
+        self.active[:, positions] = (active | opened) & ~resolved
+
+        events = []
+        for signal, column in zip(*np.nonzero(opened | resolved)):
+            kind = SIGNALS[signal][0]
+            events.append({
+                "intersection_id": self.ids[positions[column]],
+                "kind": kind,
+                "status": "open" if opened[signal, column] else "resolved",
+                "observed": round(float(observed[signal, column]), 1),
+                "expected": round(float(expected[signal, column]), 1),
+                "z": round(float(z[signal, column]), 2),
+            })
+        return events
+
+
+class IncidentFeed:
+    """In-process fan-out of incident updates to live subscribers"""
+
+    def __init__(self, max_queue: int = 100):
+        self.max_queue = max_queue
+        self._subscribers = set()
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(self.max_queue)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def publish(self, incident: Dict):
+        for queue in self._subscribers:
+            # A slow subscriber loses its oldest updates rather than holding up the others
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(incident)
+
+
+def incident_json(incident: Dict) -> Dict:
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in incident.items()}
+
+
+def incident_message(incident: Dict) -> str:
+    name = incident.get("intersection_name", incident["intersection_id"])
+    if incident["kind"] == "speed_drop":
+        text = f"{name}: speed dropped to {incident['observed']:.0f} km/h (usually {incident['expected']:.0f})"
+    else:
+        text = f"{name}: {incident['observed']:.0f} vehicles (usually {incident['expected']:.0f})"
+    return text + (" - cleared" if incident["status"] == "resolved" else "")
+
+
+class IncidentMonitor:
+    """Detects incidents per city, stores them in Mongo and publishes them to the feed"""
+
+    def __init__(self, intersections: Dict[str, Sequence[Dict]], baseline: Callable[[str], Awaitable[Dict]],
+                 feed: IncidentFeed, **detector_options):
+        self.intersections = intersections
+        self.names = {city: {i["id"]: i["name"] for i in registry} for city, registry in intersections.items()}
+        self.baseline = baseline
+        self.feed = feed
+        self.detector_options = detector_options
+        self.detectors: Dict[str, IncidentDetector] = {}
+        # Open incidents per city by (intersection, kind), and recently resolved ids
+        self.open: Dict[str, Dict[tuple, Dict]] = {city: {} for city in intersections}
+        self._resolved = collections.deque(maxlen=1000)
+
+    def detector(self, city: str) -> IncidentDetector:
+        if city not in self.detectors:
+            self.detectors[city] = IncidentDetector([i["id"] for i in self.intersections[city]],
+                                                    **self.detector_options)
+        return self.detectors[city]
+
+    async def observe(self, city: str, records: Sequence[Dict], db=None) -> List[Dict]:
+        """Run a batch of observations through the detector; returns the incidents it opened or resolved"""
+        import numpy as np
+
+        detector = self.detector(city)
+        records = [r for r in records if r["intersection_id"] in detector.index]
+        if not records:
+            return []
+        baseline = await self.baseline(city)
+        positions = np.array([detector.index[r["intersection_id"]] for r in records])
+        slots = np.array([r["timestamp"].weekday() * 24 + r["timestamp"].hour for r in records])
+        observed = np.array([[r[field] for r in records] for _, field, _ in SIGNALS], dtype=float)
+        expected = np.stack([baseline[field][positions, slots] for _, field, _ in SIGNALS])
+        # Hours with no baseline yet cannot be judged; they count as normal
+        observed = np.where(expected > 0, observed, expected)
+
+        now = max(r["timestamp"] for r in records)
+        incidents = [self._record(city, event, now) for event in detector.update(positions, observed, expected)]
+        if incidents and db is not None:
+            await self._store(db, incidents)
+        for incident in incidents:
+            self.feed.publish(incident)
+        return incidents
+
+    def _record(self, city: str, event: Dict, now: datetime) -> Dict:
+        key = (event["intersection_id"], event["kind"])
+        if event["status"] == "open":
+            z = abs(event["z"])
+            incident = self.open[city][key] = {
+                "incident_id": str(uuid.uuid4()),
+                "city": city,
+                "intersection_name": self.names[city].get(event["intersection_id"], event["intersection_id"]),
+                **event,
+                "severity": "Critical" if z >= 2 * self.detector(city).threshold else "High",
+                "detected_at": now,
+                "resolved_at": None,
+                "updated_at": datetime.utcnow(),
+            }
+        else:
+            incident = self.open[city].pop(key, None)
+            if incident is None:  # Opened before this process started
+                incident = {"incident_id": None, "city": city, "severity": "High", "detected_at": None}
+            incident = {**incident, **event, "resolved_at": now, "updated_at": datetime.utcnow()}
+            self._resolved.append(incident["incident_id"])
+        incident["message"] = incident_message(incident)
+        return incident
+
+    async def _store(self, db, incidents: List[Dict]):
+        try:
+            opened = [dict(i) for i in incidents if i["status"] == "open"]
+            if opened:
+                await db.incidents.insert_many(opened)
+            for incident in incidents:
+                if incident["status"] == "resolved" and incident["incident_id"]:
+                    await db.incidents.update_one(
+                        {"incident_id": incident["incident_id"]},
+                        {"$set": {key: incident[key] for key in ("status", "observed", "z", "resolved_at",
+                                                                 "updated_at", "message")}})
+        except Exception as e:
+            logger.error(f"Could not store incidents: {e}")
+
+    def _apply(self, incident: Dict) -> bool:
+        """Track an incident stored by another process; False if it is already known"""
+        key = (incident["intersection_id"], incident["kind"])
+        open_incidents = self.open.setdefault(incident["city"], {})
+        if incident["status"] == "open":
+            if key in open_incidents and open_incidents[key]["incident_id"] == incident["incident_id"]:
+                return False
+            open_incidents[key] = incident
+            return True
+        if incident["incident_id"] in self._resolved:
+            return False
+        open_incidents.pop(key, None)
+        self._resolved.append(incident["incident_id"])
+        return True
+
+    async def tail(self, db, poll_seconds: float = 2.0):
+        """Follow incidents stored by the detecting process and publish them to this process's feed"""
+        since = None
+        while True:
+            started = datetime.utcnow()
+            try:
+                query = {"updated_at": {"$gt": since}} if since else {"status": "open"}
+                cursor = db.incidents.find(query, {"_id": 0}).sort("updated_at", 1)
+                async for incident in cursor:
+                    since = max(since or incident["updated_at"], incident["updated_at"])
+                    if self._apply(incident):
+                        self.feed.publish(incident)
+                since = since or started
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Incident tail failed: {e!r}")
+            await asyncio.sleep(poll_seconds)
+
+    def current(self, city: str) -> List[Dict]:
+        """Open incidents of a city, worst first"""
+        return sorted(self.open.get(city, {}).values(), key=lambda i: (i["severity"] != "Critical", -abs(i["z"])))
+
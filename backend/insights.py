@@ -0,0 +1,177 @@
+# insights.py
+"""Rule-based traffic insights, evaluated once per city snapshot.
+
+Rules are plain data (INSIGHT_RULES). Each rule has:
+- a scope: "city", or "intersection" for a rule checked per intersection;
+- conditions on facts computed from the snapshot;
+- a priority, and a text template filled in from the same facts;
+- audiences (dashboard, route, ...) that say where the insight is shown.
+
+When a snapshot is new, every rule is evaluated once against it. Firing rules
+become insights. Within a rule's group, only the highest-priority insight per
+subject is kept, so "critical" beats "heavy" at the same intersection. The
+rest are ranked by priority. A rule marked "otherwise" fires only if nothing
+else fired for its audiences (e.g. "traffic is flowing well").
+
+Results are cached per city under the snapshot's id. Requests only filter the
+cached list, and the same snapshot always gives the same insights.
+"""
+import operator
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+from snapshots import Snapshot, SnapshotCache
+
+CONGESTION_RANK = {"Low": 0, "Medium": 1, "High": 2, "Critical": 3}
+RUSH_HOURS = [7, 8, 17, 18]
+
+OPERATORS = {
+    "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+    "==": operator.eq, "!=": operator.ne, "in": lambda value, options: value in options,
+}
+
+INSIGHT_RULES: List[Dict[str, Any]] = [
+    # City-wide operational recommendations (dashboard)
+    {"id": "deploy_controllers", "scope": "city", "when": [("critical", ">=", 1)], "priority": 100,
+     "audiences": ["dashboard"], "template": "🚨 Deploy traffic controllers to critical intersections immediately"},
+    {"id": "issue_alerts", "scope": "city", "when": [("critical", ">=", 1)], "priority": 95,
+     "audiences": ["dashboard"], "template": "📢 Issue traffic alerts via radio and mobile apps"},
+    {"id": "signal_timing", "scope": "city", "when": [("average_speed", "<", 20)], "priority": 80,
+     "audiences": ["dashboard"], "template": "🚦 Implement dynamic signal timing optimization"},
+    {"id": "public_transport", "scope": "city", "when": [("average_speed", "<", 20)], "priority": 75,
+     "audiences": ["dashboard"],
+     "template": "🚌 Increase public transport frequency to reduce private vehicle load"},
+    {"id": "route_guidance", "scope": "city", "when": [("congested", ">", 3)], "priority": 70,
+     "audiences": ["dashboard"], "template": "🔄 Activate alternative route guidance systems"},
+    {"id": "manual_direction", "scope": "city", "when": [("congested", ">", 3)], "priority": 65,
+     "audiences": ["dashboard"], "template": "👮 Consider manual traffic direction at hotspots"},
+    {"id": "all_clear", "scope": "city", "otherwise": True, "priority": 10,
+     "audiences": ["dashboard"], "template": "✅ Traffic flow is optimal. Maintain current monitoring."},
+
+    # Advice for travellers (route optimisation)
+    {"id": "avoid_hotspots", "scope": "city", "when": [("congested", ">=", 1)], "priority": 70,
+     "audiences": ["route"], "template": "Avoid {hotspots} if you can; they are the most congested right now."},
+    {"id": "rush_hour", "scope": "city", "when": [("rush_hour", "==", True)], "priority": 60,
+     "audiences": ["route"], "template": "It is rush hour in {city}; expect delays on main corridors."},
+    {"id": "rain", "scope": "city", "when": [("rainy", ">=", 2)], "priority": 50,
+     "audiences": ["route"], "template": "Rain is reported at {rainy} intersections; allow extra travel time."},
+    {"id": "light_traffic", "scope": "city", "otherwise": True, "priority": 10,
+     "audiences": ["route"], "template": "Traffic in {city} is light on main routes right now."},
+
+    # Per intersection (dashboard alerts, chat, analytics)
+    {"id": "critical_congestion", "scope": "intersection", "group": "congestion",
+     "when": [("congestion_level", "==", "Critical")], "priority": 90, "audiences": ["dashboard", "intersection"],
+     "template": "{name}: critical congestion, {vehicle_count} vehicles at {average_speed:.0f} km/h"},
+    {"id": "heavy_congestion", "scope": "intersection", "group": "congestion",
+     "when": [("congestion_level", "==", "High")], "priority": 70, "audiences": ["intersection"],
+     "template": "{name}: heavy traffic, {vehicle_count} vehicles at {average_speed:.0f} km/h"},
+    {"id": "crawling", "scope": "intersection", "when": [("average_speed", "<", 10)], "priority": 60,
+     "audiences": ["intersection"], "template": "{name}: traffic crawling at {average_speed:.0f} km/h"},
+    {"id": "rain_congestion", "scope": "intersection",
+     "when": [("weather_condition", "in", ("Rainy", "Heavy Rain")), ("congestion_rank", ">=", 2)],
+     "priority": 55, "audiences": ["intersection"], "template": "{name}: rain is adding to congestion"},
+]
+
+
+def city_facts(snapshot: Snapshot, names: Dict[str, str]) -> Dict[str, Any]:
+    """Facts about the whole city that city-scope rules test and templates use"""
+    records = snapshot.records
+    congested = sorted((r for r in records if r["congestion_level"] in ("High", "Critical")),
+                       key=lambda r: (-CONGESTION_RANK[r["congestion_level"]], r["average_speed"]))
+    return {
+        "city": snapshot.city,
+        "intersections": len(records),
+        "critical": sum(1 for r in records if r["congestion_level"] == "Critical"),
+        "congested": len(congested),
+        "average_speed": sum(r["average_speed"] for r in records) / len(records) if records else 0.0,
+        "total_vehicles": sum(r["vehicle_count"] for r in records),
+        "rainy": sum(1 for r in records if r.get("weather_condition") in ("Rainy", "Heavy Rain")),
+        "rush_hour": snapshot.taken_at.hour in RUSH_HOURS,
+        "hotspots": " and ".join(names.get(r["intersection_id"], r["intersection_id"]) for r in congested[:2]),
+    }
+
+
+def intersection_facts(record: Dict, names: Dict[str, str]) -> Dict[str, Any]:
+    return {
+        **record,
+        "name": names.get(record["intersection_id"], record["intersection_id"]),
+        "congestion_rank": CONGESTION_RANK.get(record["congestion_level"], 0),
+    }
+
+
+def _matches(rule: Dict, facts: Dict[str, Any]) -> bool:
+    return all(OPERATORS[op](facts[name], value) for name, op, value in rule.get("when", ()))
+
+
+class InsightEngine:
+    """Evaluates INSIGHT_RULES per city snapshot and caches the ranked result"""
+
+    def __init__(self, snapshots: SnapshotCache, intersections: Dict[str, Sequence[Dict]],
+                 rules: Sequence[Dict] = INSIGHT_RULES):
+        self.snapshots = snapshots
+        self.names = {city: {i["id"]: i["name"] for i in registry} for city, registry in intersections.items()}
+        self.rules = list(rules)
+        self._cache: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def evaluate(self, snapshot: Snapshot) -> List[Dict]:
+        """Ranked, deduplicated insights for one snapshot"""
+        names = self.names.get(snapshot.city, {})
+        subjects = [(snapshot.city, city_facts(snapshot, names), "city")]
+        subjects += [(r["intersection_id"], intersection_facts(r, names), "intersection") for r in snapshot.records]
+
+        best: Dict[tuple, Dict] = {}
+        for rule in self.rules:
+            if rule.get("otherwise"):
+                continue
+            for subject, facts, scope in subjects:
+                if scope != rule["scope"] or not _matches(rule, facts):
+                    continue
+                key = (rule.get("group", rule["id"]), subject)
+                if key not in best or rule["priority"] > best[key]["priority"]:
+                    best[key] = {
+                        "rule": rule["id"], "scope": scope, "subject": subject,
+                        "priority": rule["priority"], "audiences": list(rule["audiences"]),
+                        "text": rule["template"].format(**facts),
+                    }
+
+        insights = list(best.values())
+        covered = {audience for insight in insights for audience in insight["audiences"]}
+        for rule in self.rules:
+            if rule.get("otherwise") and not covered.intersection(rule["audiences"]):
+                insights.append({
+                    "rule": rule["id"], "scope": rule["scope"], "subject": snapshot.city,
+                    "priority": rule["priority"], "audiences": list(rule["audiences"]),
+                    "text": rule["template"].format(**subjects[0][1]),
+                })
+
+        # Identical texts from different rules are shown once
+        seen, ranked = set(), []
+        for insight in sorted(insights, key=lambda i: (-i["priority"], i["subject"], i["rule"])):
+            if insight["text"] not in seen:
+                seen.add(insight["text"])
+                ranked.append(insight)
+        return ranked
+
+    def for_city(self, city: str) -> Dict:
+        """Insights of the city's current snapshot, evaluated once per snapshot"""
+        snapshot = self.snapshots.get(city)
+        cached = self._cache.get(city)
+        if cached is None or cached["snapshot_id"] != snapshot.id:
+            with self._lock:
+                cached = self._cache.get(city)
+                if cached is None or cached["snapshot_id"] != snapshot.id:
+                    cached = self._cache[city] = {
+                        "snapshot_id": snapshot.id,
+                        "snapshot": snapshot,
+                        "insights": self.evaluate(snapshot),
+                    }
+        return cached
+
+    def select(self, city: str, audience: Optional[str] = None, scope: Optional[str] = None,
+               subject: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        """Cached insights of a city, filtered by audience, scope and/or subject, best first"""
+        insights = [i for i in self.for_city(city)["insights"]
+                    if (audience is None or audience in i["audiences"]) and (scope is None or i["scope"] == scope)
+                    and (subject is None or i["subject"] == subject)]
+        return insights[:limit] if limit is not None else insights
@@ -0,0 +1,61 @@
+# leader.py
+"""Single-leader election between worker processes on one host.
+
+When gunicorn runs several workers, only one of them should start FFmpeg
+streams or train models. Workers race for an exclusive, non-blocking lock
+on a shared file; the winner holds it for as long as it lives. The OS drops
+the lock when the leader exits or crashes, and the next worker that tries
+takes over.
+"""
+import logging
+import os
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows has no fcntl; gunicorn does not run there either
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderLock:
+    """Exclusive file lock held by the leader process"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        """Become leader if nobody else is; never blocks"""
+        if self._fd is not None:
+            return True
+        if fcntl is None:
+            self._fd = -1
+            return True
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+
+        # Record the leader's pid for operators; the lock itself is what counts
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        logger.info(f"Process {os.getpid()} is now the leader")
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        if self._fd >= 0:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+        self._fd = None
@@ -0,0 +1,312 @@
+# metrics.py
+"""In-process metrics exposed in the Prometheus text format at /metrics.
+
+Built without prometheus_client so the API keeps its small dependency set and
+fast import. Every labelled series is created once (at startup for routes,
+on first use for the rest) and cached; recording a value afterwards is a dict
+lookup plus a few integer/float additions, with nothing allocated per request.
+
+Each process keeps its own registry. Under gunicorn every worker reports its
+own series, so scrape the workers individually or sum them per instance.
+"""
+import asyncio
+import bisect
+import logging
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds: sub-millisecond cache hits up to slow ML calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Training runs take seconds to minutes
+TRAINING_BUCKETS = (1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def set(self, value: float):
+        self.value = value
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # One slot per bucket plus the +Inf overflow; cumulated at scrape time
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Metric:
+    kind = ""
+    child_class = _CounterChild
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def _new_child(self):
+        return self.child_class()
+
+    def labels(self, *values) -> object:
+        """The series for these label values, created on first use and cached"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+                for values, child in self._children.items()]
+
+    def expose(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+    child_class = _GaugeChild
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class Registry:
+    """All metrics of this process, plus callbacks that refresh gauges on scrape"""
+
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+        self.collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]):
+        self.collectors.append(collector)
+
+    def expose(self) -> str:
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.warning(f"Metrics collector {collector.__name__} failed: {e}")
+        return "\n".join(metric.expose() for metric in self.metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route"))
+HTTP_REQUESTS = REGISTRY.counter(
+    "http_requests_total", "HTTP responses by route template and status code", ("method", "route", "status"))
+ML_PREDICTION_DURATION = REGISTRY.histogram(
+    "ml_prediction_duration_seconds", "TrafficMLEngine prediction latency", ("city",))
+ML_TRAINING_DURATION = REGISTRY.histogram(
+    "ml_training_duration_seconds", "TrafficMLEngine training duration", ("city",), TRAINING_BUCKETS)
+ML_TRAINING_RUNS = REGISTRY.counter(
+    "ml_training_runs_total", "TrafficMLEngine training runs by outcome", ("city", "outcome"))
+ML_ONLINE_UPDATES = REGISTRY.counter(
+    "ml_online_updates_total", "Incremental model updates from observed traffic by outcome", ("city", "outcome"))
+MONGO_OPERATION_DURATION = REGISTRY.histogram(
+    "mongo_operation_duration_seconds", "MongoDB command latency", ("command", "collection"))
+MONGO_OPERATION_FAILURES = REGISTRY.counter(
+    "mongo_operation_failures_total", "Failed MongoDB commands", ("command", "collection"))
+FFMPEG_PROCESSES = REGISTRY.gauge(
+    "ffmpeg_processes", "FFmpeg HLS processes started by this process, by state", ("state",))
+EVENT_LOOP_LAG = REGISTRY.histogram(
+    "event_loop_lag_seconds", "Delay of the event loop in waking a periodic probe")
+EVENT_LOOP_LAG_LAST = REGISTRY.gauge(
+    "event_loop_lag_last_seconds", "Most recent event loop lag measurement")
+EVENT_LOOP_STALLS = REGISTRY.counter(
+    "event_loop_stalls_total", "Times the loop watchdog caught the event loop blocked past its threshold")
+
+CHAT_REQUESTS = REGISTRY.counter(
+    "chat_requests_total", "Chat gateway requests by outcome", ("outcome",))
+CHAT_FIRST_TOKEN = REGISTRY.histogram(
+    "chat_first_token_seconds", "Time from chat request to the first streamed token", ("backend",))
+
+
+# Route label for requests that matched no route (404s)
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by its route template.
+
+    Route templates (e.g. /api/traffic/current/{city}) keep the label set
+    bounded; the series for every route are created on the first request
+    so later requests only do cached lookups.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        # route template -> method -> (histogram series, {status: counter series})
+        self._series: Dict[str, Dict[str, tuple]] = {}
+        self._preallocated = False
+
+    def preallocate(self, routes):
+        for route in routes:
+            for method in getattr(route, "methods", None) or ("GET",):
+                self._resolve(getattr(route, "path", UNMATCHED_ROUTE), method)
+        self._preallocated = True
+
+    def _resolve(self, path: str, method: str) -> tuple:
+        by_method = self._series.get(path)
+        if by_method is None:
+            by_method = self._series[path] = {}
+        series = by_method.get(method)
+        if series is None:
+            series = by_method[method] = (HTTP_REQUEST_DURATION.labels(method, path), {})
+        return series
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if not self._preallocated:
+            self.preallocate(scope["app"].routes)
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = route.path if route is not None else UNMATCHED_ROUTE
+            histogram, by_status = self._resolve(path, scope["method"])
+            histogram.observe(time.perf_counter() - started)
+            counter = by_status.get(status)
+            if counter is None:
+                counter = by_status[status] = HTTP_REQUESTS.labels(scope["method"], path, str(status))
+            counter.inc()
+
+
+class MongoCommandListener:
+    """pymongo command monitor recording the latency of every Mongo command"""
+
+    def __init__(self):
+        self._pending: Dict[int, Tuple[str, str]] = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = ""
+        self._pending[event.request_id] = (event.command_name, collection)
+
+    def _finished(self, event, failed: bool):
+        labels = self._pending.pop(event.request_id, (event.command_name, ""))
+        MONGO_OPERATION_DURATION.labels(*labels).observe(event.duration_micros / 1e6)
+        if failed:
+            MONGO_OPERATION_FAILURES.labels(*labels).inc()
+
+    def succeeded(self, event):
+        self._finished(event, failed=False)
+
+    def failed(self, event):
+        self._finished(event, failed=True)
+
+
+def mongo_event_listeners() -> list:
+    """Listeners to pass to the Motor client (registered with pymongo's monitoring API)"""
+    from pymongo import monitoring
+
+    class _Listener(MongoCommandListener, monitoring.CommandListener):
+        pass
+
+    return [_Listener()]
+
+
+async def monitor_event_loop_lag(interval: float = 0.5):
+    """Sleep for `interval` repeatedly and record how late the loop woke us up"""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - expected)
+        EVENT_LOOP_LAG.labels().observe(lag)
+        EVENT_LOOP_LAG_LAST.labels().set(lag)
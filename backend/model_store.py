@@ -0,0 +1,177 @@
+# model_store.py
+"""Versioned on-disk model store shared by the trainer and API processes.
+
+The trainer writes every trained model set into its own version directory
+(models/<city>/<version>/) and only then points the city's manifest at it,
+replacing the manifest file atomically. Readers therefore never see a
+half-written model set: they either load the old version or the new one.
+API processes poll the manifest and hot-swap engines when it changes.
+
+Several processes can publish the same city (the trainer role, a leader
+worker, online updates). A version is saved under a hidden staging name,
+then moved into place, made current and old versions pruned under a per-city
+file lock, so one publisher never prunes a version another is still writing
+or about to point the manifest at.
+"""
+import contextlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows has no fcntl; publishers are not run concurrently there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def _json_default(value):
+    """Manifest metadata holds NumPy scalars and datetimes from training"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def _write_json(path: Path, document: Dict[str, Any]):
+    """Replace a JSON file atomically, safe against concurrent writers of the same file"""
+    # Each writer gets its own temporary file in the target directory, then
+    # os.replace (atomic on POSIX and Windows) swaps it in: the last one wins
+    with tempfile.NamedTemporaryFile("w", dir=path.parent, prefix=f".{path.name}.", suffix=".tmp",
+                                     delete=False) as f:
+        try:
+            json.dump(document, f, default=_json_default, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        except BaseException:
+            f.close()
+            os.unlink(f.name)
+            raise
+    os.replace(f.name, path)
+
+
+class ModelStore:
+    """Publish and load versioned model sets per city"""
+
+    def __init__(self, root: str = "models", keep_versions: int = 3):
+        self.root = Path(root)
+        self.keep_versions = keep_versions
+
+    def manifest_path(self, city: str) -> Path:
+        return self.root / f"{city.lower()}_manifest.json"
+
+    def version_dir(self, city: str, version: str) -> Path:
+        return self.root / city.lower() / version
+
+    @contextlib.contextmanager
+    def _locked(self, city: str):
+        """Exclusive lock on a city's versions, between processes and threads alike"""
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(self.root / f".{city.lower()}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # releases the lock
+
+    def current_version(self, city: str) -> Optional[Dict[str, Any]]:
+        """Manifest of the currently published version, or None"""
+        path = self.manifest_path(city)
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unreadable model manifest {path}: {e}")
+            return None
+
+    def publish(self, city: str, engine, metadata: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Write the engine's models as a new version and make it current"""
+        version = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        target = self.version_dir(city, version)
+        staging = target.with_name(f".{version}")
+
+        if not engine.save_models(city, directory=str(staging)):
+            shutil.rmtree(staging, ignore_errors=True)
+            return None
+
+        manifest = {
+            "city": city,
+            "version": version,
+            "path": str(target.relative_to(self.root)),
+            "published_at": datetime.utcnow().isoformat(),
+            "accuracy_metrics": engine.model_accuracy,
+            **(metadata or {}),
+        }
+
+        with self._locked(city):
+            os.replace(staging, target)
+            _write_json(self.manifest_path(city), manifest)
+            logger.info(f"Published {city} models version {version}")
+            self.prune(city)
+        return version
+
+    def load(self, city: str, engine) -> bool:
+        """Load the current version into an engine (legacy flat files as fallback)"""
+        manifest = self.current_version(city)
+        if manifest is None:
+            return engine.load_models(city, directory=str(self.root))
+
+        if not engine.load_models(city, directory=str(self.root / manifest["path"])):
+            return False
+        engine.model_version = manifest["version"]
+        engine.model_accuracy = dict(manifest.get("accuracy_metrics") or {})
+        engine.calibration = dict(manifest.get("calibration") or {})
+        return True
+
+    def tuning_path(self, city: str) -> Path:
+        return self.root / f"{city.lower()}_tuning.json"
+
+    def save_tuning(self, city: str, report: Dict[str, Any]):
+        """Store a tuning run's report; its best_params are used by the next training run"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        # Models left out of this run keep their earlier winners
+        try:
+            with open(self.tuning_path(city)) as f:
+                previous = json.load(f).get("models", {})
+        except (OSError, ValueError):
+            previous = {}
+        report = {**report, "models": {**previous, **report["models"]}}
+        _write_json(self.tuning_path(city), report)
+        logger.info(f"Stored tuned model settings for {city}")
+
+    def tuned_params(self, city: str) -> Dict[str, Dict[str, Any]]:
+        """Winning estimator settings per model from the last tuning run, or {}"""
+        try:
+            with open(self.tuning_path(city)) as f:
+                report = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unreadable tuning report {self.tuning_path(city)}: {e}")
+            return {}
+        return {name: result["best_params"] for name, result in report.get("models", {}).items()}
+
+    def prune(self, city: str):
+        """Remove old versions, keeping the newest few for rollback"""
+        city_dir = self.root / city.lower()
+        if not city_dir.exists():
+            return
+        current = (self.current_version(city) or {}).get("version")
+        # Hidden directories are versions still being saved
+        versions = sorted((p for p in city_dir.iterdir() if p.is_dir() and not p.name.startswith(".")),
+                          key=lambda p: p.name, reverse=True)
+        for old in versions[self.keep_versions:]:
+            if old.name != current:
+                shutil.rmtree(old, ignore_errors=True)
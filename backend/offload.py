@@ -0,0 +1,149 @@
+# offload.py
+"""Keep blocking work off the event loop, and catch what still blocks it.
+
+Blocking calls run on small, bounded pools by kind instead of the loop (or
+the shared default executor), so a burst of slow calls of one kind queues
+behind its own pool rather than delaying every other request:
+
+- "cpu": ML prediction, signal/corridor optimisation (threads, one per core)
+- "io": model files, subprocess launches, client setup (threads)
+- "process": training, which holds the GIL for long stretches of pandas and
+  sklearn work and would otherwise stall the loop's thread too
+- "simulation": scenario simulations, in parallel processes of their own so a
+  batch of scenarios neither waits behind training nor holds it up
+
+    @offload("cpu")
+    def solve(...): ...            # now awaitable; solve.__wrapped__ is the sync original
+
+    await run_blocking("io", model_store.load, city, engine)
+
+LoopWatchdog records the loop thread's stack whenever the loop stalls for
+longer than a threshold, so the remaining blocking calls can be found.
+"""
+import asyncio
+import collections
+import contextvars
+import functools
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+POOL_SIZES = {
+    "cpu": int(os.environ.get("OFFLOAD_CPU_WORKERS", os.cpu_count() or 2)),
+    "io": int(os.environ.get("OFFLOAD_IO_WORKERS", 8)),
+    "process": int(os.environ.get("OFFLOAD_PROCESS_WORKERS", 1)),
+    "simulation": int(os.environ.get("OFFLOAD_SIMULATION_WORKERS", os.cpu_count() or 2)),
+}
+PROCESS_KINDS = ("process", "simulation")
+
+_pools: Dict[str, Executor] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(kind: str) -> Executor:
+    """The pool for a kind of work, created on first use"""
+    pool = _pools.get(kind)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(kind)
+            if pool is None:
+                if kind in PROCESS_KINDS:
+                    # Spawned, not forked: forking a process with running threads is unsafe
+                    pool = ProcessPoolExecutor(POOL_SIZES[kind], mp_context=multiprocessing.get_context("spawn"))
+                else:
+                    pool = ThreadPoolExecutor(POOL_SIZES[kind], thread_name_prefix=f"offload-{kind}")
+                _pools[kind] = pool
+    return pool
+
+
+async def run_blocking(kind: str, fn: Callable, *args, **kwargs):
+    """Run a blocking call on the pool for its kind and await the result"""
+    loop = asyncio.get_running_loop()
+    if kind in PROCESS_KINDS:
+        # Arguments and result are pickled; context variables don't cross processes
+        call = functools.partial(fn, *args, **kwargs)
+    else:
+        call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+    return await loop.run_in_executor(get_pool(kind), call)
+
+
+def offload(kind: str):
+    """Make a blocking function awaitable on the pool for its kind"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            return await run_blocking(kind, fn, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def shutdown_pools():
+    for pool in list(_pools.values()):
+        pool.shutdown(wait=False, cancel_futures=True)
+    _pools.clear()
+
+
+class LoopWatchdog:
+    """Logs the event loop thread's stack whenever the loop stalls for longer than `threshold` seconds.
+
+    A heartbeat task on the loop stamps the time every `interval`; a separate
+    thread notices when the stamp goes stale and captures what the loop
+    thread is executing at that moment, i.e. the blocking call itself.
+    """
+
+    def __init__(self, threshold: float = 0.25, interval: float = 0.05, keep: int = 50):
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls = collections.deque(maxlen=keep)
+        self._beat = time.monotonic()
+        self._loop_thread_id = None
+        self._stopped = threading.Event()
+
+    async def run(self):
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        watcher = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        watcher.start()
+        try:
+            while True:
+                now = time.monotonic()
+                stalled_for = now - self._beat - self.interval
+                if stalled_for > self.threshold and self.stalls and self.stalls[-1]["duration_ms"] is None:
+                    # The stall the watcher reported has ended; record how long it lasted
+                    self.stalls[-1]["duration_ms"] = round(stalled_for * 1000, 1)
+                self._beat = now
+                await asyncio.sleep(self.interval)
+        finally:
+            self._stopped.set()
+
+    def _watch(self):
+        reported = False
+        while not self._stopped.wait(self.interval):
+            stalled_for = time.monotonic() - self._beat - self.interval
+            if stalled_for <= self.threshold:
+                reported = False
+                continue
+            if reported:
+                continue
+            reported = True
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+            self.stalls.append({
+                "detected_at": datetime.utcnow().isoformat(),
+                "stalled_ms_at_detection": round(stalled_for * 1000, 1),
+                "duration_ms": None,
+                "stack": stack,
+            })
+            metrics.EVENT_LOOP_STALLS.labels().inc()
+            logger.warning(f"Event loop blocked for {stalled_for * 1000:.0f}ms, currently in:\n{stack}")
@@ -0,0 +1,218 @@
+# recording.py
+"""Recording of ingested observations and API requests, for deterministic replay.
+
+With TRAFFIC_RECORD_PATH set, the server writes every batch of ingested
+observations and every /api request to a log:
+
+    magic (8 bytes) | header frame | frame | frame | ...      (gzip-compressed)
+    frame = offset (float64, seconds since the recording started) | length (uint32) | BSON document
+
+Each document has a "kind" ("observations" or "request") and "at", the
+server's wall-clock time when it happened. benchmarks/replay.py re-drives a
+log into the app at 1x, Nx or maximum speed.
+
+TrafficClock is the time and random source of the synthetic data paths. With
+a seed, each draw site gets its own generator keyed by what it is drawing
+for (city, minute, route ...), so runs are reproducible whatever the order
+requests are served in. During a replay, now() is the recorded time of the
+event being replayed.
+"""
+import contextlib
+import contextvars
+import gzip
+import logging
+import os
+import random
+import struct
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"TRAFLOG1"
+FRAME = struct.Struct("<dI")
+FLUSH_SECONDS = 1.0
+
+# The recorded time of the event being replayed in this context
+replay_time: contextvars.ContextVar[Optional[datetime]] = contextvars.ContextVar("replay_time", default=None)
+
+
+@contextlib.contextmanager
+def at_time(when: datetime):
+    """Run (and start tasks) with TrafficClock.now() fixed to `when`"""
+    token = replay_time.set(when)
+    try:
+        yield
+    finally:
+        replay_time.reset(token)
+
+
+class TrafficClock:
+    """Wall clock and random source of the synthetic data paths"""
+
+    def __init__(self, seed: Optional[int] = None):
+        self.seed = seed
+
+    def now(self) -> datetime:
+        return replay_time.get() or datetime.now()
+
+    def random(self, *key) -> random.Random:
+        """Generator for one draw; with a seed, the same key always draws the same numbers"""
+        if self.seed is None:
+            return random.Random()
+        return random.Random(":".join(str(part) for part in (self.seed, *key)))
+
+
+class RecordWriter:
+    """Appends frames to a gzip-compressed log"""
+
+    def __init__(self, path: str, **header):
+        import bson
+
+        self._encode = bson.encode
+        self.path = path
+        self._file = gzip.open(path, "wb")
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._flushed = self._started
+        self.frames = 0
+        self._file.write(MAGIC)
+        self._frame(0.0, {"kind": "header", "version": 1, "started_at": datetime.now(), **header})
+
+    def _frame(self, offset: float, document: Dict):
+        data = self._encode(document)
+        self._file.write(FRAME.pack(offset, len(data)))
+        self._file.write(data)
+
+    def write(self, kind: str, document: Dict):
+        """Record one event now"""
+        now = time.monotonic()
+        with self._lock:
+            if self._file is None:
+                return
+            try:
+                self._frame(now - self._started, {"kind": kind, "at": datetime.now(), **document})
+                self.frames += 1
+                if now - self._flushed > FLUSH_SECONDS:
+                    self._file.flush()
+                    self._flushed = now
+            except Exception as e:
+                logger.error(f"Could not record {kind} to {self.path}: {e!r}")
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        logger.info(f"Recorded {self.frames} events to {self.path}")
+
+    def detach(self):
+        """Drop a writer inherited through fork without touching the parent's log"""
+        # Not under the lock: another thread of the parent may have held it at fork
+        if self._file is not None:
+            # Closing flushes the buffer and writes the gzip trailer: send them nowhere
+            null = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(null, self._file.fileno())
+            os.close(null)
+            self._file.close()
+            self._file = None
+
+
+class ProcessRecorder:
+    """A RecordWriter per process, opened on the first event that process records.
+
+    The app module can be imported in a gunicorn master and forked into
+    workers; opening lazily means every worker writes its own file (the path
+    template's {pid}) and none inherits another process's gzip stream.
+    """
+
+    def __init__(self, path_template: str, **header):
+        self.path_template = path_template
+        self.header = header
+        self._writer: Optional[RecordWriter] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def writer(self) -> RecordWriter:
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    if self._writer is not None:
+                        self._writer.detach()
+                    self._writer = RecordWriter(self.path_template.format(pid=pid), **self.header)
+                    self._pid = pid
+        return self._writer
+
+    def write(self, kind: str, document: Dict):
+        self.writer().write(kind, document)
+
+    def close(self):
+        if self._pid == os.getpid():
+            self._writer.close()
+
+
+def read_records(path: str) -> Iterator[Tuple[float, Dict]]:
+    """(offset, document) of every frame of a log, header first; a truncated tail is ignored"""
+    import bson
+
+    with gzip.open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a traffic recording")
+        while True:
+            try:
+                head = f.read(FRAME.size)
+                if len(head) < FRAME.size:
+                    return
+                offset, length = FRAME.unpack(head)
+                data = f.read(length)
+            except EOFError:  # written up to a flush, then the process died
+                return
+            if len(data) < length:
+                return
+            yield offset, bson.decode(data)
+
+
+class RecordingMiddleware:
+    """ASGI middleware recording the method, path, query and body of API requests"""
+
+    def __init__(self, app, writer, prefix: str = "/api", exclude=None):
+        self.app = app
+        self.writer = writer
+        self.prefix = prefix
+        # Requests that would not end when replayed, such as server-sent event streams
+        self.exclude = exclude
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or not path.startswith(self.prefix) or (self.exclude and self.exclude.search(path)):
+            await self.app(scope, receive, send)
+            return
+
+        body, more = b"", True
+        while more:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            body += message.get("body", b"")
+            more = message.get("more_body", False)
+        self.writer.write("request", {
+            "method": scope["method"],
+            "path": path,
+            "query": scope.get("query_string", b"").decode("latin-1"),
+            "content_type": dict(scope.get("headers") or []).get(b"content-type", b"").decode("latin-1"),
+            "body": body,
+        })
+
+        delivered = False
+
+        async def replay_receive():
+            nonlocal delivered
+            if not delivered:
+                delivered = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        await self.app(scope, replay_receive, send)
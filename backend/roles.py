@@ -0,0 +1,279 @@
+# roles.py
+"""Process roles for the traffic backend.
+
+    python roles.py --role api                # HTTP only (uvicorn)
+    python roles.py --role trainer            # trains models and publishes them
+    python roles.py --role stream-supervisor  # owns the FFmpeg HLS processes
+    python roles.py --role analyzer           # periodic traffic snapshots/analysis
+    python roles.py --role all                # everything in one process (default); with
+                                              # several workers, the leader runs the rest
+    python roles.py --role api --production   # gunicorn, preloaded multi-worker API
+
+The role can also be set with APP_ROLE. Roles only share state through the
+versioned model store on disk and MongoDB, so each can be scaled on its own:
+the trainer publishes a model version and API processes hot-swap to it.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROLES = ["all", "api", "trainer", "stream-supervisor", "analyzer"]
+
+logger = logging.getLogger("roles")
+
+
+async def train_city(server, city: str, job: dict = None) -> bool:
+    """Train one city, publish it and record the outcome in Mongo"""
+    engine = server.TrafficMLEngine()
+    started = time.perf_counter()
+    await server.sync_training_data(city)
+    # Loading and training are CPU-bound; a thread keeps Mongo heartbeats alive
+    training_data = await asyncio.to_thread(server.load_training_frame, city)
+    success = await asyncio.to_thread(engine.train_models, city, training_data=training_data)
+    duration = time.perf_counter() - started
+    # Counted by the callers of train_models, as in server.train_and_swap_models
+    if success:
+        server.metrics.ML_TRAINING_DURATION.labels(city).observe(duration)
+    server.metrics.ML_TRAINING_RUNS.labels(city, "success" if success else "failure").inc()
+
+    try:
+        if success:
+            await server.db.model_versions.insert_one({
+                "city": city,
+                "version": engine.model_version,
+                "published_at": datetime.utcnow(),
+                "training_seconds": round(duration, 1),
+                "accuracy_metrics": {k: float(v) for k, v in engine.model_accuracy.items()},
+                "trainer": socket.gethostname(),
+                "job_id": job["job_id"] if job else None,
+            })
+        if job:
+            await server.db.training_jobs.update_one(
+                {"_id": job["_id"]},
+                {"$set": {
+                    "status": "completed" if success else "failed",
+                    "version": engine.model_version,
+                    "finished_at": datetime.utcnow(),
+                }}
+            )
+    except Exception as e:
+        logger.warning(f"Could not record training result for {city}: {e}")
+    return success
+
+
+async def run_trainer():
+    """Train on schedule and on request; never serves HTTP"""
+    import server
+    from pymongo import ReturnDocument
+
+    poll_seconds = float(os.environ.get("TRAINER_POLL_SECONDS", 10))
+    retrain_after = timedelta(hours=float(os.environ.get("RETRAIN_INTERVAL_HOURS", 24)))
+    retry_after = timedelta(minutes=10)
+    worker = socket.gethostname()
+    last_attempt = {}
+    last_online_update = time.monotonic()
+    logger.info(f"Trainer {worker} started")
+
+    while True:
+        # Incremental updates from observations recorded since the last version
+        if time.monotonic() - last_online_update > server.ONLINE_UPDATE_SECONDS:
+            last_online_update = time.monotonic()
+            for city in list(server.ml_engines):
+                try:
+                    await server.update_models_online(city)
+                except Exception as e:
+                    logger.error(f"Online model update failed for {city}: {e}")
+
+        # Scheduled retrains: cities with no published model or a stale one
+        for city in list(server.ml_engines):
+            manifest = server.model_store.current_version(city)
+            stale = manifest is None or \
+                datetime.fromisoformat(manifest["published_at"]) < datetime.utcnow() - retrain_after
+            if stale and datetime.utcnow() - last_attempt.get(city, datetime.min) > retry_after:
+                logger.info(f"Scheduled retrain for {city}")
+                last_attempt[city] = datetime.utcnow()
+                await train_city(server, city)
+
+        # Requested retrains queued by the API role
+        try:
+            job = await server.db.training_jobs.find_one_and_update(
+                {"status": "pending"},
+                {"$set": {"status": "running", "worker": worker, "started_at": datetime.utcnow()}},
+                sort=[("requested_at", 1)],
+                return_document=ReturnDocument.AFTER,
+            )
+        except Exception as e:
+            logger.warning(f"Could not poll training jobs: {e}")
+            job = None
+
+        if job:
+            logger.info(f"Running training job {job['job_id']} for {job['city']}")
+            await train_city(server, job["city"], job)
+        else:
+            await asyncio.sleep(poll_seconds)
+
+
+# A stream that ran this long was healthy, and is restarted right away when it exits
+STREAM_HEALTHY_SECONDS = float(os.environ.get("STREAM_HEALTHY_SECONDS", 60))
+STREAM_MAX_BACKOFF = 300
+
+
+class RestartBackoff:
+    """When to restart each process: exponentially later while it keeps dying young"""
+
+    def __init__(self, base_seconds: float, max_seconds: float = STREAM_MAX_BACKOFF,
+                 healthy_seconds: float = STREAM_HEALTHY_SECONDS):
+        self.base_seconds = base_seconds
+        self.max_seconds = max_seconds
+        self.healthy_seconds = healthy_seconds
+        self.failures = {}
+        self.started_at = {}
+        self.next_start = {}
+
+    def ready(self, key, now: float) -> bool:
+        return now >= self.next_start.get(key, 0)
+
+    def started(self, key, now: float):
+        self.started_at[key] = now
+
+    def stopped(self, key, now: float) -> float:
+        """Record an exit (or a failed start) and return the delay before the next start"""
+        lived = now - self.started_at.pop(key, now)
+        if lived >= self.healthy_seconds:
+            self.failures[key] = 0
+            delay = 0.0
+        else:
+            self.failures[key] = self.failures.get(key, 0) + 1
+            delay = min(self.max_seconds, self.base_seconds * 2 ** self.failures[key])
+        self.next_start[key] = now + delay
+        return delay
+
+
+async def run_stream_supervisor():
+    """Start an FFmpeg process per camera and restart any that exit"""
+    import server
+
+    check_seconds = float(os.environ.get("STREAM_CHECK_SECONDS", 5))
+    processes = {}
+    # An FFmpeg that exits right away (bad URL, camera offline) is retried later and later
+    backoff = RestartBackoff(check_seconds)
+
+    try:
+        while True:
+            for cam in server.cameras:
+                cam_id = cam["id"]
+                proc = processes.get(cam_id)
+                if proc is not None and proc.poll() is None:
+                    continue
+                if proc is not None:
+                    delay = backoff.stopped(cam_id, time.monotonic())
+                    logger.warning(f"Stream {cam_id} exited with code {proc.returncode} (restart in {delay:.0f}s)")
+                    processes.pop(cam_id)
+                if not backoff.ready(cam_id, time.monotonic()):
+                    continue
+
+                try:
+                    processes[cam_id] = server.start_hls_stream(cam, restart=True)
+                    backoff.started(cam_id, time.monotonic())
+                    logger.info(f"Started HLS stream for camera {cam_id}")
+                except Exception as e:
+                    delay = backoff.stopped(cam_id, time.monotonic())
+                    logger.error(f"Could not start stream {cam_id} (retry in {delay:.0f}s): {e}")
+            await asyncio.sleep(check_seconds)
+    finally:
+        for proc in processes.values():
+            if proc is not None and proc.poll() is None:
+                proc.terminate()
+
+
+async def record_traffic_snapshots(server):
+    """Store the current traffic picture of every city in traffic_data and check it for incidents"""
+    now = datetime.utcnow()
+    for city in list(server.ml_engines):
+        await server.ensure_simulated_day(city)
+        records = server.generate_realistic_traffic_data(city)
+        for record in records:
+            record["timestamp"] = now
+            # Generated, not measured: kept out of training (training_data.OBSERVED)
+            record["synthetic"] = True
+        await server.ingest_observations(city, records)
+
+
+# Periodic jobs run by the analyzer role, in order, once per interval
+ANALYZER_TASKS = [record_traffic_snapshots]
+
+
+async def run_analyzer():
+    """Run the periodic analysis jobs"""
+    import server
+
+    interval = float(os.environ.get("ANALYZER_INTERVAL_SECONDS", 60))
+    while True:
+        started = time.perf_counter()
+        for task in ANALYZER_TASKS:
+            try:
+                await task(server)
+            except Exception as e:
+                logger.error(f"Analyzer task {task.__name__} failed: {e}")
+        await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+
+def run_worker(role: str):
+    """Run a non-HTTP role until SIGTERM/SIGINT"""
+    runners = {
+        "trainer": run_trainer,
+        "stream-supervisor": run_stream_supervisor,
+        "analyzer": run_analyzer,
+    }
+
+    async def main():
+        task = asyncio.create_task(runners[role]())
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, task.cancel)
+            except NotImplementedError:  # Windows
+                pass
+        try:
+            await task
+        except asyncio.CancelledError:
+            logger.info(f"{role} stopped")
+
+    asyncio.run(main())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AI Traffic Optimizer process roles")
+    parser.add_argument("--role", choices=ROLES, default=os.environ.get("APP_ROLE", "all"))
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8001)))
+    parser.add_argument("--production", action="store_true",
+                        help="serve with gunicorn workers sharing preloaded models (api/all roles)")
+    parser.add_argument("--workers", type=int, default=None, help="gunicorn worker count (default: WORKERS)")
+    args = parser.parse_args(argv)
+
+    # server reads APP_ROLE at import time, so set it before anything imports server
+    os.environ["APP_ROLE"] = args.role
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.role in ("all", "api") and args.production:
+        os.environ["HOST"], os.environ["PORT"] = args.host, str(args.port)
+        if args.workers:
+            os.environ["WORKERS"] = str(args.workers)
+        config = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gunicorn.conf.py")
+        os.execvp(sys.executable, [sys.executable, "-m", "gunicorn", "-c", config, "server:app"])
+    elif args.role in ("all", "api"):
+        import uvicorn
+        uvicorn.run("server:app", host=args.host, port=args.port)
+    else:
+        run_worker(args.role)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+# scenarios.py
+"""What-if scenarios run on the traffic simulator, in parallel, as jobs.
+
+A scenario is a list of interventions on a city's road network:
+
+    {"type": "lane_closure", "from": "ACC_002", "to": "ACC_001", "lanes": 1, "both_directions": false}
+    {"type": "signal_timing", "intersection_id": "KUM_001",
+     "timing": {"cycle_length": 90, "north_south_green": 40, "east_west_green": 28, "offset": 0}}
+    {"type": "special_event", "intersection_id": "KUM_001", "multiplier": 2.5,
+     "start": "2024-03-04T17:00:00", "end": "2024-03-04T19:00:00"}
+    {"type": "demand", "multiplier": 1.1}                    # optionally for one "intersection_id"
+
+A batch of scenarios becomes a job. Its scenarios and a baseline (no
+interventions) run in the "simulation" process pool, and the job reports
+their KPIs and changes against the baseline. Each run is identified by a
+hash of the network, period, seed and interventions. Finished runs are kept
+in an LRU cache, and a run already in progress is shared, so repeating or
+overlapping batches only simulate what is new.
+
+Workers receive the read-only network definition (intersections and
+corridors) with each run. Each worker builds a road network once per
+definition and lane layout, and reuses it for later runs.
+"""
+import asyncio
+import collections
+import hashlib
+import json
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+INTERVENTION_TYPES = ["lane_closure", "signal_timing", "special_event", "demand"]
+BASELINE = "baseline"
+
+# Networks built in this (worker) process, by definition and lane layout
+_networks: Dict[str, Any] = {}
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def run_key(network: Dict, start: datetime, hours: float, seed: int, interventions: Sequence[Dict]) -> str:
+    """Hash identifying one simulation run"""
+    return _digest({"network": network, "start": start.isoformat(), "hours": hours, "seed": seed,
+                    "interventions": list(interventions)})[:16]
+
+
+def compile_interventions(network: Dict, interventions: Sequence[Dict]) -> Dict[str, Any]:
+    """Simulator inputs for a scenario's interventions; ValueError if one is invalid"""
+    from signal_optimizer import LOST_TIME_PER_PHASE
+    from traffic_simulation import road_graph
+
+    ids = {i["id"] for i in network["intersections"]}
+    roads = set(road_graph(network["intersections"], network["corridors"]))
+    lane_overrides, signal_plans, demand_scale, demand_events = {}, {}, {}, []
+
+    def intersection(intervention):
+        intersection_id = intervention.get("intersection_id")
+        if intersection_id not in ids:
+            raise ValueError(f"Unknown intersection {intersection_id!r}")
+        return intersection_id
+
+    def multiplier(intervention):
+        value = intervention.get("multiplier")
+        if not isinstance(value, (int, float)) or not 0 <= value <= 10:
+            raise ValueError("multiplier must be a number between 0 and 10")
+        return float(value)
+
+    for intervention in interventions:
+        kind = intervention.get("type")
+        if kind == "lane_closure":
+            road = (intervention.get("from"), intervention.get("to"))
+            lanes = intervention.get("lanes", 0)
+            if not isinstance(lanes, int) or not 0 <= lanes <= 6:
+                raise ValueError("lanes must be an integer between 0 and 6")
+            closed = [road, road[::-1]] if intervention.get("both_directions") else [road]
+            for a, b in closed:
+                if (a, b) not in roads:
+                    raise ValueError(f"No road from {a!r} to {b!r}")
+                lane_overrides[(a, b)] = lanes
+        elif kind == "signal_timing":
+            timing = dict(intervention.get("timing") or {})
+            try:
+                cycle, ns, ew = (float(timing[k]) for k in ("cycle_length", "north_south_green", "east_west_green"))
+            except (KeyError, TypeError, ValueError):
+                raise ValueError("timing needs numeric cycle_length, north_south_green and east_west_green")
+            if min(ns, ew) < 0 or ns + ew + 2 * LOST_TIME_PER_PHASE > cycle:
+                raise ValueError("greens plus lost time must fit in the cycle")
+            signal_plans[intersection(intervention)] = {
+                "cycle_length": cycle, "north_south_green": ns, "east_west_green": ew,
+                "offset": float(timing.get("offset", 0))}
+        elif kind == "special_event":
+            try:
+                window = [datetime.fromisoformat(str(intervention[k])) for k in ("start", "end")]
+            except KeyError:
+                window = [datetime.min, datetime.max]
+            except ValueError as e:
+                raise ValueError(f"Invalid event time: {e}")
+            demand_events.append({"intersection_id": intersection(intervention), "start": window[0],
+                                  "end": window[1], "multiplier": multiplier(intervention)})
+        elif kind == "demand":
+            targets = [intersection(intervention)] if intervention.get("intersection_id") else sorted(ids)
+            for target in targets:
+                demand_scale[target] = demand_scale.get(target, 1.0) * multiplier(intervention)
+        else:
+            raise ValueError(f"Intervention type must be one of {', '.join(INTERVENTION_TYPES)}")
+    return {"lane_overrides": lane_overrides, "signal_plans": signal_plans,
+            "demand_scale": demand_scale, "demand_events": demand_events}
+
+
+def _network(network: Dict, lane_overrides: Dict[tuple, int]):
+    """This process's road network for a definition and lane layout"""
+    from traffic_simulation import RoadNetwork
+
+    key = _digest([network, sorted(lane_overrides.items())])
+    if key not in _networks:
+        _networks[key] = RoadNetwork(network["intersections"], network["corridors"], dt=network["dt"],
+                                     lane_overrides=lane_overrides)
+    return _networks[key]
+
+
+def run_scenario(spec: Dict) -> Dict:
+    """Simulate one scenario and summarise it; runs in a simulation worker"""
+    from traffic_simulation import simulate
+
+    started = time.perf_counter()
+    inputs = compile_interventions(spec["network"], spec["interventions"])
+    network = _network(spec["network"], inputs["lane_overrides"])
+    result = simulate(network, spec["start"], hours=spec["hours"], record_every=300,
+                      signal_plans=inputs["signal_plans"], demand_scale=inputs["demand_scale"],
+                      demand_events=inputs["demand_events"], seed=spec["seed"])
+    return {
+        "kpis": result["kpis"],
+        "intersections": {
+            intersection_id: {
+                "average_queue_vehicles": round(float(result["queue"][:, n].mean()), 1),
+                "average_speed": round(float(result["average_speed"][:, n].mean()), 1),
+                "vehicles_per_5_min": round(float(result["vehicle_count"][:, n].mean()), 1),
+            } for n, intersection_id in enumerate(result["intersection_ids"])
+        },
+        "runtime_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def _change(value: float, baseline: float) -> Optional[float]:
+    return round((value - baseline) / baseline * 100, 1) if baseline else None
+
+
+def compare(result: Dict, baseline: Dict) -> Dict:
+    """A scenario's KPIs relative to the baseline"""
+    kpis, base = result["kpis"], baseline["kpis"]
+    return {
+        "delay_change_pct": _change(kpis["total_delay_vehicle_hours"], base["total_delay_vehicle_hours"]),
+        "average_delay_change_s": round(kpis["average_delay_seconds"] - base["average_delay_seconds"], 1),
+        "throughput_change_pct": _change(kpis["throughput_vehicles"], base["throughput_vehicles"]),
+        "queue_change_pct": _change(kpis["average_queue_vehicles"], base["average_queue_vehicles"]),
+    }
+
+
+class ScenarioService:
+    """Scenario batches as jobs, with identical runs cached and shared by hash"""
+
+    def __init__(self, run: Callable[[Dict], Awaitable[Dict]], cache_entries: int = 256, keep_jobs: int = 200,
+                 save: Optional[Callable[[Dict], Awaitable[None]]] = None):
+        self.run = run
+        self.cache_entries = cache_entries
+        self.keep_jobs = keep_jobs
+        self.save = save
+        self.jobs: "collections.OrderedDict[str, Dict]" = collections.OrderedDict()
+        self._results: "collections.OrderedDict[str, Dict]" = collections.OrderedDict()
+        self._running: Dict[str, asyncio.Future] = {}
+        self._tasks = set()
+
+    def submit(self, city: str, network: Dict, start: datetime, hours: float, seed: int,
+               scenarios: Sequence[Dict]) -> Dict:
+        """Validate a batch and start it as a job; ValueError if a scenario is invalid"""
+        names = [s["name"] for s in scenarios]
+        if BASELINE in names or len(set(names)) != len(names):
+            raise ValueError(f"Scenario names must be unique and not {BASELINE!r}")
+        specs = {BASELINE: {"network": network, "start": start, "hours": hours, "seed": seed, "interventions": []}}
+        for scenario in scenarios:
+            try:
+                compile_interventions(network, scenario["interventions"])
+            except ValueError as e:
+                raise ValueError(f"Scenario {scenario['name']!r}: {e}")
+            specs[scenario["name"]] = {**specs[BASELINE], "interventions": list(scenario["interventions"])}
+        keys = {name: run_key(**spec) for name, spec in specs.items()}
+
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "city": city,
+            "status": "queued",
+            "period": {"start": start.isoformat(), "hours": hours, "seed": seed},
+            "scenarios": [{"name": name, "hash": keys[name], "cached": keys[name] in self._results} for name in names],
+            "created_at": datetime.utcnow(),
+            "finished_at": None,
+            "results": None,
+            "error": None,
+        }
+        self.jobs[job["job_id"]] = job
+        while len(self.jobs) > self.keep_jobs:
+            self.jobs.popitem(last=False)
+        task = asyncio.create_task(self._run_job(job, specs, keys))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _result(self, key: str, spec: Dict) -> Dict:
+        """A run's result from the cache, from the identical run in progress, or by running it"""
+        if key in self._results:
+            self._results.move_to_end(key)
+            return self._results[key]
+        if key not in self._running:
+            self._running[key] = asyncio.ensure_future(self.run(spec))
+        try:
+            result = await asyncio.shield(self._running[key])
+        finally:
+            if self._running.get(key) is not None and self._running[key].done():
+                self._running.pop(key, None)
+        self._results[key] = result
+        while len(self._results) > self.cache_entries:
+            self._results.popitem(last=False)
+        return result
+
+    async def _run_job(self, job: Dict, specs: Dict[str, Dict], keys: Dict[str, str]):
+        job["status"] = "running"
+        await self._save(job)
+        started = time.perf_counter()
+        try:
+            names = list(specs)
+            results = dict(zip(names, await asyncio.gather(*(self._result(keys[n], specs[n]) for n in names))))
+            baseline = results.pop(BASELINE)
+            scenarios = [{"name": name, "hash": keys[name], **result, "compared_to_baseline": compare(result, baseline)}
+                         for name, result in results.items()]
+            job["results"] = {
+                BASELINE: {"hash": keys[BASELINE], **baseline},
+                "scenarios": scenarios,
+                "ranking": [s["name"] for s in sorted(scenarios, key=lambda s: s["kpis"]["total_delay_vehicle_hours"])],
+            }
+            job["status"] = "completed"
+        except Exception as e:
+            logger.error(f"Scenario job {job['job_id']} failed: {e!r}")
+            job["status"], job["error"] = "failed", str(e)
+        job["finished_at"] = datetime.utcnow()
+        job["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        await self._save(job)
+
+    async def _save(self, job: Dict):
+        if self.save is not None:
+            try:
+                await self.save(job)
+            except Exception as e:
+                logger.warning(f"Could not save scenario job {job['job_id']}: {e!r}")
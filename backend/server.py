@@ -1,12 +1,10 @@
 import logging
-from fastapi import FastAPI, APIRouter, HTTPException, BackgroundTasks
+from fastapi import FastAPI, APIRouter, HTTPException, BackgroundTasks, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 import os
-import google.generativeai as genai
 from pathlib import Path
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from typing import List, Optional, Dict, Any
 import uuid
 from datetime import datetime, timedelta
@@ -14,37 +12,109 @@ import asyncio
 import json
 import random
 import math
-import numpy as np
-import pandas as pd
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor, RandomForestClassifier
-from sklearn.linear_model import LinearRegression, LogisticRegression
-from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sklearn.model_selection import train_test_split, cross_val_score
-from sklearn.metrics import mean_absolute_error, mean_squared_error, accuracy_score, classification_report
-from sklearn.svm import SVR
-import joblib
-import pickle
+import re
 import time
 import warnings
+import zlib
 import subprocess
+import tempfile
+import threading
 from fastapi import FastAPI, Response
-from fastapi.responses import FileResponse, JSONResponse
-from pathlib import Path
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from typing import TYPE_CHECKING
+from model_store import ModelStore
+from training_data import OBSERVED, TrainingDataStore
+from camera_snapshots import FORMATS as SNAPSHOT_FORMATS, CameraSnapshots, extract_keyframe
+from chat_gateway import ChatGateway, ChatBusy, ChatTimeout, FakeBackend, GeminiBackend
+from snapshots import SnapshotCache
+from stream_profiles import hls_command
+from insights import InsightEngine
+import analytics
+import history
+import scenarios
+from incidents import IncidentFeed, IncidentMonitor, incident_json
+from leader import LeaderLock
+import metrics
+from recording import ProcessRecorder, RecordingMiddleware, TrafficClock
+from offload import offload, run_blocking, shutdown_pools, LoopWatchdog
 warnings.filterwarnings('ignore')
 
+# NumPy, pandas, scikit-learn, joblib, Motor and the Gemini SDK (and the
+# modules built on them) are imported on first use so the API process starts
+# and answers health checks in well under a second
+if TYPE_CHECKING:
+    import pandas as pd
+
 # Load environment variables
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / ".env")
 
-# MongoDB connection
+# MongoDB connection (Motor/pymongo are imported on first database use)
 mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-client = AsyncIOMotorClient(mongo_url)
 db_name = os.environ.get('DB_NAME', 'traffic_db')
-db = client[db_name]
+client = None
+
+def get_mongo_client():
+    """Create the shared Motor client on first use"""
+    global client
+    if client is None:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(mongo_url, event_listeners=metrics.mongo_event_listeners())
+    return client
+
+class LazyDatabase:
+    """Stands in for the Motor database until a collection is first touched"""
+    def __getattr__(self, name):
+        return getattr(get_mongo_client()[db_name], name)
+
+    def __getitem__(self, name):
+        return get_mongo_client()[db_name][name]
+
+db = LazyDatabase()
+
+# Feature switches (see .env)
+ENABLE_RTSP = os.environ.get('ENABLE_RTSP', 'true').lower() == 'true'
+
+# Admin endpoints (profiling) are disabled unless a token is configured
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# Log the event loop's stack whenever it is blocked for longer than this
+loop_watchdog = LoopWatchdog(threshold=float(os.environ.get('LOOP_STALL_THRESHOLD_MS', 250)) / 1000)
+
+# Process role (see roles.py): "all" keeps the single-process behaviour, while
+# "api" only serves HTTP and leaves training and FFmpeg to their own processes
+APP_ROLE = os.environ.get('APP_ROLE', 'all')
+
+# Versioned model store shared with the trainer role
+model_store = ModelStore(os.environ.get('MODEL_DIR', 'models'))
+MODEL_POLL_SECONDS = int(os.environ.get('MODEL_POLL_SECONDS', 30))
+
+# Observed traffic exported from Mongo for training; below this many rows in
+# the training window, models are trained on synthetic data instead
+training_data_store = TrainingDataStore(os.environ.get('TRAINING_DATA_DIR', 'training_data'))
+TRAINING_MIN_OBSERVATIONS = int(os.environ.get('TRAINING_MIN_OBSERVATIONS', 5000))
+
+# With several workers (gunicorn), one elected leader per host starts the
+# FFmpeg streams and trains missing models; the others only serve requests
+leader_lock = LeaderLock(os.environ.get('LEADER_LOCK_FILE', os.path.join(tempfile.gettempdir(), 'traffic-leader.lock')))
+LEADER_RETRY_SECONDS = int(os.environ.get('LEADER_RETRY_SECONDS', 5))
+
+def owns_background_duties() -> bool:
+    """True for the process that runs streams and training when APP_ROLE is 'all'"""
+    return APP_ROLE == "all" and leader_lock.is_leader
 
 STREAM_DIR = ROOT_DIR / "streams"
 STREAM_DIR.mkdir(exist_ok=True)
 
+# Stream profile of cameras without their own "stream" options
+STREAM_DEFAULTS = {
+    "low_latency": os.environ.get('STREAM_LOW_LATENCY', 'false').lower() == 'true',
+    "renditions": [r for r in os.environ.get('STREAM_RENDITIONS', '').split(',') if r],
+}
+
+# FFmpeg processes started by this process, by camera id (for /metrics)
+stream_processes: Dict[str, subprocess.Popen] = {}
+
 def start_hls_stream(cam):
     if "source_rtsp" not in cam:
         print(f"No RTSP source for camera {cam['id']}")
@@ -77,27 +147,27 @@ with open(ROOT_DIR / "cams.json") as f:
     cameras = json.load(f)
 
 # Function to start FFmpeg HLS streams (non-blocking)
-def start_hls_stream(cam):
+def start_hls_stream(cam, restart: bool = False):
     cam_id = cam['id']
-    rtsp_url = cam['source_rtsp']
     output_path = STREAM_DIR / f"{cam_id}.m3u8"
 
-    # Skip if already exists
-    if output_path.exists():
-        return
+    # Skip if already exists (unless the supervisor is restarting a dead stream)
+    if output_path.exists() and not restart:
+        return None
 
-    cmd = [
-        "ffmpeg",
-        "-i", rtsp_url,
-        "-c:v", "copy",
-        "-c:a", "aac",
-        "-f", "hls",
-        "-hls_time", "2",
-        "-hls_list_size", "3",
-        "-hls_flags", "delete_segments",
-        str(output_path)
-    ]
-    subprocess.Popen(cmd)
+    # Copy, low-latency or ABR ladder, from the camera's "stream" options (stream_profiles.py)
+    cmd = hls_command(cam, STREAM_DIR, STREAM_DEFAULTS)
+    proc = subprocess.Popen(cmd)
+    stream_processes[cam_id] = proc
+    return proc
+
+def collect_stream_states():
+    """Refresh the FFmpeg process gauges before a metrics scrape"""
+    running = sum(1 for proc in stream_processes.values() if proc.poll() is None)
+    metrics.FFMPEG_PROCESSES.labels("running").set(running)
+    metrics.FFMPEG_PROCESSES.labels("exited").set(len(stream_processes) - running)
+
+metrics.REGISTRY.add_collector(collect_stream_states)
 
 # Create the main app first
 app = FastAPI(
@@ -109,13 +179,6 @@ app = FastAPI(
 def health():
     return Response(status_code=200)
 
-# Then define startup event
-@app.on_event("startup")
-async def start_all_camera_streams():
-    for cam in cameras:
-        start_hls_stream(cam)
-
-
 # Enhanced CORS configuration
 app.add_middleware(
     CORSMiddleware,
@@ -125,15 +188,47 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency per route; outside CORS so it also times the CORS handling
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Deterministic data paths and recording for replay (recording.py, benchmarks/replay.py):
+# TRAFFIC_SEED makes the synthetic traffic and routes reproducible, TRAFFIC_RECORD_PATH
+# records observations and API requests. Each process opens its own log on its first
+# event, so use {pid} in the path when several workers serve the API
+TRAFFIC_SEED = int(os.environ['TRAFFIC_SEED']) if os.environ.get('TRAFFIC_SEED') else None
+TRAFFIC_RECORD_PATH = os.environ.get('TRAFFIC_RECORD_PATH')
+# Requests that never end, like event streams, cannot be replayed
+RECORD_EXCLUDE = r"^/api/(incidents/[^/]+/stream|admin/)"
+
+traffic_clock = TrafficClock(TRAFFIC_SEED)
+traffic_recorder = None
+if TRAFFIC_RECORD_PATH:
+    traffic_recorder = ProcessRecorder(TRAFFIC_RECORD_PATH, seed=TRAFFIC_SEED)
+    # Outermost, so it records requests before metrics and CORS see them
+    app.add_middleware(RecordingMiddleware, writer=traffic_recorder, exclude=re.compile(RECORD_EXCLUDE))
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return Response(metrics.REGISTRY.expose(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
 # Load Gemini API key
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
-else:
-    print("⚠️ No GEMINI_API_KEY found in .env. Gemini AI Chat is disabled.")
+if not GEMINI_API_KEY:
+    print("⚠️ No GEMINI_API_KEY found in .env. Gemini AI Chat is disabled (offline chat backend).")
+
+_genai = None
+
+def get_genai():
+    """Import and configure the Gemini SDK on first use (None when no API key)"""
+    global _genai
+    if _genai is None and GEMINI_API_KEY:
+        import google.generativeai as genai
+        genai.configure(api_key=GEMINI_API_KEY)
+        _genai = genai
+    return _genai
 
 # Pydantic Models
 class Location(BaseModel):
@@ -142,9 +237,12 @@ class Location(BaseModel):
 
 class ChatRequest(BaseModel):
     message: str
+    city: Optional[str] = None  # inferred from the message when omitted
 
 class ChatResponse(BaseModel):
     reply: str
+    city: Optional[str] = None
+    cached: bool = False
 
 class TrafficData(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -175,6 +273,63 @@ class RouteRecommendation(BaseModel):
     ai_insights: str
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
+class ScenarioSpec(BaseModel):
+    name: str
+    interventions: List[Dict[str, Any]]  # lane_closure, signal_timing, special_event, demand (scenarios.py)
+
+class ScenarioBatchRequest(BaseModel):
+    scenarios: List[ScenarioSpec]
+    start: Optional[datetime] = None  # default: today's evening peak
+    hours: float = 3
+    seed: Optional[int] = None  # default: the city and day's seed
+
+class SignalTiming(BaseModel):
+    cycle_length: int = Field(ge=1, le=600)  # s
+    north_south_green: int = Field(ge=1, le=300)
+    east_west_green: int = Field(ge=1, le=300)
+    pedestrian_phase: int = Field(ge=0, le=120)
+
+    @model_validator(mode="after")
+    def phases_fit_the_cycle(self):
+        from signal_optimizer import LOST_TIME_PER_PHASE
+        
+        # Time left over in the cycle runs as all-red
+        used = self.north_south_green + self.east_west_green + self.pedestrian_phase + 2 * LOST_TIME_PER_PHASE
+        if used > self.cycle_length:
+            raise ValueError(f"greens, pedestrian phase and {2 * LOST_TIME_PER_PHASE:g} s lost time "
+                             f"({used:g} s) exceed cycle_length ({self.cycle_length} s)")
+        return self
+
+class SignalOptimizationRequest(BaseModel):
+    current_timing: Optional[SignalTiming] = None
+    north_south_share: float = Field(0.55, ge=0, le=1)  # share of the junction's flow on the N-S approaches
+    lanes_per_approach: int = Field(2, ge=1, le=8)
+
+# Central 80% prediction interval reported alongside point estimates
+PREDICTION_INTERVAL = (0.1, 0.9)
+# Furthest ahead a prediction may look: a week, as for the forecasts
+MAX_HORIZON_HOURS = 168
+CONGESTION_LABELS = {0: "Low", 1: "Medium", 2: "High", 3: "Critical"}
+
+# Incremental updates: trees/stages added per mini-batch, and caps after which
+# only a full retrain resets the models
+ONLINE_TREES_PER_UPDATE = 10
+ONLINE_STAGES_PER_UPDATE = 10
+MAX_FOREST_TREES = 300
+MAX_BOOSTING_STAGES = 400
+
+# Estimator settings used unless a tuning run (tuning.py) stored better ones
+DEFAULT_MODEL_PARAMS = {
+    'traffic': {'n_estimators': 150, 'learning_rate': 0.1, 'max_depth': 5},
+    'speed': {'n_estimators': 100, 'max_depth': 8},
+    'congestion': {'n_estimators': 100, 'max_depth': 6},
+}
+
+# Model input columns, in training order
+FEATURE_COLUMNS = ['hour', 'day_of_week', 'month', 'is_weekend', 'is_rush_hour',
+                   'is_peak_hour', 'weather_impact', 'special_event', 'latitude',
+                   'longitude', 'city']
+
 # Enhanced ML Traffic Prediction Engine
 class TrafficMLEngine:
     def __init__(self):
@@ -183,18 +338,29 @@ class TrafficMLEngine:
             'speed': None,
             'congestion': None
         }
+        # Scalers are fitted by train_models or restored by load_models
         self.scalers = {
-            'traffic': StandardScaler(),
-            'speed': StandardScaler(),
-            'congestion': StandardScaler()
+            'traffic': None,
+            'speed': None,
+            'congestion': None
         }
         self.label_encoders = {}
         self.is_trained = False
+        self.model_version = None
+        self.city = None
+        # Latency series for predict_batch, resolved once the city is known
+        self._prediction_latency = metrics.ML_PREDICTION_DURATION.labels("unknown")
         self.model_accuracy = {}
+        # Held-out residual quantiles for the boosted traffic model, which has no tree spread
+        self.calibration = {}
+        # Per-tree leaf tables of the forests, built on first prediction
+        self._leaf_tables = {}
         self.training_history = []
         
-    def generate_training_data(self, city: str, days: int = 60) -> pd.DataFrame:
+    def generate_training_data(self, city: str, days: int = 60) -> "pd.DataFrame":
         """Generate more realistic synthetic training data for ML models"""
+        import pandas as pd
+        
         data = []
         intersections = ACCRA_INTERSECTIONS if city == "Accra" else KUMASI_INTERSECTIONS
         
@@ -284,41 +450,56 @@ class TrafficMLEngine:
         
         return pd.DataFrame(data)
     
-    def train_models(self, city: str):
-        """Train ML models for traffic prediction with enhanced features"""
+    def train_models(self, city: str, days: int = 90, training_data: Optional["pd.DataFrame"] = None):
+        """Train ML models for traffic prediction; on synthetic data unless a training frame is given"""
         logger.info(f"Training enhanced ML models for {city}...")
+        self._set_city(city)
+        
+        import numpy as np
+        from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor, RandomForestClassifier
+        from sklearn.preprocessing import StandardScaler
+        from sklearn.model_selection import train_test_split, cross_val_score
+        from sklearn.metrics import mean_absolute_error, mean_squared_error, accuracy_score
+        
+        # Tuned settings per model override the defaults
+        tuned = model_store.tuned_params(city)
+        model_params = {name: {**params, **tuned.get(name, {})} for name, params in DEFAULT_MODEL_PARAMS.items()}
         
         try:
-            # Generate training data
-            df = self.generate_training_data(city, days=90)  # 90 days of data
+            # Observed traffic when there is enough of it, else generated data
+            if training_data is not None:
+                df = training_data
+                source = "observed"
+            elif TRAFFIC_SOURCE == "simulation":
+                df = simulated_training_frame(city)
+                source = "simulated"
+            else:
+                df = self.generate_training_data(city, days=days)  # 90 days of data by default
+                source = "synthetic"
+            logger.info(f"Training on {len(df)} {source} samples")
             
             # Feature engineering
-            features = ['hour', 'day_of_week', 'month', 'is_weekend', 'is_rush_hour', 
-                       'is_peak_hour', 'weather_impact', 'special_event', 'latitude', 
-                       'longitude', 'city']
-            
-            X = df[features]
+            X = df[FEATURE_COLUMNS]
+            self.scalers = {name: StandardScaler() for name in self.scalers}
             
             # Train traffic volume prediction model
             y_traffic = df['vehicle_count']
-            X_train, X_test, y_train, y_test = train_test_split(X, y_traffic, test_size=0.2, random_state=42)
+            X_train, X_test, y_traffic_train, y_test = train_test_split(X, y_traffic, test_size=0.2, random_state=42)
             
             # Scale features for traffic model
             X_traffic_scaled = self.scalers['traffic'].fit_transform(X_train)
             X_test_traffic_scaled = self.scalers['traffic'].transform(X_test)
             
             # Use ensemble of models for traffic prediction
-            traffic_model = GradientBoostingRegressor(
-                n_estimators=150, 
-                learning_rate=0.1,
-                max_depth=5,
-                random_state=42
-            )
-            traffic_model.fit(X_traffic_scaled, y_train)
+            traffic_model = GradientBoostingRegressor(random_state=42, **model_params['traffic'])
+            traffic_model.fit(X_traffic_scaled, y_traffic_train)
             
             traffic_pred = traffic_model.predict(X_test_traffic_scaled)
             traffic_mae = mean_absolute_error(y_test, traffic_pred)
             traffic_rmse = np.sqrt(mean_squared_error(y_test, traffic_pred))
+            self.calibration['traffic_residual_quantiles'] = [
+                float(q) for q in np.quantile(y_test - traffic_pred, PREDICTION_INTERVAL)
+            ]
             
             self.models['traffic'] = traffic_model
             self.model_accuracy['traffic_mae'] = traffic_mae
@@ -332,11 +513,7 @@ class TrafficMLEngine:
             X_speed_scaled = self.scalers['speed'].fit_transform(X_train)
             X_test_speed_scaled = self.scalers['speed'].transform(X_test)
             
-            speed_model = RandomForestRegressor(
-                n_estimators=100, 
-                max_depth=8,
-                random_state=42
-            )
+            speed_model = RandomForestRegressor(random_state=42, **model_params['speed'])
             speed_model.fit(X_speed_scaled, y_train)
             
             speed_pred = speed_model.predict(X_test_speed_scaled)
@@ -355,11 +532,7 @@ class TrafficMLEngine:
             X_congestion_scaled = self.scalers['congestion'].fit_transform(X_train)
             X_test_congestion_scaled = self.scalers['congestion'].transform(X_test)
             
-            congestion_model = RandomForestClassifier(
-                n_estimators=100,
-                max_depth=6,
-                random_state=42
-            )
+            congestion_model = RandomForestClassifier(random_state=42, **model_params['congestion'])
             congestion_model.fit(X_congestion_scaled, y_train)
             
             congestion_pred = congestion_model.predict(X_test_congestion_scaled)
@@ -370,108 +543,237 @@ class TrafficMLEngine:
             
             # Cross-validation for reliability
             traffic_cv_scores = cross_val_score(
-                traffic_model, X_traffic_scaled, y_train, 
+                traffic_model, X_traffic_scaled, y_traffic_train, 
                 cv=5, scoring='neg_mean_absolute_error'
             )
             self.model_accuracy['traffic_cv_mae'] = -np.mean(traffic_cv_scores)
             
             self.is_trained = True
+            self._leaf_tables = {}
             training_info = {
                 'city': city,
                 'timestamp': datetime.now(),
                 'accuracy_metrics': self.model_accuracy.copy(),
-                'training_samples': len(df)
+                'training_samples': len(df),
+                'training_source': source
             }
             self.training_history.append(training_info)
             
             logger.info(f"ML models trained successfully for {city}")
             logger.info(f"Model accuracies: {self.model_accuracy}")
             
-            # Save models for later use
-            self.save_models(city)
-            
+            # Publish a new model version for this and other processes
+            self.model_version = model_store.publish(city, self, {
+                "training_samples": len(df),
+                "training_source": source,
+                "model_params": model_params,
+                "calibration": self.calibration
+            })
             return True
             
         except Exception as e:
             logger.error(f"Error training models: {str(e)}")
             return False
     
+    def update_models(self, city: str, observations: "pd.DataFrame", observations_through: datetime) -> bool:
+        """Fold a mini-batch of observed traffic into the current models and publish them.
+        
+        The forests grow warm-started trees fitted on the new batch (oldest trees
+        are dropped past MAX_FOREST_TREES); the boosted traffic model adds stages
+        fitted to its residuals on the batch. Scalers stay as trained, so the
+        new trees see features on the same scale as the old ones.
+        """
+        if not self.is_trained:
+            raise Exception("Models are not trained yet")
+        logger.info(f"Updating {city} models with {len(observations)} observations...")
+        self._set_city(city)
+        
+        import numpy as np
+        from sklearn.metrics import mean_absolute_error, accuracy_score
+        
+        try:
+            X = observations[FEATURE_COLUMNS]
+            scaled = {name: self.scalers[name].transform(X) for name in self.scalers}
+            
+            # Score the batch before learning from it (prequential evaluation)
+            online_metrics = {
+                'online_traffic_mae': mean_absolute_error(
+                    observations['vehicle_count'], self.models['traffic'].predict(scaled['traffic'])),
+                'online_speed_mae': mean_absolute_error(
+                    observations['average_speed'], self.models['speed'].predict(scaled['speed'])),
+                'online_congestion_accuracy': accuracy_score(
+                    observations['congestion_level'], self.models['congestion'].predict(scaled['congestion'])),
+            }
+            updated = []
+            
+            traffic_model = self.models['traffic']
+            if traffic_model.n_estimators + ONLINE_STAGES_PER_UPDATE <= MAX_BOOSTING_STAGES:
+                traffic_model.set_params(warm_start=True, n_estimators=traffic_model.n_estimators + ONLINE_STAGES_PER_UPDATE)
+                traffic_model.fit(scaled['traffic'], observations['vehicle_count'])
+                updated.append('traffic')
+            
+            for name, target in [('speed', 'average_speed'), ('congestion', 'congestion_level')]:
+                model = self.models[name]
+                y = observations[target]
+                if name == 'congestion' and set(np.unique(y)) != set(model.classes_):
+                    # Warm-started trees must see every class, or their outputs don't line up
+                    logger.info(f"Skipping {city} congestion update: batch lacks some congestion levels")
+                    continue
+                model.set_params(warm_start=True, n_estimators=len(model.estimators_) + ONLINE_TREES_PER_UPDATE)
+                model.fit(scaled[name], y)
+                if len(model.estimators_) > MAX_FOREST_TREES:
+                    model.estimators_ = model.estimators_[-MAX_FOREST_TREES:]
+                    model.n_estimators = MAX_FOREST_TREES
+                updated.append(name)
+            
+            self._leaf_tables = {}
+            self.model_accuracy.update(online_metrics)
+            logger.info(f"Online metrics before update: {online_metrics}")
+            
+            self.model_version = model_store.publish(city, self, {
+                "calibration": self.calibration,
+                "observations_through": observations_through,
+                "online_update": {"rows": len(observations), "models_updated": updated, "base_version": self.model_version}
+            })
+            metrics.ML_ONLINE_UPDATES.labels(city, "success").inc()
+            return self.model_version is not None
+        
+        except Exception as e:
+            logger.error(f"Error updating models: {str(e)}")
+            metrics.ML_ONLINE_UPDATES.labels(city, "failure").inc()
+            return False
+    
+    def _set_city(self, city: str):
+        self.city = city
+        self._prediction_latency = metrics.ML_PREDICTION_DURATION.labels(city)
+    
     def predict_traffic(self, features: dict) -> dict:
         """Predict traffic metrics for given features"""
+        return self.predict_batch([features])[0]
+    
+    def _leaf_table(self, model_name: str):
+        from forest_uncertainty import ForestLeafTable
+        table = self._leaf_tables.get(model_name)
+        if table is None:
+            table = self._leaf_tables[model_name] = ForestLeafTable(self.models[model_name])
+        return table
+    
+    def predict_columns(self, feature_df: "pd.DataFrame") -> Dict[str, Any]:
+        """Predict every row of a feature frame at once, as NumPy columns with intervals.
+        
+        Speed and congestion come from the forests' per-tree outputs (one pass
+        over all trees gives both the estimate and its spread); the boosted
+        traffic model's interval comes from its held-out residuals.
+        """
         if not self.is_trained:
             raise Exception("Models are not trained yet")
         
-        # Convert features to DataFrame
-        feature_df = pd.DataFrame([features])
-        
-        # Make predictions
-        traffic_scaled = self.scalers['traffic'].transform(feature_df)
-        vehicle_count = self.models['traffic'].predict(traffic_scaled)[0]
+        import numpy as np
+        from forest_uncertainty import regression_summary, classification_summary
+        started = time.perf_counter()
         
-        speed_scaled = self.scalers['speed'].transform(feature_df)
-        average_speed = self.models['speed'].predict(speed_scaled)[0]
+        vehicle_counts = self.models['traffic'].predict(self.scalers['traffic'].transform(feature_df))
+        residual_low, residual_high = self.calibration.get('traffic_residual_quantiles', (0.0, 0.0))
         
-        congestion_scaled = self.scalers['congestion'].transform(feature_df)
-        congestion_level = self.models['congestion'].predict(congestion_scaled)[0]
+        speed = regression_summary(
+            self._leaf_table('speed').per_tree(self.scalers['speed'].transform(feature_df)),
+            PREDICTION_INTERVAL
+        )
+        congestion_table = self._leaf_table('congestion')
+        congestion = classification_summary(
+            congestion_table.per_tree(self.scalers['congestion'].transform(feature_df))
+        )
+        probabilities = congestion["probabilities"]
+        predicted = congestion["predicted"]
         
-        # Map congestion level to string
-        congestion_map = {
-            0: "Low",
-            1: "Medium",
-            2: "High",
-            3: "Critical"
+        columns = {
+            "vehicle_count": np.maximum(0, vehicle_counts.astype(int)),
+            "vehicle_count_low": np.maximum(0, (vehicle_counts + residual_low).astype(int)),
+            "vehicle_count_high": np.maximum(0, (vehicle_counts + residual_high).astype(int)),
+            "average_speed": np.maximum(5, np.round(speed["mean"], 1)),
+            "speed_low": np.maximum(5, np.round(speed["low"], 1)),
+            "speed_high": np.maximum(5, np.round(speed["high"], 1)),
+            "congestion_labels": [CONGESTION_LABELS.get(int(c), "Medium") for c in congestion_table.classes],
+            "congestion_index": predicted,
+            "congestion_probabilities": probabilities,
+            # Share of the forest's probability mass on the predicted congestion level
+            "confidence_score": np.round(probabilities[np.arange(len(predicted)), predicted], 3)
         }
         
-        return {
-            "vehicle_count": max(0, int(vehicle_count)),
-            "average_speed": max(5, round(average_speed, 1)),
-            "congestion_level": congestion_map.get(int(congestion_level), "Medium")
-        }
+        self._prediction_latency.observe(time.perf_counter() - started)
+        return columns
+    
+    def predict_batch(self, rows: List[dict]) -> List[dict]:
+        """Predict many feature rows at once, with intervals and a confidence score"""
+        import pandas as pd
+        
+        columns = self.predict_columns(pd.DataFrame(rows, columns=FEATURE_COLUMNS))
+        labels = columns["congestion_labels"]
+        
+        return [{
+            "vehicle_count": int(columns["vehicle_count"][i]),
+            "vehicle_count_interval": [int(columns["vehicle_count_low"][i]), int(columns["vehicle_count_high"][i])],
+            "average_speed": float(columns["average_speed"][i]),
+            "average_speed_interval": [float(columns["speed_low"][i]), float(columns["speed_high"][i])],
+            "congestion_level": labels[columns["congestion_index"][i]],
+            "congestion_probabilities": {
+                label: round(float(p), 3) for label, p in zip(labels, columns["congestion_probabilities"][i])
+            },
+            "confidence_score": float(columns["confidence_score"][i])
+        } for i in range(len(rows))]
     
-    def save_models(self, city: str):
+    def save_models(self, city: str, directory: str = 'models'):
         """Save trained models to disk"""
+        import joblib
+        
         try:
-            os.makedirs('models', exist_ok=True)
+            os.makedirs(directory, exist_ok=True)
             city_prefix = city.lower()
             
             # Save models
             for model_name, model in self.models.items():
                 if model:
-                    filename = f'models/{city_prefix}_{model_name}_model.pkl'
+                    filename = os.path.join(directory, f'{city_prefix}_{model_name}_model.pkl')
                     joblib.dump(model, filename)
             
             # Save scalers
             for scaler_name, scaler in self.scalers.items():
                 if scaler:
-                    filename = f'models/{city_prefix}_{scaler_name}_scaler.pkl'
+                    filename = os.path.join(directory, f'{city_prefix}_{scaler_name}_scaler.pkl')
                     joblib.dump(scaler, filename)
                     
             logger.info(f"Models saved for {city}")
+            return True
             
         except Exception as e:
             logger.error(f"Error saving models: {str(e)}")
+            return False
     
-    def load_models(self, city: str):
+    def load_models(self, city: str, directory: str = 'models'):
         """Load trained models from disk"""
+        import joblib
+        
         try:
             city_prefix = city.lower()
             models_loaded = 0
             
             # Load models
             for model_name in self.models.keys():
-                filename = f'models/{city_prefix}_{model_name}_model.pkl'
+                filename = os.path.join(directory, f'{city_prefix}_{model_name}_model.pkl')
                 if os.path.exists(filename):
                     self.models[model_name] = joblib.load(filename)
                     models_loaded += 1
             
             # Load scalers
             for scaler_name in self.scalers.keys():
-                filename = f'models/{city_prefix}_{scaler_name}_scaler.pkl'
+                filename = os.path.join(directory, f'{city_prefix}_{scaler_name}_scaler.pkl')
                 if os.path.exists(filename):
                     self.scalers[scaler_name] = joblib.load(filename)
             
             if models_loaded > 0:
                 self.is_trained = True
+                self._leaf_tables = {}
+                self._set_city(city)
                 logger.info(f"Loaded pre-trained models for {city}")
                 return True
                 
@@ -504,27 +806,368 @@ KUMASI_INTERSECTIONS = [
     {"id": "KUM_005", "name": "Airport Roundabout", "lat": 6.7144, "lng": -1.5900}
 ]
 
+# Coordinated corridors, intersections listed in travel order. A corridor's
+# "arterial_share" is the share of its junctions' flow on the corridor approaches:
+# the trunk roads (N1, Accra Road) carry more of it than the city-centre rings
+ARTERIAL_SHARE = 0.55
+CORRIDORS = {
+    "Accra": {
+        "ring_road": {"name": "Ring Road", "intersections": ["ACC_003", "ACC_002", "ACC_001"],
+                      "arterial_share": 0.6},
+        "n1_achimota": {"name": "Achimota - Tema Station", "intersections": ["ACC_004", "ACC_002", "ACC_005"],
+                        "arterial_share": 0.7},
+    },
+    "Kumasi": {
+        "adum_airport": {"name": "Adum - Airport Roundabout", "intersections": ["KUM_003", "KUM_001", "KUM_004", "KUM_005"],
+                         "arterial_share": 0.6},
+        "accra_road": {"name": "Kejetia - Tech Junction", "intersections": ["KUM_001", "KUM_002"],
+                       "arterial_share": 0.65},
+    },
+}
+
+def get_intersections(city: str) -> List[Dict]:
+    """Intersection registry for a city"""
+    return ACCRA_INTERSECTIONS if city == "Accra" else KUMASI_INTERSECTIONS
+
+def find_intersection(city: str, intersection_id: str) -> Optional[Dict]:
+    """Look up an intersection by id within a city"""
+    return next((i for i in get_intersections(city) if i["id"] == intersection_id), None)
+
+def build_prediction_features(city: str, intersection: Dict, when: Optional[datetime] = None) -> dict:
+    """Feature row in the same column order used by TrafficMLEngine.train_models"""
+    when = when or traffic_clock.now()
+    return {
+        'hour': when.hour,
+        'day_of_week': when.weekday(),
+        'month': when.month,
+        'is_weekend': int(when.weekday() >= 5),
+        'is_rush_hour': int(when.hour in [7, 8, 17, 18]),
+        'is_peak_hour': int(when.hour in [7, 8, 9, 17, 18, 19]),
+        'weather_impact': 0.0,
+        'special_event': 0,
+        'latitude': intersection['lat'],
+        'longitude': intersection['lng'],
+        'city': 0 if city == "Accra" else 1
+    }
+
+# Vehicle counts are per 5-minute observation window
+VEHICLE_COUNT_WINDOW_MINUTES = 5
+
+def predict_intersection_flow(city: str, intersection: Dict, when: Optional[datetime] = None) -> dict:
+    """Predicted hourly flow through an intersection, from the ML engine when trained"""
+    when = when or traffic_clock.now()
+    ml_engine = ml_engines[city]
+    if ml_engine.is_trained:
+        try:
+            prediction = ml_engine.predict_traffic(build_prediction_features(city, intersection, when))
+            return {
+                "vehicle_count": prediction["vehicle_count"],
+                "average_speed": prediction["average_speed"],
+                "hourly_flow": prediction["vehicle_count"] * 60 / VEHICLE_COUNT_WINDOW_MINUTES,
+                "source": "ml_model"
+            }
+        except Exception as e:
+            logger.warning(f"ML flow prediction failed for {intersection['id']}: {e}")
+
+    profile = historical_profile(when)
+    return {
+        "vehicle_count": profile["vehicle_count"],
+        "average_speed": profile["average_speed"],
+        "hourly_flow": profile["vehicle_count"] * 60 / VEHICLE_COUNT_WINDOW_MINUTES,
+        "source": "historical_profile"
+    }
+
+# Confidence reported for profile-based estimates when no model is trained
+PROFILE_CONFIDENCE = 0.5
+
+def historical_profile(when: datetime) -> dict:
+    """The mean daily profile the training data is generated from, without a model"""
+    if when.hour in [7, 8, 17, 18]:
+        vehicle_count = 30 * 3.25
+    elif when.hour in [9, 19]:
+        vehicle_count = 30 * 2.15
+    else:
+        vehicle_count = 30.0
+    if when.weekday() >= 5:
+        vehicle_count *= 0.8
+    
+    if vehicle_count > 100:
+        congestion_level = "Critical"
+    elif vehicle_count > 75:
+        congestion_level = "High"
+    elif vehicle_count > 50:
+        congestion_level = "Medium"
+    else:
+        congestion_level = "Low"
+    
+    return {
+        "vehicle_count": int(vehicle_count),
+        "average_speed": max(5, 60 - (vehicle_count - 30) * 0.9),
+        "congestion_level": congestion_level
+    }
+
+def predict_intersections(city: str, intersections: List[Dict], when: datetime) -> List[dict]:
+    """Predictions with intervals for many intersections in one batch, or profile estimates"""
+    ml_engine = ml_engines[city]
+    if ml_engine.is_trained:
+        try:
+            rows = [build_prediction_features(city, i, when) for i in intersections]
+            return [{**p, "source": "ml_model"} for p in ml_engine.predict_batch(rows)]
+        except Exception as e:
+            logger.warning(f"ML batch prediction failed for {city}: {e}")
+    
+    profile = historical_profile(when)
+    return [{
+        **profile,
+        "vehicle_count_interval": [profile["vehicle_count"]] * 2,
+        "average_speed_interval": [profile["average_speed"]] * 2,
+        "congestion_probabilities": {profile["congestion_level"]: 1.0},
+        "confidence_score": PROFILE_CONFIDENCE,
+        "source": "historical_profile"
+    } for _ in intersections]
+
+def build_forecast_features(city: str, intersections: List[Dict], timestamps: "pd.DatetimeIndex") -> "pd.DataFrame":
+    """Feature matrix for every intersection x timestamp (intersection-major), built column-wise"""
+    import numpy as np
+    import pandas as pd
+    
+    n_steps = len(timestamps)
+    hours = timestamps.hour.values
+    weekdays = timestamps.weekday.values
+    return pd.DataFrame({
+        'hour': np.tile(hours, len(intersections)),
+        'day_of_week': np.tile(weekdays, len(intersections)),
+        'month': np.tile(timestamps.month.values, len(intersections)),
+        'is_weekend': np.tile((weekdays >= 5).astype(int), len(intersections)),
+        'is_rush_hour': np.tile(np.isin(hours, [7, 8, 17, 18]).astype(int), len(intersections)),
+        'is_peak_hour': np.tile(np.isin(hours, [7, 8, 9, 17, 18, 19]).astype(int), len(intersections)),
+        'weather_impact': 0.0,
+        'special_event': 0,
+        'latitude': np.repeat([i['lat'] for i in intersections], n_steps),
+        'longitude': np.repeat([i['lng'] for i in intersections], n_steps),
+        'city': 0 if city == "Accra" else 1
+    }, columns=FEATURE_COLUMNS)
+
+def forecast_city(city: str, intersections: List[Dict], start: datetime, hours: float, step_minutes: int) -> Dict[str, Any]:
+    """Columnar forecast for intersections x steps over the horizon, in one batched prediction"""
+    import numpy as np
+    import pandas as pd
+    
+    timestamps = pd.date_range(start, periods=int(hours * 60 // step_minutes) + 1, freq=f"{step_minutes}min")
+    n_steps = len(timestamps)
+    ml_engine = ml_engines[city]
+    
+    if ml_engine.is_trained:
+        predicted = ml_engine.predict_columns(build_forecast_features(city, intersections, timestamps))
+        labels = np.array(predicted["congestion_labels"])
+        columns = {
+            "vehicle_count": predicted["vehicle_count"],
+            "vehicle_count_low": predicted["vehicle_count_low"],
+            "vehicle_count_high": predicted["vehicle_count_high"],
+            "average_speed": predicted["average_speed"],
+            "speed_low": predicted["speed_low"],
+            "speed_high": predicted["speed_high"],
+            "congestion_level": labels[predicted["congestion_index"]],
+            "confidence_score": predicted["confidence_score"],
+        }
+    else:
+        # The profile only depends on time, so evaluate it per step and tile it
+        profiles = [historical_profile(t.to_pydatetime()) for t in timestamps]
+        vehicle_count = np.tile([p["vehicle_count"] for p in profiles], len(intersections))
+        average_speed = np.tile([p["average_speed"] for p in profiles], len(intersections))
+        columns = {
+            "vehicle_count": vehicle_count,
+            "vehicle_count_low": vehicle_count,
+            "vehicle_count_high": vehicle_count,
+            "average_speed": average_speed,
+            "speed_low": average_speed,
+            "speed_high": average_speed,
+            "congestion_level": np.tile([p["congestion_level"] for p in profiles], len(intersections)),
+            "confidence_score": np.full(len(vehicle_count), PROFILE_CONFIDENCE),
+        }
+    
+    return {
+        "intersection_id": np.repeat([i["id"] for i in intersections], n_steps),
+        "timestamp": np.tile(timestamps.values, len(intersections)),
+        **columns,
+        "source": "ml_model" if ml_engine.is_trained else "historical_profile",
+        "model_version": ml_engine.model_version,
+    }
+
+# Weather impact per condition, as in generate_training_data
+WEATHER_IMPACT = {"Clear": 0.0, "Cloudy": 0.1, "Rainy": 0.3, "Heavy Rain": 0.5}
+
+def observations_to_frame(city: str, records: List[dict]) -> "pd.DataFrame":
+    """Training frame (features and targets) from traffic_data documents"""
+    import pandas as pd
+    
+    return observation_features(city, pd.DataFrame({
+        'timestamp': [r["timestamp"] for r in records],
+        'latitude': [r["location"]["lat"] for r in records],
+        'longitude': [r["location"]["lng"] for r in records],
+        'weather_condition': [r.get("weather_condition") for r in records],
+        'vehicle_count': [r["vehicle_count"] for r in records],
+        'average_speed': [r["average_speed"] for r in records],
+        'congestion_level': [r["congestion_level"] for r in records],
+    }))
+
+def observation_features(city: str, observations: "pd.DataFrame") -> "pd.DataFrame":
+    """Training frame from columnar observations (as stored by TrainingDataStore)"""
+    import pandas as pd
+    
+    congestion_codes = {label: code for code, label in CONGESTION_LABELS.items()}
+    timestamps = pd.DatetimeIndex(observations['timestamp'])
+    hours = timestamps.hour
+    return pd.DataFrame({
+        'hour': hours,
+        'day_of_week': timestamps.weekday,
+        'month': timestamps.month,
+        'is_weekend': (timestamps.weekday >= 5).astype(int),
+        'is_rush_hour': hours.isin([7, 8, 17, 18]).astype(int),
+        'is_peak_hour': hours.isin([7, 8, 9, 17, 18, 19]).astype(int),
+        'weather_impact': observations['weather_condition'].map(WEATHER_IMPACT).fillna(0.0).to_numpy(),
+        'special_event': 0,
+        'latitude': observations['latitude'].to_numpy(),
+        'longitude': observations['longitude'].to_numpy(),
+        'city': 0 if city == "Accra" else 1,
+        'vehicle_count': observations['vehicle_count'].to_numpy(),
+        'average_speed': observations['average_speed'].to_numpy(),
+        'congestion_level': observations['congestion_level'].map(congestion_codes).fillna(1).astype(int).to_numpy(),
+    })
+
+def load_training_frame(city: str, days: int = 90) -> Optional["pd.DataFrame"]:
+    """Training frame from the last `days` of exported observations, or None if there are too few"""
+    since = datetime.utcnow().date() - timedelta(days=days)
+    observations = training_data_store.load(city, since=since)
+    if len(observations) < TRAINING_MIN_OBSERVATIONS:
+        return None
+    return observation_features(city, observations.dropna())
+
+async def sync_training_data(city: str):
+    """Export newly completed days of observations to the training data store"""
+    try:
+        await training_data_store.sync_from_mongo(db, city)
+    except Exception as e:
+        logger.warning(f"Could not export {city} training data: {e}")
+
+# Source of live snapshots and synthetic training data: "random" draws
+# independent numbers per intersection, "simulation" runs the cell transmission
+# model over the corridor road graph (traffic_simulation.py)
+TRAFFIC_SOURCE = os.environ.get('TRAFFIC_SOURCE', 'random')
+SIMULATION_STEP_SECONDS = float(os.environ.get('SIMULATION_STEP_SECONDS', 5))
+SIMULATED_TRAINING_DAYS = int(os.environ.get('SIMULATED_TRAINING_DAYS', 28))
+
+_city_networks: Dict[tuple, Any] = {}
+_simulated_days: Dict[str, dict] = {}
+# One simulation of a city's day at a time, whichever thread asks for it
+_simulation_locks = {city: threading.Lock() for city in CORRIDORS}
+# Days being simulated off the event loop, shared by every request waiting for them
+_simulating: Dict[tuple, asyncio.Future] = {}
+
+def city_network(city: str, dt: float = SIMULATION_STEP_SECONDS):
+    """The city's road network for the simulator, built once per step size"""
+    from traffic_simulation import RoadNetwork
+    
+    key = (city, dt)
+    if key not in _city_networks:
+        _city_networks[key] = RoadNetwork(get_intersections(city), CORRIDORS[city], dt=dt)
+    return _city_networks[key]
+
+def simulation_seed(city: str, day) -> int:
+    """Same city and day, same simulated traffic"""
+    return zlib.crc32(f"{city}:{day.isoformat()}".encode())
+
+def simulated_day(city: str, day) -> dict:
+    """A whole simulated day of the city at one-minute records, kept for the current day"""
+    from traffic_simulation import simulate
+    
+    cached = _simulated_days.get(city)
+    if cached is None or cached["start"].date() != day:
+        with _simulation_locks[city]:
+            cached = _simulated_days.get(city)
+            if cached is None or cached["start"].date() != day:
+                cached = _simulated_days[city] = simulate(
+                    city_network(city), datetime.combine(day, datetime.min.time()), hours=24, record_every=60,
+                    seed=simulation_seed(city, day))
+    return cached
+
+async def ensure_simulated_day(*cities: str):
+    """Simulate the current day (traffic_clock) of each city in a worker thread if it is not cached yet.
+    
+    Handlers await this before reading current traffic, so the synchronous
+    paths behind generate_realistic_traffic_data find the day cached instead
+    of running a 24 h simulation on the event loop.
+    """
+    if TRAFFIC_SOURCE != "simulation":
+        return
+    day = traffic_clock.now().date()
+    for city in cities or CORRIDORS:
+        cached = _simulated_days.get(city)
+        if cached is not None and cached["start"].date() == day:
+            continue
+        key = (city, day)
+        if key not in _simulating:
+            _simulating[key] = asyncio.ensure_future(run_blocking("cpu", simulated_day, city, day))
+        try:
+            await asyncio.shield(_simulating[key])
+        finally:
+            if _simulating.get(key) is not None and _simulating[key].done():
+                _simulating.pop(key, None)
+
+def simulated_traffic_data(city: str, when: datetime) -> List[dict]:
+    """Simulated conditions at every intersection of the city at `when`"""
+    from traffic_simulation import observation_records
+    
+    result = simulated_day(city, when.date())
+    row = min(int((when - result["start"]).total_seconds() // result["record_every"]), len(result["timestamps"]) - 1)
+    return observation_records(result, city, get_intersections(city), rows=range(row, row + 1))
+
+def simulated_training_frame(city: str, days: int = SIMULATED_TRAINING_DAYS) -> "pd.DataFrame":
+    """Training frame from simulated days, every 15 minutes, with day-to-day demand variation"""
+    import numpy as np
+    import pandas as pd
+    from traffic_simulation import simulate, observation_frame
+    
+    intersections = get_intersections(city)
+    # A coarser step keeps a month of days to seconds; the dynamics are the same
+    network = city_network(city, dt=max(SIMULATION_STEP_SECONDS, 10.0))
+    today = datetime.utcnow().date()
+    frames = []
+    for offset in range(days, 0, -1):
+        day = today - timedelta(days=offset)
+        seed = simulation_seed(city, day)
+        demand_scale = dict(zip([i["id"] for i in intersections],
+                                np.random.default_rng(seed).lognormal(0.0, 0.15, len(intersections))))
+        result = simulate(network, datetime.combine(day, datetime.min.time()), hours=24, record_every=900,
+                          demand_scale=demand_scale, seed=seed)
+        frames.append(observation_frame(result, intersections))
+    return observation_features(city, pd.concat(frames, ignore_index=True))
+
 def generate_realistic_traffic_data(city: str):
     """Generate realistic traffic data for simulation"""
+    if TRAFFIC_SOURCE == "simulation":
+        return simulated_traffic_data(city, traffic_clock.now())
     intersections = ACCRA_INTERSECTIONS if city == "Accra" else KUMASI_INTERSECTIONS
     traffic_data = []
     
-    current_hour = datetime.now().hour
+    now = traffic_clock.now()
+    current_hour = now.hour
+    rng = traffic_clock.random("traffic", city, now.strftime("%Y-%m-%dT%H:%M"))
     
     for intersection in intersections:
         # Rush hour logic (7-9 AM, 5-7 PM)
         if current_hour in [7, 8, 17, 18]:
-            congestion_multiplier = random.uniform(2.0, 3.5)
-            congestion_level = random.choice(["High", "Critical"])
+            congestion_multiplier = rng.uniform(2.0, 3.5)
+            congestion_level = rng.choice(["High", "Critical"])
         elif current_hour in [9, 10, 16, 19]:
-            congestion_multplier = random.uniform(1.3, 2.0)
+            congestion_multiplier = rng.uniform(1.3, 2.0)
             congestion_level = "Medium"
         else:
-            congestion_multiplier = random.uniform(0.5, 1.2)
-            congestion_level = random.choice(["Low", "Medium"])
+            congestion_multiplier = rng.uniform(0.5, 1.2)
+            congestion_level = rng.choice(["Low", "Medium"])
         
-        vehicle_count = int(random.uniform(20, 80) * congestion_multiplier)
-        avg_speed = max(5, random.uniform(15, 45) / congestion_multiplier)
+        vehicle_count = int(rng.uniform(20, 80) * congestion_multiplier)
+        avg_speed = max(5, rng.uniform(15, 45) / congestion_multiplier)
         
         traffic_data.append({
             "intersection_id": intersection["id"],
@@ -533,11 +1176,18 @@ def generate_realistic_traffic_data(city: str):
             "vehicle_count": vehicle_count,
             "average_speed": avg_speed,
             "congestion_level": congestion_level,
-            "weather_condition": random.choice(["Clear", "Cloudy", "Rainy"])
+            "weather_condition": rng.choice(["Clear", "Cloudy", "Rainy"])
         })
     
     return traffic_data
 
+async def ingest_observations(city: str, records: List[Dict]):
+    """Store a batch of observations and check it for incidents (recorded for replay when enabled)"""
+    if traffic_recorder is not None:
+        traffic_recorder.write("observations", {"city": city, "records": records})
+    await db.traffic_data.insert_many(records)
+    await incident_monitor.observe(city, records, db)
+
 def calculate_route_optimization(start: Dict, end: Dict, city: str):
     """AI-powered route optimization"""
     # Simulate AI route calculation
@@ -551,17 +1201,20 @@ def calculate_route_optimization(start: Dict, end: Dict, city: str):
     ]
     
     # Current hour affects duration
-    current_hour = datetime.now().hour
+    now = traffic_clock.now()
+    current_hour = now.hour
+    rng = traffic_clock.random("route", city, start["lat"], start["lng"], end["lat"], end["lng"],
+                               now.strftime("%Y-%m-%dT%H:%M"))
     base_duration = distance * 2  # base minutes per km
     
     if current_hour in [7, 8, 17, 18]:  # Rush hours
-        duration_multiplier = random.uniform(2.0, 3.0)
+        duration_multiplier = rng.uniform(2.0, 3.0)
         traffic_condition = "Heavy Traffic"
     elif current_hour in [9, 10, 16, 19]:
-        duration_multiplier = random.uniform(1.3, 1.8)
+        duration_multiplier = rng.uniform(1.3, 1.8)
         traffic_condition = "Moderate Traffic"
     else:
-        duration_multiplier = random.uniform(0.8, 1.2)
+        duration_multiplier = rng.uniform(0.8, 1.2)
         traffic_condition = "Light Traffic"
     
     estimated_duration = int(base_duration * duration_multiplier)
@@ -569,17 +1222,15 @@ def calculate_route_optimization(start: Dict, end: Dict, city: str):
     # Generate alternative routes
     alternatives = []
     for i in range(2):
-        alt_duration = int(estimated_duration * random.uniform(1.1, 1.4))
+        alt_duration = int(estimated_duration * rng.uniform(1.1, 1.4))
         alternatives.append({
             "route_name": f"Alternative Route {i+1}",
             "duration": alt_duration,
-            "distance": round(distance * random.uniform(1.05, 1.25), 2),
-            "traffic_level": random.choice(["Moderate", "Heavy"])
+            "distance": round(distance * rng.uniform(1.05, 1.25), 2),
+            "traffic_level": rng.choice(["Moderate", "Heavy"])
         })
     
-    ai_insights = f"Based on current traffic patterns in {city}, this route avoids major congestion points. " \
-                 f"Traffic is {traffic_condition.lower()} at this time. " \
-                 f"Consider alternative routes if traveling during rush hours."
+    ai_insights = " ".join(i["text"] for i in insight_engine.select(city, audience="route", limit=2))
     
     return {
         "estimated_duration": estimated_duration,
@@ -589,16 +1240,31 @@ def calculate_route_optimization(start: Dict, end: Dict, city: str):
         "ai_insights": ai_insights
     }
 
-def generate_ai_insights():
-    """Generate AI insights for traffic"""
-    insights = [
-        "Traffic flow is optimal with minimal congestion expected on main routes.",
-        "Alternative route via Independence Avenue may save 5-7 minutes during peak hours.",
-        "Road construction on Ring Road may cause delays - consider alternative routes.",
-        "Weather conditions are favorable for smooth traffic flow across all major routes.",
-        "Peak hour traffic is beginning to subside - expect improved travel times shortly."
-    ]
-    return random.choice(insights)
+# Current traffic per city, shared by the dashboard, insights and chat so they agree
+city_snapshots = SnapshotCache(generate_realistic_traffic_data,
+                               refresh_seconds=float(os.environ.get('CITY_SNAPSHOT_SECONDS', 60)))
+insight_engine = InsightEngine(city_snapshots, {"Accra": ACCRA_INTERSECTIONS, "Kumasi": KUMASI_INTERSECTIONS})
+
+# Historical patterns from per-day aggregates of the training data store and Mongo
+pattern_analytics = analytics.PatternAnalytics(
+    training_data_store, {"Accra": ACCRA_INTERSECTIONS, "Kumasi": KUMASI_INTERSECTIONS}, historical_profile,
+    window_days=int(os.environ.get('ANALYTICS_WINDOW_DAYS', 90)),
+    refresh_seconds=float(os.environ.get('ANALYTICS_REFRESH_SECONDS', 300)),
+)
+
+async def city_baseline(city: str) -> Dict:
+    return await pattern_analytics.baseline(city, db)
+
+# Incident detection against the hour-of-week baseline; the analyzer role feeds
+# it observations, API processes follow the incidents collection
+INCIDENT_POLL_SECONDS = float(os.environ.get('INCIDENT_POLL_SECONDS', 2))
+incident_feed = IncidentFeed()
+incident_monitor = IncidentMonitor(
+    {"Accra": ACCRA_INTERSECTIONS, "Kumasi": KUMASI_INTERSECTIONS}, city_baseline, incident_feed,
+    alpha=float(os.environ.get('INCIDENT_ALPHA', 0.5)),
+    threshold=float(os.environ.get('INCIDENT_THRESHOLD', 3.0)),
+    persistence=int(os.environ.get('INCIDENT_PERSISTENCE', 2)),
+)
 
 # API Routes
 @api_router.get("/")
@@ -615,6 +1281,7 @@ async def get_current_traffic(city: str):
     if city not in ["Accra", "Kumasi"]:
         raise HTTPException(status_code=400, detail="City must be 'Accra' or 'Kumasi'")
     
+    await ensure_simulated_day(city)
     traffic_data = generate_realistic_traffic_data(city)
     total_vehicles = sum(d["vehicle_count"] for d in traffic_data)
     
@@ -636,6 +1303,7 @@ async def optimize_route(request: RouteRequest):
     if request.city not in ["Accra", "Kumasi"]:
         raise HTTPException(status_code=400, detail="City must be 'Accra' or 'Kumasi'")
     
+    await ensure_simulated_day(request.city)
     route_recommendation = calculate_route_optimization(
         request.start_location, 
         request.end_location, 
@@ -665,8 +1333,9 @@ async def get_dashboard_overview(city: str):
     if city not in ["Accra", "Kumasi"]:
         raise HTTPException(status_code=400, detail="City must be 'Accra' or 'Kumasi'")
     
-    # Get current traffic data
-    traffic_data = generate_realistic_traffic_data(city)
+    # Current traffic snapshot and the insights evaluated on it
+    await ensure_simulated_day(city)
+    traffic_data = city_snapshots.get(city).records
     
     # Calculate metrics
     total_vehicles = sum(d["vehicle_count"] for d in traffic_data)
@@ -674,22 +1343,7 @@ async def get_dashboard_overview(city: str):
     critical_intersections = [d for d in traffic_data if d["congestion_level"] == "Critical"]
     high_congestion = [d for d in traffic_data if d["congestion_level"] in ["High", "Critical"]]
     
-    # AI recommendations based on analysis
-    ai_recommendations = []
-    if len(critical_intersections) > 0:
-        ai_recommendations.append("🚨 Deploy traffic controllers to critical intersections immediately")
-        ai_recommendations.append("📢 Issue traffic alerts via radio and mobile apps")
-    
-    if avg_speed < 20:
-        ai_recommendations.append("🚦 Implement dynamic signal timing optimization")
-        ai_recommendations.append("🚌 Increase public transport frequency to reduce private vehicle load")
-    
-    if len(high_congestion) > 3:
-        ai_recommendations.append("🔄 Activate alternative route guidance systems")
-        ai_recommendations.append("👮 Consider manual traffic direction at hotspots")
-    
-    if not ai_recommendations:
-        ai_recommendations.append("✅ Traffic flow is optimal. Maintain current monitoring.")
+    ai_recommendations = [i["text"] for i in insight_engine.select(city, audience="dashboard", scope="city")]
     
     return {
         "city": city,
@@ -703,28 +1357,86 @@ async def get_dashboard_overview(city: str):
             "critical_intersections": len(critical_intersections)
         },
         "alerts": [
+            {
+                "location": i["intersection_id"],
+                "severity": i["severity"],
+                "type": i["kind"],
+                "message": i["message"],
+                "since": i["detected_at"].isoformat(),
+                "incident_id": i["incident_id"]
+            } for i in incident_monitor.current(city)
+        ] + [
             {
                 "location": d["intersection_id"],
                 "severity": "Critical" if d["congestion_level"] == "Critical" else "High"
             } for d in critical_intersections
         ],
         "ai_recommendations": ai_recommendations,
+        "insights": insight_engine.select(city, scope="intersection"),
         "updated_at": datetime.utcnow().isoformat()
     }
 
+def format_prediction(city: str, intersection: Dict, prediction: dict, when: datetime) -> dict:
+    return {
+        "city": city,
+        "intersection_id": intersection["id"],
+        "intersection_name": intersection["name"],
+        "predicted_for": when.isoformat(),
+        "predicted_congestion": prediction["congestion_level"],
+        "predicted_vehicle_count": prediction["vehicle_count"],
+        "predicted_speed": prediction["average_speed"],
+        "vehicle_count_interval": prediction["vehicle_count_interval"],
+        "speed_interval": prediction["average_speed_interval"],
+        "congestion_probabilities": prediction["congestion_probabilities"],
+        "confidence_score": prediction["confidence_score"],
+        "ml_model_used": prediction["source"] == "ml_model"
+    }
+
+@api_router.get("/ml/predict/{city}/{intersection_id}")
+async def ml_predict_intersection(city: str, intersection_id: str,
+                                  horizon: int = Query(30, ge=0, le=MAX_HORIZON_HOURS * 60)):
+    """ML prediction for one intersection `horizon` minutes ahead, with intervals and confidence"""
+    if city not in ["Accra", "Kumasi"]:
+        raise HTTPException(status_code=400, detail="City must be 'Accra' or 'Kumasi'")
+    
+    intersection = find_intersection(city, intersection_id)
+    if not intersection:
+        raise HTTPException(status_code=404, detail=f"Intersection {intersection_id} not found in {city}")
+    
+    when = traffic_clock.now() + timedelta(minutes=horizon)
+    [prediction] = await run_blocking("cpu", predict_intersections, city, [intersection], when)
+    
+    return {
+        **format_prediction(city, intersection, prediction, when),
+        "prediction_horizon": horizon,
+        "model_version": ml_engines[city].model_version,
+        "generated_at": datetime.utcnow().isoformat()
+    }
+
 @api_router.get("/ml/batch-predict/{city}")
-async def batch_predict_traffic(city: str, horizon: int = 120):
+async def batch_predict_traffic(city: str, horizon: int = Query(120, ge=0, le=MAX_HORIZON_HOURS * 60)):
     """Batch ML predictions for all intersections in a city"""
     if city not in ["Accra", "Kumasi"]:
         raise HTTPException(status_code=400, detail="City must be 'Accra' or 'Kumasi'")
     
+    intersections = get_intersections(city)
+    when = traffic_clock.now() + timedelta(minutes=horizon)
+    predictions = await run_blocking("cpu", predict_intersections, city, intersections, when)
+    ml_engine = ml_engines[city]
+    
     return {
         "city": city,
-        "horizon_minutes": horizon,
+        "prediction_horizon_minutes": horizon,
+        "total_predictions": len(predictions),
         "predictions": [
-            {"intersection_id": "A1", "congestion": "High"},
-            {"intersection_id": "B3", "congestion": "Low"}
+            format_prediction(city, intersection, prediction, when)
+            for intersection, prediction in zip(intersections, predictions)
         ],
+        "ml_model_info": {
+            "is_trained": ml_engine.is_trained,
+            "model_version": ml_engine.model_version,
+            "accuracy": {k: float(v) for k, v in ml_engine.model_accuracy.items()}
+        },
         "generated_at": datetime.utcnow().isoformat()
     }
 
@@ -749,48 +1461,708 @@ async def train_ml_models(city: str, background_tasks: BackgroundTasks):
     if city not in ["Accra", "Kumasi"]:
         raise HTTPException(status_code=400, detail="City must be 'Accra' or 'Kumasi'")
     
+    job = {
+        "job_id": str(uuid.uuid4()),
+        "city": city,
+        "status": "pending",
+        "requested_at": datetime.utcnow()
+    }
+    
+    if APP_ROLE == "api":
+        # The trainer role picks the job up and publishes to the model store
+        await db.training_jobs.insert_one(dict(job))
+        return {
+            "city": city,
+            "job_id": job["job_id"],
+            "status": "queued",
+            "started_at": job["requested_at"].isoformat()
+        }
+    
+    background_tasks.add_task(train_and_swap_models, city)
     return {
         "city": city,
+        "job_id": job["job_id"],
         "status": "training_started",
-        "started_at": datetime.utcnow().isoformat()
+        "started_at": job["requested_at"].isoformat()
+    }
+
+def train_and_publish(city: str) -> Optional[str]:
+    """Train a city's models and publish them; runs in a worker process"""
+    engine = TrafficMLEngine()
+    return engine.model_version if engine.train_models(city, training_data=load_training_frame(city)) else None
+
+# Online updates: how often to look for new observations, and batch sizes
+ONLINE_UPDATE_SECONDS = int(os.environ.get('ONLINE_UPDATE_SECONDS', 900))
+ONLINE_MIN_BATCH = int(os.environ.get('ONLINE_MIN_BATCH', 200))
+ONLINE_MAX_BATCH = int(os.environ.get('ONLINE_MAX_BATCH', 20000))
+
+def update_and_publish(city: str, records: List[dict]) -> Optional[str]:
+    """Load the published models, fold in new observations and publish; runs in a worker process"""
+    engine = TrafficMLEngine()
+    if not model_store.load(city, engine):
+        return None
+    frame = observations_to_frame(city, records)
+    if not engine.update_models(city, frame, records[-1]["timestamp"]):
+        return None
+    return engine.model_version
+
+async def update_models_online(city: str) -> Optional[str]:
+    """Fold observations recorded since the published version into it, then hot-swap"""
+    manifest = await run_blocking("io", model_store.current_version, city)
+    if not manifest:
+        return None
+    # Continue after the last folded-in observation, or after the full training run
+    since = datetime.fromisoformat(manifest.get("observations_through") or manifest["published_at"])
+    
+    records = await db.traffic_data.find(
+        {"city": city, "timestamp": {"$gt": since}, **OBSERVED},
+        {"_id": 0, "timestamp": 1, "location": 1, "vehicle_count": 1,
+         "average_speed": 1, "congestion_level": 1, "weather_condition": 1}
+    ).sort("timestamp", 1).to_list(ONLINE_MAX_BATCH)
+    if len(records) < ONLINE_MIN_BATCH:
+        return None
+    
+    version = await run_blocking("process", update_and_publish, city, records)
+    if version:
+        logger.info(f"Online update of {city} models: {len(records)} observations, version {version}")
+        await reload_models_if_published(city)
+    return version
+
+async def run_online_updates():
+    """Periodically fold new observations into every city's models"""
+    while True:
+        await asyncio.sleep(ONLINE_UPDATE_SECONDS)
+        for city in list(ml_engines):
+            try:
+                await update_models_online(city)
+            except Exception as e:
+                logger.error(f"Online model update failed for {city}: {e}")
+
+async def train_and_swap_models(city: str):
+    """Train in a worker process and hot-swap to the published version when done"""
+    # Training holds the GIL through most of the pandas/sklearn work, so a thread
+    # would still stall this loop; a separate process does not
+    started = time.perf_counter()
+    await sync_training_data(city)
+    version = await run_blocking("process", train_and_publish, city)
+    if version:
+        metrics.ML_TRAINING_DURATION.labels(city).observe(time.perf_counter() - started)
+        metrics.ML_TRAINING_RUNS.labels(city, "success").inc()
+        logger.info(f"ML models trained successfully for {city} (version {version})")
+        await reload_models_if_published(city)
+    else:
+        metrics.ML_TRAINING_RUNS.labels(city, "failure").inc()
+        logger.error(f"ML model training failed for {city}")
+
+async def city_patterns(city: str) -> tuple:
+    """Cached patterns of a city, the comparison with the other city and findings from both"""
+    other_city = "Kumasi" if city == "Accra" else "Accra"
+    patterns, other = await asyncio.gather(pattern_analytics.patterns(city, db), pattern_analytics.patterns(other_city, db))
+    comparison = analytics.compare(patterns, other)
+    return patterns, comparison, analytics.pattern_insights(patterns, comparison, other)
+
+@api_router.get("/analytics/patterns/{city}")
+async def get_traffic_patterns(city: str):
+    """Hour-of-day x day-of-week profiles, peaks, hotspots and city comparison"""
+    if city not in ["Accra", "Kumasi"]:
+        raise HTTPException(status_code=400, detail="City must be 'Accra' or 'Kumasi'")
+    
+    patterns, comparison, insights = await city_patterns(city)
+    now = datetime.utcnow()
+    peak = analytics.next_peak(patterns, now)
+    
+    return {
+        **patterns,
+        "comparison": comparison,
+        "predictions": {
+            "next_hour_congestion": analytics.typical_congestion(patterns, now + timedelta(hours=1)),
+            "peak_time": peak.strftime("%H:%M") if peak else None,
+            "peak_congestion": analytics.typical_congestion(patterns, peak) if peak else None,
+            "ai_insights": insights,
+        },
+        "generated_at": now.isoformat()
     }
 
 @api_router.get("/analytics/ml-insights/{city}")
-async def get_ml_insights(city: str):
-    """Get advanced ML-powered traffic analytics and insights"""
+async def get_ml_insights(city: str, hours: int = 3):
+    """ML predictions for the coming hours set against the city's historical patterns"""
     if city not in ["Accra", "Kumasi"]:
         raise HTTPException(status_code=400, detail="City must be 'Accra' or 'Kumasi'")
+    hours = max(1, min(hours, 24))
+    
+    await ensure_simulated_day(city)
+    intersections = get_intersections(city)
+    now = traffic_clock.now()
+    ml_predictions = []
+    for hour_ahead in range(1, hours + 1):
+        when = now + timedelta(hours=hour_ahead)
+        predictions = await run_blocking("cpu", predict_intersections, city, intersections, when)
+        ml_predictions.append({
+            "hour_ahead": hour_ahead,
+            "predicted_for": when.isoformat(),
+            "predictions": [format_prediction(city, i, p, when) for i, p in zip(intersections, predictions)],
+        })
+    
+    patterns, comparison, insights = await city_patterns(city)
+    peak = analytics.next_peak(patterns, now)
+    peak_approaching = peak is not None and peak - now <= timedelta(hours=2)
+    
+    # Hotspots, with the signal work to do before their worst hour
+    opportunities = [{
+        "intersection_id": h["intersection_id"],
+        "intersection_name": h["name"],
+        "congested_share": h["congested_share"],
+        "worst_time": h["worst_time"],
+        "action": f"Retime signals ahead of {h['worst_time']['hour']:02d}:00 on {h['worst_time']['day']}s",
+    } for h in patterns["congestion_hotspots"]]
+    
+    ml_engine = ml_engines[city]
+    confidences = [p["confidence_score"] for hour in ml_predictions for p in hour["predictions"]]
     
     return {
         "city": city,
-        "insights": [
-            "Evening rush starts earlier on Fridays",
-            "Accra has 15% higher congestion than Kumasi during peak hours"
-        ],
-        "generated_at": datetime.utcnow().isoformat()
+        "timestamp": now.isoformat(),
+        "ml_predictions": ml_predictions,
+        "pattern_analysis": {
+            "peak_approaching": peak_approaching,
+            "next_peak": peak.isoformat() if peak else None,
+            "expected_peak_severity": analytics.typical_congestion(patterns, peak) if peak else None,
+            "recommended_actions": [i["text"] for i in insight_engine.select(city, audience="dashboard", scope="city")],
+            "source": patterns["source"],
+        },
+        "optimization_opportunities": opportunities,
+        "model_reliability": {
+            "overall_confidence": round(sum(confidences) / len(confidences), 3) if confidences else None,
+            "prediction_accuracy": {k: float(v) for k, v in ml_engine.model_accuracy.items()},
+            "model_version": ml_engine.model_version,
+            "ml_model_used": ml_engine.is_trained,
+        },
+        "insights": insights,
+        "comparison": comparison,
+        "generated_at": now.isoformat()
     }
 
 @api_router.get("/traffic/predict/{city}/{intersection_id}")
-async def predict_traffic(city: str, intersection_id: str, hours_ahead: int = 1):
+async def predict_traffic(city: str, intersection_id: str,
+                          hours_ahead: int = Query(1, gt=0, le=MAX_HORIZON_HOURS)):
     """Predict traffic conditions for a specific intersection"""
     if city not in ["Accra", "Kumasi"]:
         raise HTTPException(status_code=400, detail="City must be 'Accra' or 'Kumasi'")
     
+    intersection = find_intersection(city, intersection_id)
+    if not intersection:
+        raise HTTPException(status_code=404, detail=f"Intersection {intersection_id} not found in {city}")
+    
+    when = traffic_clock.now() + timedelta(hours=hours_ahead)
+    [prediction] = await run_blocking("cpu", predict_intersections, city, [intersection], when)
+    
     return {
         "city": city,
         "intersection_id": intersection_id,
         "hours_ahead": hours_ahead,
-        "predicted_congestion": "High" if hours_ahead > 2 else "Moderate",
-        "predicted_speed": 18.5 if hours_ahead > 2 else 27.1,
+        "predicted_congestion": prediction["congestion_level"],
+        "predicted_speed": prediction["average_speed"],
+        "predicted_vehicle_count": prediction["vehicle_count"],
+        "confidence_score": prediction["confidence_score"],
+        "predicted_for": when.isoformat(),
         "predicted_at": datetime.utcnow().isoformat()
     }
 
+# Forecast size limits: a week ahead, and a cap on intersections x steps
+MAX_FORECAST_HOURS = MAX_HORIZON_HOURS
+MAX_FORECAST_ROWS = 250_000
+
+def forecast_json_chunks(header: dict, columns: Dict[str, Any]):
+    """Columnar JSON written one column at a time, so the body streams as it is encoded"""
+    yield json.dumps(header)[:-1] + ', "columns": {'
+    for n, (name, values) in enumerate(columns.items()):
+        if name == "timestamp":
+            values = values.astype("datetime64[s]").astype(str)
+        yield ("" if n == 0 else ", ") + json.dumps(name) + ": " + json.dumps(values.tolist())
+    yield "}}"
+
+def forecast_arrow(header: dict, columns: Dict[str, Any]) -> bytes:
+    """Arrow IPC stream of the forecast table, with the header as schema metadata"""
+    import pyarrow as pa
+    
+    table = pa.table(columns).replace_schema_metadata({"forecast": json.dumps(header)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+@api_router.get("/ml/forecast/{city}")
+async def forecast_traffic(city: str, hours: float = 24, step_minutes: int = 5,
+                           intersection_id: Optional[str] = None, format: str = "json"):
+    """Day-ahead (or shorter) forecast for every intersection and step, as columnar JSON or Arrow"""
+    if city not in ["Accra", "Kumasi"]:
+        raise HTTPException(status_code=400, detail="City must be 'Accra' or 'Kumasi'")
+    if not 0 < hours <= MAX_FORECAST_HOURS or step_minutes < 1:
+        raise HTTPException(status_code=400, detail=f"hours must be in (0, {MAX_FORECAST_HOURS}] and step_minutes >= 1")
+    if format not in ["json", "arrow"]:
+        raise HTTPException(status_code=400, detail="format must be 'json' or 'arrow'")
+    
+    intersections = get_intersections(city)
+    if intersection_id:
+        intersections = [i for i in intersections if i["id"] == intersection_id]
+        if not intersections:
+            raise HTTPException(status_code=404, detail=f"Intersection {intersection_id} not found in {city}")
+    if len(intersections) * (hours * 60 // step_minutes + 1) > MAX_FORECAST_ROWS:
+        raise HTTPException(status_code=400, detail=f"Forecast would exceed {MAX_FORECAST_ROWS} rows")
+    
+    # Start on the next whole step so repeated requests line up
+    now = traffic_clock.now().replace(second=0, microsecond=0)
+    start = now + timedelta(minutes=step_minutes - now.minute % step_minutes)
+    columns = await run_blocking("cpu", forecast_city, city, intersections, start, hours, step_minutes)
+    
+    header = {
+        "city": city,
+        "start": start.isoformat(),
+        "hours": hours,
+        "step_minutes": step_minutes,
+        "rows": len(columns["vehicle_count"]),
+        "source": columns.pop("source"),
+        "model_version": columns.pop("model_version"),
+        "generated_at": datetime.utcnow().isoformat()
+    }
+    
+    if format == "arrow":
+        try:
+            body = await run_blocking("cpu", forecast_arrow, header, columns)
+        except ImportError:
+            raise HTTPException(status_code=501, detail="Arrow output requires pyarrow")
+        return Response(body, media_type="application/vnd.apache.arrow.stream")
+    return StreamingResponse(forecast_json_chunks(header, columns), media_type="application/json")
+
+# History page and downsampling limits
+MAX_HISTORY_PAGE = 10_000
+MAX_HISTORY_POINTS = 5_000
+
+@api_router.get("/traffic/history")
+async def traffic_history(city: str, intersection_id: Optional[str] = None,
+                          start: Optional[datetime] = None, end: Optional[datetime] = None,
+                          fields: Optional[str] = None, limit: int = 1000, cursor: Optional[str] = None,
+                          points: Optional[int] = None, method: str = "lttb", value: str = "average_speed"):
+    """Stored observations as NDJSON: keyset-paginated pages, or a series downsampled to `points`"""
+    if city not in ["Accra", "Kumasi"]:
+        raise HTTPException(status_code=400, detail="City must be 'Accra' or 'Kumasi'")
+    # Stored timestamps are naive UTC; "...Z" and "+00:00" query times are aware
+    start, end = history.naive_utc(start), history.naive_utc(end)
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(days=1)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    selected = fields.split(",") if fields else history.HISTORY_FIELDS
+    unknown = set(selected) - set(history.HISTORY_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    
+    if points is None:
+        if not 1 <= limit <= MAX_HISTORY_PAGE:
+            raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_HISTORY_PAGE}")
+        try:
+            after = history.decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = history.history_filter(city, intersection_id, start, end, after)
+        documents = db.traffic_data.find(query, history.projection(selected)) \
+            .sort([("timestamp", 1), ("_id", 1)]).limit(limit + 1).batch_size(history.CURSOR_BATCH_SIZE)
+        lines = history.page_lines(documents, limit)
+    else:
+        # Downsampling is per series, so it needs a single intersection
+        if not intersection_id:
+            raise HTTPException(status_code=400, detail="points requires an intersection_id")
+        if not 3 <= points <= MAX_HISTORY_POINTS:
+            raise HTTPException(status_code=400, detail=f"points must be between 3 and {MAX_HISTORY_POINTS}")
+        query = history.history_filter(city, intersection_id, start, end)
+        if method == "average":
+            pipeline = history.bucket_pipeline(query, start, end, points, selected)
+            documents = db.traffic_data.aggregate(pipeline, batchSize=history.CURSOR_BATCH_SIZE)
+            lines = history.bucket_lines(documents)
+        elif method == "lttb":
+            if value not in history.NUMERIC_FIELDS:
+                raise HTTPException(status_code=400, detail=f"value must be one of {', '.join(history.NUMERIC_FIELDS)}")
+            documents = db.traffic_data.find(query, history.projection(set(selected) | {value})) \
+                .sort([("timestamp", 1), ("_id", 1)]).batch_size(history.CURSOR_BATCH_SIZE)
+            lines = history.lttb_lines(documents, start, end, points, value)
+        else:
+            raise HTTPException(status_code=400, detail="method must be 'lttb' or 'average'")
+    
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+@api_router.post("/signals/optimize/{intersection_id}")
+async def optimize_signal_timing(intersection_id: str, city: str = "Accra",
+                                 request: Optional[SignalOptimizationRequest] = None):
+    """Optimize signal timing for an intersection from predicted flows"""
+    if city not in ["Accra", "Kumasi"]:
+        raise HTTPException(status_code=400, detail="City must be 'Accra' or 'Kumasi'")
+    
+    intersection = find_intersection(city, intersection_id)
+    if not intersection:
+        raise HTTPException(status_code=404, detail=f"Intersection {intersection_id} not found in {city}")
+    
+    from signal_optimizer import SignalTimingOptimizer, DEFAULT_SIGNAL_TIMING, degree_of_saturation
+    
+    request = request or SignalOptimizationRequest()
+    flow = await run_blocking("cpu", predict_intersection_flow, city, intersection)
+    ns_flow = flow["hourly_flow"] * request.north_south_share
+    ew_flow = flow["hourly_flow"] - ns_flow
+    
+    optimizer = SignalTimingOptimizer(lanes=request.lanes_per_approach)
+    current_timing = dict(request.current_timing) if request.current_timing else DEFAULT_SIGNAL_TIMING
+    result = await run_blocking("cpu", optimizer.optimize, ns_flow, ew_flow, current_timing)
+    
+    improvement = result["expected_improvement"]
+    saturation = degree_of_saturation(ns_flow, ew_flow, result["optimized_timing"], request.lanes_per_approach)
+    ai_reasoning = (
+        f"Predicted flow of {int(flow['hourly_flow'])} veh/h ({int(ns_flow)} N-S, {int(ew_flow)} E-W) "
+        f"gives a Webster cycle of {result['webster_timing']['cycle_length']}s. "
+        f"Simulating {result['plans_evaluated']} candidate plans, a {result['optimized_timing']['cycle_length']}s cycle "
+        f"cuts average delay from {improvement['current_average_delay_s']}s to "
+        f"{improvement['optimized_average_delay_s']}s per vehicle (degree of saturation {saturation})."
+    )
+    
+    ml_engine = ml_engines[city]
+    ml_confidence = ml_engine.model_accuracy.get("congestion_accuracy", 0.0) if flow["source"] == "ml_model" else 0.0
+    
+    return {
+        "intersection_id": intersection_id,
+        "intersection_name": intersection["name"],
+        "city": city,
+        "predicted_hourly_flow": int(flow["hourly_flow"]),
+        "flow_source": flow["source"],
+        "current_timing": result["current_timing"],
+        "optimized_timing": result["optimized_timing"],
+        "webster_timing": result["webster_timing"],
+        "expected_improvement": improvement,
+        "degree_of_saturation": saturation,
+        "plans_evaluated": result["plans_evaluated"],
+        "computation_ms": result["computation_ms"],
+        "ai_reasoning": ai_reasoning,
+        "ml_confidence": round(float(ml_confidence), 3),
+        "optimized_at": datetime.utcnow().isoformat()
+    }
+
+@api_router.get("/signals/corridors/{city}")
+async def list_corridors(city: str):
+    """List the coordinated signal corridors of a city"""
+    if city not in ["Accra", "Kumasi"]:
+        raise HTTPException(status_code=400, detail="City must be 'Accra' or 'Kumasi'")
+    
+    return {
+        "city": city,
+        "corridors": [
+            {"corridor_id": corridor_id, "name": corridor["name"], "intersections": corridor["intersections"],
+             "arterial_share": corridor.get("arterial_share", ARTERIAL_SHARE)}
+            for corridor_id, corridor in CORRIDORS[city].items()
+        ]
+    }
+
+@offload("cpu")
+def coordinate_corridor(city: str, intersection_ids: List[str], lanes: int = 2,
+                        arterial_share: float = ARTERIAL_SHARE) -> dict:
+    """Common cycle and green-wave offsets for a list of intersections in travel order"""
+    from signal_optimizer import SignalTimingOptimizer, LOST_TIME_PER_PHASE
+    from corridor_coordination import CorridorCoordinator, link_travel_time
+    
+    intersections = [find_intersection(city, i) for i in intersection_ids]
+    flows = [predict_intersection_flow(city, i) for i in intersections]
+    
+    # Each junction's own Webster plan sets its arterial split and the cycle it needs;
+    # the plan's north-south phase stands for the arterial, whatever its compass direction
+    optimizer = SignalTimingOptimizer(lanes=lanes)
+    plans = [optimizer.webster_plan(f["hourly_flow"] * arterial_share, f["hourly_flow"] * (1 - arterial_share))
+             for f in flows]
+    green_ratios = [p["north_south_green"] / p["cycle_length"] for p in plans]
+    min_cycle = max(p["cycle_length"] for p in plans)
+    
+    # Link speeds from the speed model, averaged over both ends of the link
+    travel_times = [
+        link_travel_time(a, b, (fa["average_speed"] + fb["average_speed"]) / 2)
+        for a, b, fa, fb in zip(intersections, intersections[1:], flows, flows[1:])
+    ]
+    
+    result = CorridorCoordinator().solve(green_ratios, travel_times, min_cycle)
+    cycle = result["cycle_length"]
+    
+    signals = []
+    for idx, (intersection, plan) in enumerate(zip(intersections, plans)):
+        arterial_green = result["green"][idx]
+        signals.append({
+            "intersection_id": intersection["id"],
+            "name": intersection["name"],
+            "offset_s": result["offsets"][idx],
+            "arterial_green": arterial_green,
+            "cross_street_green": max(0, int(cycle - arterial_green - plan["pedestrian_phase"] - 2 * LOST_TIME_PER_PHASE)),
+            "pedestrian_phase": plan["pedestrian_phase"],
+            "travel_time_to_next_s": round(travel_times[idx], 1) if idx < len(travel_times) else None
+        })
+    
+    return {
+        "cycle_length": cycle,
+        "signals": signals,
+        "network_evaluation": evaluate_corridor_plans(city, intersection_ids, cycle, signals),
+        "bandwidth": {
+            "outbound_s": result["outbound_bandwidth"],
+            "inbound_s": result["inbound_bandwidth"],
+            "efficiency": round(result["efficiency"], 3)
+        },
+        "cycles_evaluated": result["cycles_evaluated"],
+        "computation_ms": result["computation_ms"]
+    }
+
+# Evening peak used to compare signal plans in the simulator
+EVALUATION_START_HOUR = 16
+EVALUATION_HOURS = 3
+
+def evaluate_corridor_plans(city: str, intersection_ids: List[str], cycle: float, signals: List[dict]) -> dict:
+    """Simulated evening-peak KPIs of the city with its current plans and with the coordinated corridor"""
+    from traffic_simulation import approach_phase, simulate
+    
+    network = city_network(city)
+    plans = {}
+    for idx, signal in enumerate(signals):
+        # The arterial green goes to the phase of the corridor's approaches
+        neighbour = intersection_ids[idx - 1] if idx > 0 else intersection_ids[idx + 1]
+        arterial_ns = approach_phase(network, signal["intersection_id"], neighbour) == 0
+        plans[signal["intersection_id"]] = {
+            "cycle_length": cycle,
+            "north_south_green": signal["arterial_green"] if arterial_ns else signal["cross_street_green"],
+            "east_west_green": signal["cross_street_green"] if arterial_ns else signal["arterial_green"],
+            "offset": signal["offset_s"],
+        }
+    
+    start = datetime.combine(traffic_clock.now().date(), datetime.min.time()) + timedelta(hours=EVALUATION_START_HOUR)
+    seed = simulation_seed(city, start.date())
+    kpis = {}
+    for name, signal_plans in (("current", None), ("coordinated", plans)):
+        result = simulate(network, start, hours=EVALUATION_HOURS, record_every=EVALUATION_HOURS * 3600,
+                          signal_plans=signal_plans, seed=seed)
+        kpis[name] = {key: result["kpis"][key] for key in
+                      ("total_delay_vehicle_hours", "average_delay_seconds", "throughput_vehicles", "average_queue_vehicles")}
+    return {"period": f"{EVALUATION_START_HOUR:02d}:00-{EVALUATION_START_HOUR + EVALUATION_HOURS:02d}:00", **kpis}
+
+@api_router.post("/signals/coordinate/{city}/{corridor_id}")
+async def coordinate_corridor_signals(city: str, corridor_id: str):
+    """Green-wave coordination of all signals along a corridor"""
+    if city not in ["Accra", "Kumasi"]:
+        raise HTTPException(status_code=400, detail="City must be 'Accra' or 'Kumasi'")
+    
+    corridor = CORRIDORS[city].get(corridor_id)
+    if not corridor:
+        raise HTTPException(status_code=404, detail=f"Corridor {corridor_id} not found in {city}")
+    
+    result = await coordinate_corridor(city, corridor["intersections"],
+                                       arterial_share=corridor.get("arterial_share", ARTERIAL_SHARE))
+    
+    return {
+        "city": city,
+        "corridor_id": corridor_id,
+        "corridor_name": corridor["name"],
+        **result,
+        "optimized_at": datetime.utcnow().isoformat()
+    }
+
+MAX_SIMULATION_HOURS = 48
+
+def run_city_simulation(city: str, start: datetime, hours: float, record_minutes: float) -> dict:
+    from traffic_simulation import simulate
+    
+    result = simulate(city_network(city), start, hours=hours, record_every=record_minutes * 60,
+                      seed=simulation_seed(city, start.date()))
+    return {
+        "city": city,
+        "start": start.isoformat(),
+        "hours": hours,
+        "step_seconds": city_network(city).dt,
+        "record_every_s": result["record_every"],
+        "intersection_ids": result["intersection_ids"],
+        "timestamps": [t.isoformat() for t in result["timestamps"]],
+        "series": {name: result[name].round(2).tolist() for name in ("vehicle_count", "average_speed", "occupancy", "queue")},
+        "kpis": result["kpis"],
+    }
+
+@api_router.get("/simulation/{city}")
+async def simulate_city(city: str, start: Optional[datetime] = None, hours: float = 24, record_minutes: float = 5):
+    """Cell transmission model run of the city's road network: per-intersection series and KPIs"""
+    if city not in ["Accra", "Kumasi"]:
+        raise HTTPException(status_code=400, detail="City must be 'Accra' or 'Kumasi'")
+    if not 0 < hours <= MAX_SIMULATION_HOURS or not 0 < record_minutes <= hours * 60:
+        raise HTTPException(status_code=400, detail=f"hours must be in (0, {MAX_SIMULATION_HOURS}] and record_minutes in (0, hours * 60]")
+    start = start or datetime.combine(traffic_clock.now().date(), datetime.min.time())
+    return await run_blocking("cpu", run_city_simulation, city, start, hours, record_minutes)
+
+MAX_SCENARIOS = 20
+MAX_SCENARIO_HOURS = 24
+
+async def save_scenario_job(job: dict):
+    await db.scenario_jobs.replace_one({"job_id": job["job_id"]}, dict(job), upsert=True)
+
+scenario_service = scenarios.ScenarioService(
+    lambda spec: run_blocking("simulation", scenarios.run_scenario, spec),
+    cache_entries=int(os.environ.get('SCENARIO_CACHE_ENTRIES', 256)),
+    save=save_scenario_job,
+)
+
+def scenario_network(city: str) -> dict:
+    """The read-only network definition sent to simulation workers"""
+    return {
+        "intersections": [{key: i[key] for key in ("id", "name", "lat", "lng")} for i in get_intersections(city)],
+        "corridors": CORRIDORS[city],
+        "dt": SIMULATION_STEP_SECONDS,
+    }
+
+@api_router.post("/scenarios/{city}", status_code=202)
+async def submit_scenarios(city: str, request: ScenarioBatchRequest):
+    """Run a batch of what-if scenarios against a baseline; poll the returned job for KPIs"""
+    if city not in ["Accra", "Kumasi"]:
+        raise HTTPException(status_code=400, detail="City must be 'Accra' or 'Kumasi'")
+    if not 0 < len(request.scenarios) <= MAX_SCENARIOS:
+        raise HTTPException(status_code=400, detail=f"Submit between 1 and {MAX_SCENARIOS} scenarios")
+    if not 0 < request.hours <= MAX_SCENARIO_HOURS:
+        raise HTTPException(status_code=400, detail=f"hours must be in (0, {MAX_SCENARIO_HOURS}]")
+    
+    start = request.start or datetime.combine(traffic_clock.now().date(), datetime.min.time()) + timedelta(hours=EVALUATION_START_HOUR)
+    seed = request.seed if request.seed is not None else simulation_seed(city, start.date())
+    try:
+        job = scenario_service.submit(city, scenario_network(city), start, request.hours, seed,
+                                      [{"name": s.name, "interventions": s.interventions} for s in request.scenarios])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "scenarios": job["scenarios"],
+        "status_url": f"/api/scenarios/jobs/{job['job_id']}",
+    }
+
+@api_router.get("/scenarios/jobs/{job_id}")
+async def get_scenario_job(job_id: str):
+    """Status of a scenario job, with comparative KPIs once completed"""
+    job = scenario_service.jobs.get(job_id)
+    if job is None:
+        try:
+            job = await db.scenario_jobs.find_one({"job_id": job_id}, {"_id": 0})
+        except Exception as e:
+            logger.warning(f"Could not load scenario job {job_id}: {e!r}")
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Scenario job {job_id} not found")
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in job.items()}
+
+# Chat: Gemini when a key is configured, else (or with CHAT_BACKEND=fake) the offline backend
+CHAT_BACKEND = os.environ.get('CHAT_BACKEND', 'gemini' if GEMINI_API_KEY else 'fake')
+chat_gateway = ChatGateway(
+    GeminiBackend(get_genai, os.environ.get('GEMINI_MODEL', 'gemini-1.5-flash'))
+    if CHAT_BACKEND == 'gemini' else FakeBackend(),
+    city_snapshots,
+    intersections={"Accra": ACCRA_INTERSECTIONS, "Kumasi": KUMASI_INTERSECTIONS},
+    cache_entries=int(os.environ.get('CHAT_CACHE_ENTRIES', 512)),
+    max_concurrency=int(os.environ.get('CHAT_MAX_CONCURRENCY', 8)),
+    queue_timeout=float(os.environ.get('CHAT_QUEUE_TIMEOUT_SECONDS', 2)),
+    first_token_timeout=float(os.environ.get('CHAT_FIRST_TOKEN_TIMEOUT_SECONDS', 10)),
+    timeout=float(os.environ.get('CHAT_TIMEOUT_SECONDS', 30)),
+)
+
+def validate_chat_request(request: ChatRequest):
+    if not request.message.strip():
+        raise HTTPException(status_code=400, detail="Message must not be empty")
+    if request.city is not None and request.city not in ["Accra", "Kumasi"]:
+        raise HTTPException(status_code=400, detail="City must be 'Accra' or 'Kumasi'")
+
 @api_router.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest):
-    """Chat with Gemini AI."""
-    user_message = request.message
-    reply = f"Gemini AI received: {user_message}"
-    return ChatResponse(reply=reply)
+    """Chat with Gemini AI about current traffic"""
+    validate_chat_request(request)
+    # Without a city, the gateway picks one from the message
+    await ensure_simulated_day(*[c for c in [request.city] if c])
+    try:
+        return ChatResponse(**await chat_gateway.reply(request.message, request.city))
+    except ChatBusy:
+        raise HTTPException(status_code=503, detail="Chat is busy, try again shortly", headers={"Retry-After": "2"})
+    except ChatTimeout:
+        raise HTTPException(status_code=504, detail="Chat backend timed out")
+    except Exception as e:
+        logger.error(f"Chat failed: {e}")
+        raise HTTPException(status_code=502, detail="Chat backend unavailable")
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    return (f"event: {event}\n" if event else "") + f"data: {json.dumps(data)}\n\n"
+
+@api_router.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Chat reply streamed as server-sent events: data {"delta"} per chunk, then a "done" event"""
+    validate_chat_request(request)
+    await ensure_simulated_day(*[c for c in [request.city] if c])
+    events = chat_gateway.stream(request.message, request.city)
+    # Take the first event before responding, so a full queue is a 503 rather than a broken stream
+    try:
+        first = await events.__anext__()
+    except ChatBusy:
+        raise HTTPException(status_code=503, detail="Chat is busy, try again shortly", headers={"Retry-After": "2"})
+    except ChatTimeout:
+        raise HTTPException(status_code=504, detail="Chat backend timed out")
+    except Exception as e:
+        logger.error(f"Chat failed: {e}")
+        raise HTTPException(status_code=502, detail="Chat backend unavailable")
+    
+    async def body():
+        event = first
+        try:
+            while True:
+                yield sse_event(event, "done" if event.get("done") else None)
+                event = await events.__anext__()
+        except StopAsyncIteration:
+            pass
+        except ChatTimeout:
+            yield sse_event({"error": "Chat backend timed out"}, "error")
+        except Exception as e:
+            logger.error(f"Chat stream failed: {e}")
+            yield sse_event({"error": "Chat backend unavailable"}, "error")
+        finally:
+            await events.aclose()
+    
+    return StreamingResponse(body(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@api_router.get("/incidents/{city}")
+async def get_incidents(city: str, status: str = "open", limit: int = Query(50, ge=1, le=500)):
+    """Detected incidents of a city, most recent first"""
+    if city not in ["Accra", "Kumasi"]:
+        raise HTTPException(status_code=400, detail="City must be 'Accra' or 'Kumasi'")
+    if status not in ["open", "resolved", "all"]:
+        raise HTTPException(status_code=400, detail="status must be 'open', 'resolved' or 'all'")
+    query = {"city": city} if status == "all" else {"city": city, "status": status}
+    incidents = await db.incidents.find(query, {"_id": 0}).sort("detected_at", -1).limit(limit).to_list(None)
+    return {"city": city, "incidents": [incident_json(i) for i in incidents]}
+
+# Comment line sent when the feed is quiet, so proxies keep the connection open
+INCIDENT_HEARTBEAT_SECONDS = 15
+
+@api_router.get("/incidents/{city}/stream")
+async def stream_incidents(city: str):
+    """Live incident feed as server-sent events: open incidents first, then every update"""
+    if city not in ["Accra", "Kumasi"]:
+        raise HTTPException(status_code=400, detail="City must be 'Accra' or 'Kumasi'")
+    queue = incident_feed.subscribe()
+    
+    async def body():
+        try:
+            for incident in incident_monitor.current(city):
+                yield sse_event(incident_json(incident), "incident")
+            while True:
+                try:
+                    incident = await asyncio.wait_for(queue.get(), INCIDENT_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                if incident["city"] == city:
+                    yield sse_event(incident_json(incident), "incident")
+        finally:
+            incident_feed.unsubscribe(queue)
+    
+    return StreamingResponse(body(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @api_router.get("/traffic")
 async def get_traffic_data():
@@ -813,6 +2185,62 @@ async def get_model_info():
         ],
         "last_updated": datetime.utcnow().isoformat()
     }
+def require_admin(token: Optional[str]):
+    """Reject requests without the configured X-Admin-Token"""
+    import hmac
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled")
+    if not token or not hmac.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+# One profile at a time: overlapping samplers would profile each other
+profiling_lock = asyncio.Lock()
+MAX_PROFILE_SECONDS = 60
+
+async def run_profile(profile, seconds: float, *args):
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be between 0 and {MAX_PROFILE_SECONDS}")
+    if profiling_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    async with profiling_lock:
+        # The sampler sleeps in a worker thread so the event loop keeps serving (and is profiled)
+        return await asyncio.to_thread(profile, seconds, *args)
+
+@api_router.get("/admin/profile/cpu")
+async def profile_cpu(seconds: float = 10, interval_ms: float = 5, format: str = "collapsed",
+                      x_admin_token: Optional[str] = Header(None)):
+    """Sampling CPU profile of this process as folded stacks for flamegraph tools"""
+    require_admin(x_admin_token)
+    import profiling
+    
+    result = await run_profile(profiling.sample_cpu, seconds, max(1.0, interval_ms) / 1000)
+    logger.info(f"CPU profile captured: {result['samples']} samples over {seconds}s")
+    if format == "json":
+        return {**result, "stacks": dict(result["stacks"].most_common())}
+    return PlainTextResponse(profiling.collapsed(result["stacks"]))
+
+@api_router.get("/admin/profile/memory")
+async def profile_memory(seconds: float = 10, format: str = "collapsed",
+                         x_admin_token: Optional[str] = Header(None)):
+    """Allocations made during the window and still live, as folded stacks weighted by bytes"""
+    require_admin(x_admin_token)
+    import profiling
+    
+    result = await run_profile(profiling.trace_allocations, seconds)
+    logger.info(f"Allocation profile captured: {result['traced_current_bytes']} bytes traced over {seconds}s")
+    if format == "json":
+        return {**result, "stacks": dict(result["stacks"].most_common(200))}
+    return PlainTextResponse(profiling.collapsed(result["stacks"]))
+
+@api_router.get("/admin/loop-stalls")
+async def get_loop_stalls(x_admin_token: Optional[str] = Header(None)):
+    """Recent event loop stalls caught by the watchdog, with the blocking stack"""
+    require_admin(x_admin_token)
+    return {
+        "threshold_ms": loop_watchdog.threshold * 1000,
+        "stalls": list(loop_watchdog.stalls)
+    }
+
 @api_router.get("/streams/{cam_id}.m3u8")
 async def get_stream(cam_id: str):
     file_path = STREAM_DIR / f"{cam_id}.m3u8"
@@ -820,6 +2248,38 @@ async def get_stream(cam_id: str):
         raise HTTPException(status_code=404, detail="Stream not found")
     return FileResponse(file_path)
 
+# Camera tiles poll thumbnails instead of playing every stream
+SNAPSHOT_MAX_WIDTH = 1920
+camera_snapshots = CameraSnapshots(
+    STREAM_DIR,
+    lambda segment, width, image_format: run_blocking("io", extract_keyframe, segment, width, image_format),
+    max_entries=int(os.environ.get('CAMERA_SNAPSHOT_CACHE_ENTRIES', 256)),
+)
+
+@api_router.get("/cameras/{cam_id}/snapshot")
+async def get_camera_snapshot(cam_id: str, width: int = 320, format: str = "jpeg",
+                              if_none_match: Optional[str] = Header(None)):
+    """Downscaled keyframe of the camera's latest HLS segment, cached per segment"""
+    if format not in SNAPSHOT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(SNAPSHOT_FORMATS)}")
+    if not 16 <= width <= SNAPSHOT_MAX_WIDTH:
+        raise HTTPException(status_code=400, detail=f"width must be between 16 and {SNAPSHOT_MAX_WIDTH}")
+    
+    current = camera_snapshots.current(cam_id, width, format)
+    if current is None:
+        raise HTTPException(status_code=404, detail="Stream not found")
+    segment, etag = current
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+    if if_none_match and etag in if_none_match:
+        return Response(status_code=304, headers=headers)
+    
+    try:
+        image = await camera_snapshots.image(segment, etag, width, format)
+    except Exception as e:
+        logger.warning(f"Snapshot of camera {cam_id} failed: {e}")
+        raise HTTPException(status_code=503, detail="Snapshot unavailable", headers={"Retry-After": "2"})
+    return Response(image, media_type=SNAPSHOT_FORMATS[format][1], headers=headers)
+
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -836,35 +2296,112 @@ async def startup_db_client():
     """Initialize database, AI integration, and ML models"""
     logger.info("Starting Traffic Flow Optimization API...")
     
-    # Create database indexes for better performance
-    try:
-        await db.traffic_data.create_index("intersection_id")
-        await db.traffic_data.create_index("city")
-        await db.traffic_data.create_index("timestamp")
-        logger.info("Database indexes created successfully")
-    except Exception as e:
-        logger.warning(f"Index creation failed: {e}")
+    # Create database indexes for better performance (without holding up readiness)
+    async def create_indexes():
+        try:
+            await run_blocking("io", get_mongo_client)
+            await db.traffic_data.create_index("intersection_id")
+            await db.traffic_data.create_index("city")
+            await db.traffic_data.create_index("timestamp")
+            # Keyset pages of /traffic/history, per intersection or per city
+            await db.traffic_data.create_index([("intersection_id", 1), ("timestamp", 1), ("_id", 1)])
+            await db.traffic_data.create_index([("city", 1), ("timestamp", 1), ("_id", 1)])
+            await db.incidents.create_index("updated_at")
+            await db.incidents.create_index([("city", 1), ("detected_at", -1)])
+            await db.scenario_jobs.create_index("job_id", unique=True)
+            logger.info("Database indexes created successfully")
+        except Exception as e:
+            logger.warning(f"Index creation failed: {e}")
     
     # Pre-load ML models for both cities in background
     async def load_models_background():
-        try:
-            logger.info("Loading pre-trained ML models...")
-            for city, ml_engine in ml_engines.items():
-                if not ml_engine.load_models(city):
-                    logger.info(f"No pre-trained models found for {city}, training new ones...")
-                    # Train if no pre-trained models exist
-                    success = ml_engine.train_models(city)
-                    if success:
-                        logger.info(f"ML models trained successfully for {city}")
-                    else:
-                        logger.error(f"ML model training failed for {city}")
-                else:
+        logger.info("Loading pre-trained ML models...")
+        for city, ml_engine in list(ml_engines.items()):
+            try:
+                if ml_engine.is_trained:
+                    logger.info(f"Using models preloaded by the master process for {city}")
+                elif await run_blocking("io", model_store.load, city, ml_engine):
                     logger.info(f"Pre-trained models loaded for {city}")
-        except Exception as e:
-            logger.error(f"ML model loading failed: {e}")
+                elif not owns_background_duties():
+                    logger.info(f"No published models for {city} yet, waiting for the trainer/leader")
+                else:
+                    logger.info(f"No pre-trained models found for {city}, training new ones...")
+                    await train_and_swap_models(city)
+            except Exception as e:
+                logger.error(f"ML model loading failed for {city}: {e}")
     
-    # Start background loading (non-blocking)
+    if APP_ROLE == "all" and not leader_lock.try_acquire():
+        logger.info("Another worker is the leader; this worker only serves requests")
+    
+    # Start background work (non-blocking)
+    asyncio.create_task(create_indexes())
     asyncio.create_task(load_models_background())
+    asyncio.create_task(metrics.monitor_event_loop_lag())
+    asyncio.create_task(loop_watchdog.run())
+    asyncio.create_task(follow_incidents())
+    # Simulate today up front rather than in the first dashboard request
+    asyncio.create_task(ensure_simulated_day())
+    if not owns_background_duties():
+        asyncio.create_task(watch_model_store())
+    if APP_ROLE == "all" and not leader_lock.is_leader:
+        asyncio.create_task(campaign_for_leadership())
+    if owns_background_duties():
+        start_leader_duties()
+
+def preload_models():
+    """Load published models synchronously, e.g. in the gunicorn master before it
+    forks, so every worker shares the same model pages copy-on-write"""
+    for city, ml_engine in ml_engines.items():
+        if model_store.load(city, ml_engine):
+            logger.info(f"Preloaded {city} models (version {ml_engine.model_version})")
+
+async def follow_incidents():
+    """Publish incidents stored by the analyzer to this process's live feed"""
+    await run_blocking("io", get_mongo_client)
+    await incident_monitor.tail(db, INCIDENT_POLL_SECONDS)
+
+def start_leader_duties():
+    """Periodic work the leader runs when APP_ROLE is 'all': online updates and the analyzer's jobs"""
+    from roles import run_analyzer
+    asyncio.create_task(run_online_updates())
+    asyncio.create_task(run_analyzer())
+
+async def campaign_for_leadership():
+    """Take over the leader's duties if the leader worker goes away"""
+    while not leader_lock.try_acquire():
+        await asyncio.sleep(LEADER_RETRY_SECONDS)
+    logger.info("Took over as leader")
+    start_leader_duties()
+    await start_all_camera_streams()
+    for city, ml_engine in list(ml_engines.items()):
+        if not ml_engine.is_trained:
+            await train_and_swap_models(city)
+
+async def reload_models_if_published(city: str) -> bool:
+    """Hot-swap a city's engine when the trainer has published a new version"""
+    manifest = await run_blocking("io", model_store.current_version, city)
+    if not manifest or manifest["version"] == ml_engines[city].model_version:
+        return False
+    
+    # Load into a fresh engine, then swap the reference: requests in flight keep
+    # the engine they started with and new requests see the new models
+    engine = TrafficMLEngine()
+    if not await run_blocking("io", model_store.load, city, engine):
+        logger.error(f"Failed to load published {city} models {manifest['version']}")
+        return False
+    ml_engines[city] = engine
+    logger.info(f"Hot-swapped {city} models to version {manifest['version']}")
+    return True
+
+async def watch_model_store():
+    """Poll the model store for versions published by the trainer role"""
+    while True:
+        await asyncio.sleep(MODEL_POLL_SECONDS)
+        for city in list(ml_engines):
+            try:
+                await reload_models_if_published(city)
+            except Exception as e:
+                logger.error(f"Model reload failed for {city}: {e}")
     
 # List of cameras (replace with your cameras list)
 cameras = [
@@ -875,8 +2412,15 @@ cameras = [
 
 @app.on_event("startup")
 async def start_all_camera_streams():
+    if not owns_background_duties():
+        # Streams are owned by the stream-supervisor role or the leader worker
+        return
+    if not ENABLE_RTSP:
+        logger.info("RTSP streaming disabled (ENABLE_RTSP=false)")
+        return
     for cam in cameras:
-        start_hls_stream(cam)
+        # Spawning FFmpeg forks the process; keep that off the event loop
+        await run_blocking("io", start_hls_stream, cam)
         
 @app.get("/")
 async def root():
@@ -908,18 +2452,13 @@ async def health_check():
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
+    if client is not None:
+        client.close()
+    if traffic_recorder is not None:
+        traffic_recorder.close()
+    shutdown_pools()
 
 if __name__ == "__main__":
-    import uvicorn
-    
-    try:
-        host = os.environ.get("HOST", "0.0.0.0")
-        port = int(os.environ.get("PORT", 8001))
-        
-        print(f"Starting server on {host}:{port}")
-        uvicorn.run(app, host=host, port=port)
-    except Exception as e:
-        print(f"Failed to start server: {e}")
-        # Optionally, you could fall back to default values
-        uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    # python server.py [--role all|api|trainer|stream-supervisor|analyzer]
+    from roles import main
+    main()
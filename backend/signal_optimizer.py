@@ -0,0 +1,197 @@
+# signal_optimizer.py
+"""Signal timing optimization for a single intersection.
+
+Webster's method gives the starting cycle length and green splits from the
+predicted approach flows. A vectorized queue simulation then scores a grid
+of candidate plans around that starting point (every plan is one row of the
+same NumPy arrays) and the lowest-delay plan wins.
+"""
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+# Traffic engineering constants (HCM defaults for urban arterials)
+SATURATION_FLOW = 1800.0      # veh/h of green per lane
+LOST_TIME_PER_PHASE = 4.0     # s of amber + all-red per vehicular phase
+MIN_GREEN = 10.0              # s
+MIN_PEDESTRIAN = 8.0          # s
+MIN_CYCLE = 40.0              # s
+MAX_CYCLE = 150.0             # s
+
+# Fixed-time plan most junctions run when nothing better is known
+DEFAULT_SIGNAL_TIMING = {
+    "cycle_length": 83,
+    "north_south_green": 30,
+    "east_west_green": 30,
+    "pedestrian_phase": 15,
+}
+
+
+class SignalTimingOptimizer:
+    """Optimize a two-phase + pedestrian signal plan for predicted flows"""
+
+    def __init__(self, lanes: int = 2, horizon_seconds: int = 900,
+                 time_step: float = 2.0, latency_budget_ms: float = 250.0,
+                 seed: int = 42):
+        self.lanes = lanes
+        self.horizon_seconds = horizon_seconds
+        self.time_step = time_step
+        self.latency_budget_ms = latency_budget_ms
+        self.seed = seed
+
+    @property
+    def lost_time(self) -> float:
+        return 2 * LOST_TIME_PER_PHASE
+
+    def webster_plan(self, ns_flow: float, ew_flow: float,
+                     pedestrian_phase: float = MIN_PEDESTRIAN) -> Dict[str, float]:
+        """Webster optimum cycle and proportional green splits (flows in veh/h)"""
+        capacity = SATURATION_FLOW * self.lanes
+        y_ns = ns_flow / capacity
+        y_ew = ew_flow / capacity
+        y_total = min(y_ns + y_ew, 0.95)
+
+        lost_time = self.lost_time + pedestrian_phase
+        cycle = (1.5 * lost_time + 5) / (1 - y_total)
+        cycle = float(np.clip(cycle, MIN_CYCLE, MAX_CYCLE))
+
+        effective_green = cycle - lost_time
+        ns_share = y_ns / (y_ns + y_ew) if (y_ns + y_ew) > 0 else 0.5
+        ns_green = max(MIN_GREEN, effective_green * ns_share)
+        ew_green = max(MIN_GREEN, effective_green - ns_green)
+
+        return {
+            "cycle_length": round(ns_green + ew_green + lost_time),
+            "north_south_green": round(ns_green),
+            "east_west_green": round(ew_green),
+            "pedestrian_phase": round(pedestrian_phase),
+        }
+
+    def candidate_plans(self, start: Dict[str, float]) -> np.ndarray:
+        """Grid of (ns_green, ew_green, pedestrian, cycle) plans around a starting plan"""
+        start_green = start["north_south_green"] + start["east_west_green"]
+        start_share = start["north_south_green"] / start_green
+
+        total_green = np.linspace(0.6, 1.5, 24) * start_green
+        shares = np.clip(start_share + np.linspace(-0.25, 0.25, 41), 0.15, 0.85)
+        pedestrian = np.array([MIN_PEDESTRIAN, 10.0, 12.0, 15.0])
+
+        g, s, p = np.meshgrid(total_green, shares, pedestrian, indexing="ij")
+        ns_green = np.maximum(MIN_GREEN, g * s).ravel()
+        ew_green = np.maximum(MIN_GREEN, g * (1 - s)).ravel()
+        plans = np.round(np.column_stack([ns_green, ew_green, p.ravel()]))
+        # Candidate cycles are exactly their phases, with no all-red to spare
+        plans = np.column_stack([plans, plans.sum(axis=1) + self.lost_time])
+        return plans[(plans[:, 3] >= MIN_CYCLE) & (plans[:, 3] <= MAX_CYCLE)]
+
+    def simulate(self, plans: np.ndarray, ns_flow: float, ew_flow: float) -> Dict[str, np.ndarray]:
+        """Simulate queues for every plan at once; returns per-plan KPI arrays
+
+        All plans see the same random arrivals, so differences in delay come
+        from the timing alone.
+        """
+        dt = self.time_step
+        steps = int(self.horizon_seconds / dt)
+        rng = np.random.default_rng(self.seed)
+        arrivals = rng.poisson(np.array([ns_flow, ew_flow]) / 3600.0 * dt, size=(steps, 2))
+        discharge = SATURATION_FLOW * self.lanes / 3600.0 * dt
+
+        # The time of a cycle beyond its phases and lost time is all-red
+        ns_green, ew_green, cycle = plans[:, 0], plans[:, 1], plans[:, 3]
+        ns_end = ns_green
+        ew_start = ns_green + LOST_TIME_PER_PHASE
+        ew_end = ew_start + ew_green
+
+        queue_ns = np.zeros(len(plans))
+        queue_ew = np.zeros(len(plans))
+        delay = np.zeros(len(plans))
+        served = np.zeros(len(plans))
+        max_queue = np.zeros(len(plans))
+
+        for step in range(steps):
+            t = (step * dt) % cycle
+            queue_ns += arrivals[step, 0]
+            queue_ew += arrivals[step, 1]
+
+            out_ns = np.where(t < ns_end, np.minimum(queue_ns, discharge), 0.0)
+            out_ew = np.where((t >= ew_start) & (t < ew_end), np.minimum(queue_ew, discharge), 0.0)
+            queue_ns -= out_ns
+            queue_ew -= out_ew
+
+            served += out_ns + out_ew
+            delay += (queue_ns + queue_ew) * dt
+            np.maximum(max_queue, queue_ns + queue_ew, out=max_queue)
+
+        total_arrivals = max(float(arrivals.sum()), 1.0)
+        return {
+            "average_delay": delay / total_arrivals,
+            "throughput": served / (self.horizon_seconds / 3600.0),
+            "max_queue": max_queue,
+            "residual_queue": queue_ns + queue_ew,
+        }
+
+    def optimize(self, ns_flow: float, ew_flow: float,
+                 current_timing: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+        """Find the lowest-delay plan for the given approach flows (veh/h)"""
+        started = time.perf_counter()
+        current = dict(current_timing or DEFAULT_SIGNAL_TIMING)
+        webster = self.webster_plan(ns_flow, ew_flow)
+
+        baseline = np.array([
+            [current["north_south_green"], current["east_west_green"], current["pedestrian_phase"], current["cycle_length"]],
+            [webster["north_south_green"], webster["east_west_green"], webster["pedestrian_phase"], webster["cycle_length"]],
+        ], dtype=float)
+        candidates = self.candidate_plans(webster)
+
+        # Score the baseline plans first, then candidate chunks until the budget runs out
+        results = self.simulate(baseline, ns_flow, ew_flow)
+        evaluated = [baseline]
+        chunk_size = 1024
+        for offset in range(0, len(candidates), chunk_size):
+            if (time.perf_counter() - started) * 1000 > self.latency_budget_ms:
+                break
+            chunk = candidates[offset:offset + chunk_size]
+            chunk_results = self.simulate(chunk, ns_flow, ew_flow)
+            results = {k: np.concatenate([results[k], chunk_results[k]]) for k in results}
+            evaluated.append(chunk)
+        plans = np.concatenate(evaluated)
+
+        # Penalise plans that leave a standing queue at the end of the horizon
+        score = results["average_delay"] + results["residual_queue"] * 0.5
+        best = int(np.argmin(score))
+        ns_green, ew_green, ped, cycle = plans[best]
+
+        current_delay = float(results["average_delay"][0])
+        best_delay = float(results["average_delay"][best])
+        improvement = (current_delay - best_delay) / current_delay * 100 if current_delay > 0 else 0.0
+
+        return {
+            "current_timing": current,
+            "webster_timing": webster,
+            "optimized_timing": {
+                "cycle_length": int(cycle),
+                "north_south_green": int(ns_green),
+                "east_west_green": int(ew_green),
+                "pedestrian_phase": int(ped),
+            },
+            "expected_improvement": {
+                "delay_reduction_percent": round(max(0.0, improvement), 1),
+                "current_average_delay_s": round(current_delay, 1),
+                "optimized_average_delay_s": round(best_delay, 1),
+                "throughput_veh_per_hour": int(results["throughput"][best]),
+                "max_queue_vehicles": int(results["max_queue"][best]),
+            },
+            "plans_evaluated": int(len(plans)),
+            "computation_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+
+
+def degree_of_saturation(ns_flow: float, ew_flow: float, timing: Dict[str, float], lanes: int = 2) -> float:
+    """Highest volume/capacity ratio across the two vehicular phases"""
+    cycle = timing.get("cycle_length") or timing["north_south_green"] + timing["east_west_green"] \
+        + timing["pedestrian_phase"] + 2 * LOST_TIME_PER_PHASE
+    capacity = SATURATION_FLOW * lanes
+    x_ns = ns_flow / (capacity * timing["north_south_green"] / cycle)
+    x_ew = ew_flow / (capacity * timing["east_west_green"] / cycle)
+    return round(max(x_ns, x_ew), 2)
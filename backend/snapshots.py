@@ -0,0 +1,44 @@
+# snapshots.py
+"""Per-city traffic snapshots shared by everything that reasons about "now".
+
+The chat gateway, the insight engine and the dashboard all describe current
+traffic. They read the same snapshot, retaken at most once per refresh
+interval, so that they agree with each other, and anything derived from a
+snapshot can be cached under its id until the next refresh.
+"""
+import itertools
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+_ids = itertools.count(1)
+
+
+class Snapshot:
+    """Traffic records of a city at one point in time"""
+
+    def __init__(self, city: str, records: List[Dict]):
+        self.city = city
+        self.records = records
+        self.taken_at = datetime.utcnow()
+        self.id = f"{city}:{next(_ids)}:{self.taken_at.isoformat(timespec='seconds')}"
+
+
+class SnapshotCache:
+    """The current snapshot of each city, retaken every refresh_seconds"""
+
+    def __init__(self, take: Callable[[str], List[Dict]], refresh_seconds: float = 60):
+        self.take = take
+        self.refresh_seconds = refresh_seconds
+        self._snapshots: Dict[str, Tuple[float, Snapshot]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, city: str) -> Snapshot:
+        taken = self._snapshots.get(city)
+        if taken is None or time.monotonic() - taken[0] > self.refresh_seconds:
+            with self._lock:
+                taken = self._snapshots.get(city)
+                if taken is None or time.monotonic() - taken[0] > self.refresh_seconds:
+                    taken = self._snapshots[city] = (time.monotonic(), Snapshot(city, self.take(city)))
+        return taken[1]
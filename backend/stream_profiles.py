@@ -0,0 +1,120 @@
+# stream_profiles.py
+"""FFmpeg HLS command lines per camera stream profile.
+
+A camera's "stream" entry in the camera config selects its profile:
+
+    {"id": "cam1", "source_rtsp": "...", "stream": {"low_latency": true}}
+    {"id": "cam2", "source_rtsp": "...", "stream": {"renditions": ["1080p", "480p", "240p"]}}
+    {"id": "cam3", "source_rtsp": "...", "stream": {"low_latency": true, "renditions": ["720p", "240p"]}}
+
+- No "stream" entry: the source codec is copied into 2 s segments, a
+  3-segment playlist (the original behaviour, and the cheapest).
+- low_latency: re-encoded with x264's zerolatency tuning and a keyframe at
+  the start of every short (1 s by default) segment. Each segment can then be
+  decoded on its own, so the player can sit close to the live edge. FFmpeg's
+  HLS muxer cannot write LL-HLS partial segments (EXT-X-PART), so short
+  independent segments are the partial-segment mode it offers.
+- renditions: an adaptive-bitrate ladder. The source is decoded once,
+  then split and scaled into each rendition and encoded. A master playlist
+  {cam_id}.m3u8 lists one variant playlist per rendition, highest first.
+  Transcoded profiles carry video only.
+
+Options not given fall back to DEFAULT_STREAM (STREAM_* environment variables
+in server.py).
+"""
+from pathlib import Path
+from typing import Dict, List
+
+# name -> (height, video bitrate in kbit/s)
+RENDITIONS = {
+    "1080p": (1080, 5000),
+    "720p": (720, 2800),
+    "480p": (480, 1200),
+    "360p": (360, 700),
+    "240p": (240, 400),
+}
+DEFAULT_STREAM = {"low_latency": False, "renditions": [], "segment_seconds": None, "list_size": None}
+SEGMENT_SECONDS = {"copy": 2.0, "low_latency": 1.0, "transcode": 2.0}
+LIST_SIZE = {"copy": 3, "low_latency": 4, "transcode": 3}
+# Bitrate of a low-latency stream at the source resolution
+SOURCE_BITRATE = 4000
+
+
+def stream_options(cam: Dict, defaults: Dict = DEFAULT_STREAM) -> Dict:
+    """The camera's stream options over the defaults; ValueError if they are invalid"""
+    options = {**DEFAULT_STREAM, **defaults, **(cam.get("stream") or {})}
+    unknown = set(options) - set(DEFAULT_STREAM)
+    if unknown:
+        raise ValueError(f"Unknown stream options for camera {cam['id']}: {', '.join(sorted(unknown))}")
+    renditions = list(options["renditions"])
+    for name in renditions:
+        if name not in RENDITIONS:
+            raise ValueError(f"Unknown rendition {name!r} for camera {cam['id']}; use {', '.join(RENDITIONS)}")
+    # Highest first: players start on the first variant of the master playlist
+    options["renditions"] = sorted(set(renditions), key=lambda name: -RENDITIONS[name][0])
+
+    mode = "low_latency" if options["low_latency"] else "transcode" if options["renditions"] else "copy"
+    options["mode"] = mode
+    options["segment_seconds"] = float(options["segment_seconds"] or SEGMENT_SECONDS[mode])
+    options["list_size"] = int(options["list_size"] or LIST_SIZE[mode])
+    if not 0.5 <= options["segment_seconds"] <= 10 or not 2 <= options["list_size"] <= 20:
+        raise ValueError(f"Camera {cam['id']}: segment_seconds must be in [0.5, 10] and list_size in [2, 20]")
+    return options
+
+
+def _encoder(stream: str, bitrate: int) -> List[str]:
+    """x264 and its rate control for one output video stream"""
+    return [
+        f"-c:v:{stream}", "libx264",
+        f"-b:v:{stream}", f"{bitrate}k",
+        f"-maxrate:v:{stream}", f"{int(bitrate * 1.2)}k",
+        f"-bufsize:v:{stream}", f"{bitrate * 2}k",
+    ]
+
+
+def hls_command(cam: Dict, output_dir: Path, defaults: Dict = DEFAULT_STREAM) -> List[str]:
+    """FFmpeg arguments streaming the camera to {output_dir}/{cam_id}.m3u8 in its profile"""
+    cam_id = cam["id"]
+    options = stream_options(cam, defaults)
+    segment = options["segment_seconds"]
+    output = output_dir / f"{cam_id}.m3u8"
+    hls = ["-f", "hls", "-hls_time", f"{segment:g}", "-hls_list_size", str(options["list_size"])]
+
+    if options["mode"] == "copy":
+        return ["ffmpeg", "-i", cam["source_rtsp"], "-c:v", "copy", "-c:a", "aac",
+                *hls, "-hls_flags", "delete_segments", str(output)]
+
+    cmd = ["ffmpeg"]
+    if options["low_latency"]:
+        cmd += ["-fflags", "nobuffer", "-flags", "low_delay"]
+    cmd += ["-i", cam["source_rtsp"]]
+    renditions = options["renditions"]
+    if renditions:
+        # One decode, split and scaled per rendition
+        labels = [f"[v{n}]" for n in range(len(renditions))]
+        graph = f"[0:v]split={len(renditions)}{''.join(labels)}"
+        for n, name in enumerate(renditions):
+            graph += f";{labels[n]}scale=-2:{RENDITIONS[name][0]}[out{n}]"
+        cmd += ["-filter_complex", graph]
+        for n, name in enumerate(renditions):
+            cmd += ["-map", f"[out{n}]", *_encoder(str(n), RENDITIONS[name][1])]
+    else:
+        cmd += ["-map", "0:v:0", *_encoder("0", SOURCE_BITRATE)]
+
+    cmd += ["-an", "-preset", "veryfast", "-sc_threshold", "0",
+            "-force_key_frames", f"expr:gte(t,n_forced*{segment:g})"]
+    if options["low_latency"]:
+        cmd += ["-tune", "zerolatency"]
+    flags = "delete_segments+independent_segments" + ("+program_date_time" if options["low_latency"] else "")
+    cmd += [*hls, "-hls_flags", flags]
+
+    if renditions:
+        cmd += [
+            "-var_stream_map", " ".join(f"v:{n},name:{name}" for n, name in enumerate(renditions)),
+            "-master_pl_name", output.name,
+            "-hls_segment_filename", str(output_dir / f"{cam_id}_%v_%d.ts"),
+            str(output_dir / f"{cam_id}_%v.m3u8"),
+        ]
+    else:
+        cmd += ["-hls_segment_filename", str(output_dir / f"{cam_id}_%d.ts"), str(output)]
+    return cmd
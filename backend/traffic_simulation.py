@@ -0,0 +1,383 @@
+# traffic_simulation.py
+"""Macroscopic city traffic simulation with the cell transmission model (CTM).
+
+The road graph is built from the coordinated corridors. Every pair of
+neighbouring intersections on a corridor is joined by a road in each
+direction, and every intersection also gets an entry road from outside the
+network, where demand is loaded. Roads are cut into cells that a vehicle
+crosses in one time step at free-flow speed, so a 5 s step on a 50 km/h road
+gives cells of about 70 m.
+
+Each step, a cell sends min(vehicles, capacity) and receives
+min(capacity, w/v * (jam - vehicles)). Flow between consecutive cells of a
+road is the smaller of the two. At an intersection, the last cell of each
+approach sends its vehicles through:
+
+- turning fractions, to the outgoing roads (no U-turns) and to an exit;
+- the green share of its signal phase in this step;
+- a cap so that no outgoing road receives more than its first cell accepts.
+
+Queues therefore spill back cell by cell into upstream intersections. All
+cells and movements of the city are flat NumPy arrays, and one step is a
+fixed handful of vectorized operations, so a day at 5 s resolution (17,280
+steps) runs in about a second.
+
+Every record interval, each intersection reports, like a detector would:
+
+- the vehicles that crossed it, as a count per COUNT_WINDOW seconds;
+- the space-mean speed on the roads leading to it;
+- the occupancy (share of jam storage used) of its approaches;
+- its queue;
+- a congestion level from that occupancy.
+
+simulate() returns these as arrays, together with network KPIs (delay,
+throughput, queues). observation_records() and observation_frame() turn them
+into the same shape as stored traffic_data.
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from corridor_coordination import ROAD_CIRCUITY, haversine_km
+from signal_optimizer import DEFAULT_SIGNAL_TIMING, LOST_TIME_PER_PHASE, SATURATION_FLOW
+
+FREE_FLOW_SPEED = 50.0        # km/h
+JAM_DENSITY = 150.0           # veh/km per lane
+ENTRY_ROAD_KM = 1.0           # length of the modelled part of each entry road
+APPROACH_KM = 0.3             # stretch upstream of a stop line counted as its approach
+EXIT_SHARE = 0.3              # share of vehicles leaving the network at each intersection
+BASE_DEMAND = 400.0           # veh/h entering at each intersection at profile 1.0
+COUNT_WINDOW = 300.0          # s; vehicle counts are per 5 minutes whatever the record interval
+
+# Demand multiplier per hour of day, the same shape as the historical profile
+# (rush hours 7-8 and 17-18, shoulders 9 and 19) with quiet nights
+DEMAND_PROFILE = [0.3, 0.2, 0.2, 0.2, 0.3, 0.6, 1.5, 3.25, 3.25, 2.15, 1.2, 1.1,
+                  1.2, 1.2, 1.1, 1.3, 1.6, 3.25, 3.25, 2.15, 1.2, 0.9, 0.6, 0.4]
+WEEKEND_DEMAND = 0.8
+
+# Approach occupancy at or above which each level applies, worst first
+CONGESTION_OCCUPANCY = [("Critical", 0.35), ("High", 0.2), ("Medium", 0.1), ("Low", 0.0)]
+
+
+def congestion_level(occupancy: float) -> str:
+    for level, threshold in CONGESTION_OCCUPANCY:
+        if occupancy >= threshold:
+            return level
+    return "Low"
+
+
+def road_graph(intersections: Sequence[Dict], corridors: Dict[str, Dict]) -> List[tuple]:
+    """Directed (from_id, to_id) roads between neighbouring intersections of every corridor"""
+    known = {i["id"] for i in intersections}
+    roads = []
+    for corridor in corridors.values():
+        stops = [i for i in corridor["intersections"] if i in known]
+        for a, b in zip(stops, stops[1:]):
+            for road in ((a, b), (b, a)):
+                if road not in roads:
+                    roads.append(road)
+    return roads
+
+
+class RoadNetwork:
+    """Cells, links and movements of a city, as flat arrays for the CTM"""
+
+    def __init__(self, intersections: Sequence[Dict], corridors: Dict[str, Dict], dt: float = 5.0,
+                 lanes: int = 2, lane_overrides: Optional[Dict[tuple, int]] = None,
+                 free_speed: float = FREE_FLOW_SPEED):
+        self.intersections = list(intersections)
+        self.ids = [i["id"] for i in self.intersections]
+        self.dt = dt
+        self.free_speed = free_speed
+        self.cell_km = free_speed * dt / 3600.0
+        position = {i["id"]: n for n, i in enumerate(self.intersections)}
+        lane_overrides = lane_overrides or {}
+
+        # Links: the roads of the graph, then one entry road per intersection (from None)
+        self.roads = road_graph(self.intersections, corridors)
+        links = []
+        for a, b in self.roads:
+            start, end = self.intersections[position[a]], self.intersections[position[b]]
+            length = haversine_km(start["lat"], start["lng"], end["lat"], end["lng"]) * ROAD_CIRCUITY
+            north_south = abs(end["lat"] - start["lat"]) >= abs(end["lng"] - start["lng"])
+            links.append((position[a], position[b], length, lane_overrides.get((a, b), lanes), north_south))
+        for n, intersection in enumerate(self.intersections):
+            approaches = [ns for _, to, _, _, ns in links if to == n]
+            # The entry road runs on the phase the corridor approaches use least
+            north_south = approaches.count(True) <= approaches.count(False) if approaches else True
+            links.append((None, n, ENTRY_ROAD_KM, lanes, north_south))
+
+        first, last, link_lanes, cell_link = [], [], [], []
+        for index, (_, _, length, link_lane_count, _) in enumerate(links):
+            cells = max(1, round(length / self.cell_km))
+            first.append(len(cell_link))
+            cell_link += [index] * cells
+            last.append(len(cell_link) - 1)
+            link_lanes.append(link_lane_count)
+        self.link_from = np.array([-1 if a is None else a for a, _, _, _, _ in links])
+        self.link_to = np.array([b for _, b, _, _, _ in links])
+        self.link_phase = np.array([0 if ns else 1 for _, _, _, _, ns in links])
+        self.first = np.array(first)
+        self.last = np.array(last)
+        self.entry_first = self.first[len(self.roads):]
+        self.cells = len(cell_link)
+        cell_link = np.array(cell_link)
+        self.cell_link = cell_link
+
+        # Per-cell capacity and jam storage (vehicles per step / per cell)
+        cell_lanes = np.array(link_lanes, dtype=float)[cell_link]
+        self.capacity = SATURATION_FLOW * cell_lanes * dt / 3600.0
+        self.jam = JAM_DENSITY * cell_lanes * self.cell_km
+        critical_density = SATURATION_FLOW / free_speed
+        self.wave_ratio = (SATURATION_FLOW / (JAM_DENSITY - critical_density)) / free_speed
+
+        # Cells followed by another cell of the same link
+        is_last = np.zeros(self.cells, dtype=bool)
+        is_last[self.last] = True
+        self.upstream = np.flatnonzero(~is_last)
+        self.downstream = self.upstream + 1
+
+        # Movements: every approach to every outgoing road except a U-turn, plus an exit (-1)
+        m_from, m_to, m_beta = [], [], []
+        for link in range(len(links)):
+            node, origin = self.link_to[link], self.link_from[link]
+            outgoing = [out for out in range(len(self.roads)) if self.link_from[out] == node and self.link_to[out] != origin]
+            shares = [(out, (1 - EXIT_SHARE) / len(outgoing)) for out in outgoing] + [(-1, EXIT_SHARE if outgoing else 1.0)]
+            for out, share in shares:
+                m_from.append(link)
+                m_to.append(out)
+                m_beta.append(share)
+        self.move_from_cell = self.last[np.array(m_from)]
+        self.move_to = np.array(m_to)
+        self.move_beta = np.array(m_beta)
+        self.move_node = self.link_to[np.array(m_from)]
+        self.move_phase = self.link_phase[np.array(m_from)]
+        exits = self.move_to < 0
+        self.move_exit = exits
+        self.move_to_cell = np.where(exits, 0, self.first[np.maximum(self.move_to, 0)])
+
+        self.cell_node = self.link_to[cell_link]
+        # Approach cells: the last APPROACH_KM of every link, by the intersection they lead to
+        approach_cells = max(1, round(APPROACH_KM / self.cell_km))
+        offsets = self.last[cell_link] - np.arange(self.cells)
+        self.approach = np.flatnonzero(offsets < approach_cells)
+        self.approach_node = self.link_to[cell_link[self.approach]]
+
+
+def approach_phase(network: RoadNetwork, intersection_id: str, from_id: str) -> int:
+    """Signal phase (0 north-south, 1 east-west) of the road into an intersection from a neighbour"""
+    for link, (a, b) in enumerate(network.roads):
+        if (a, b) == (from_id, intersection_id):
+            return int(network.link_phase[link])
+    raise KeyError(f"No road from {from_id} to {intersection_id}")
+
+
+def green_shares(plans: np.ndarray, t: np.ndarray, dt: float) -> np.ndarray:
+    """(len(t), nodes, 2) share of each step [t, t + dt) that each phase is green.
+
+    plans is (nodes, 4): cycle, north-south green, east-west green, offset;
+    a cycle of 0 means an unsignalised intersection (always green).
+    """
+    cycle, ns_green, ew_green, offset = plans.T
+    signalised = cycle > 0
+    safe_cycle = np.where(signalised, cycle, 1.0)
+    start = (np.asarray(t, dtype=float)[:, None] - offset) % safe_cycle
+    windows = [(0.0, ns_green), (ns_green + LOST_TIME_PER_PHASE, ns_green + LOST_TIME_PER_PHASE + ew_green)]
+    shares = np.empty(start.shape + (2,))
+    for phase, (a, b) in enumerate(windows):
+        overlap = np.maximum(0.0, np.minimum(start + dt, b) - np.maximum(start, a))
+        # The step can run into the next cycle
+        overlap += np.maximum(0.0, np.minimum(start + dt, b + safe_cycle) - np.maximum(start, a + safe_cycle))
+        shares[..., phase] = overlap / dt
+    return np.where(signalised[:, None], np.minimum(shares, 1.0), 1.0)
+
+
+def signal_plan_array(network: RoadNetwork, signal_plans: Optional[Dict[str, Optional[Dict]]] = None) -> np.ndarray:
+    """(nodes, 4) plan rows; intersections without a plan run DEFAULT_SIGNAL_TIMING, None means unsignalised"""
+    signal_plans = signal_plans or {}
+    rows = []
+    for intersection_id in network.ids:
+        plan = signal_plans.get(intersection_id, DEFAULT_SIGNAL_TIMING)
+        if plan is None:
+            rows.append((0.0, 0.0, 0.0, 0.0))
+        else:
+            rows.append((plan["cycle_length"], plan["north_south_green"], plan["east_west_green"], plan.get("offset", 0)))
+    return np.array(rows, dtype=float)
+
+
+def demand_rates(start: datetime, steps: int, dt: float, nodes: int, base_demand: float,
+                 demand_scale: np.ndarray) -> np.ndarray:
+    """(steps, nodes) vehicles per step entering at each intersection, following DEMAND_PROFILE"""
+    seconds = start.hour * 3600 + start.minute * 60 + start.second + np.arange(steps) * dt
+    day = (seconds // 86400).astype(int)
+    hour = seconds % 86400 / 3600.0
+    # Interpolate between hour midpoints so demand ramps up rather than jumping
+    profile = np.interp(hour, np.arange(24) + 0.5, DEMAND_PROFILE, period=24)
+    weekend = np.array([(start.weekday() + d) % 7 >= 5 for d in day])
+    profile = profile * np.where(weekend, WEEKEND_DEMAND, 1.0)
+    return (base_demand * dt / 3600.0) * profile[:, None] * demand_scale[None, :]
+
+
+def simulate(network: RoadNetwork, start: datetime, hours: float = 24.0, record_every: float = 300.0,
+             signal_plans: Optional[Dict[str, Optional[Dict]]] = None, base_demand: float = BASE_DEMAND,
+             demand_scale: Optional[Dict[str, float]] = None, demand_events: Sequence[Dict] = (),
+             seed: Optional[int] = 0) -> Dict[str, Any]:
+    """Run the CTM from `start` for `hours`; per-intersection series every record_every seconds and KPIs.
+
+    demand_scale multiplies an intersection's demand for the whole run;
+    demand_events ({"intersection_id", "start", "end", "multiplier"}) only
+    between two times, e.g. a match letting out. Arrivals are Poisson around
+    the demand, drawn from `seed`, so the same inputs always give the same
+    result.
+    """
+    dt = network.dt
+    steps = int(round(hours * 3600 / dt))
+    per_record = max(1, int(round(record_every / dt)))
+    records = steps // per_record
+    nodes = len(network.ids)
+    cells = network.cells
+
+    plans = signal_plan_array(network, signal_plans)
+    scale = np.array([(demand_scale or {}).get(i, 1.0) for i in network.ids])
+    rng = np.random.default_rng(seed)
+    rates = demand_rates(start, steps, dt, nodes, base_demand, scale)
+    for event in demand_events:
+        first, last = ((event[key] - start).total_seconds() / dt for key in ("start", "end"))
+        rates[max(0, int(first)):max(0, int(last)), network.ids.index(event["intersection_id"])] *= event["multiplier"]
+    arrivals = rng.poisson(rates).astype(float)
+
+    capacity, jam, wave = network.capacity, network.jam, network.wave_ratio
+    upstream, downstream = network.upstream, network.downstream
+    move_from, move_beta, move_node, move_phase = (network.move_from_cell, network.move_beta,
+                                                   network.move_node, network.move_phase)
+    inner = ~network.move_exit
+    inner_to_cell = network.move_to_cell[inner]
+    entry_first, approach, approach_node = network.entry_first, network.approach, network.approach_node
+
+    n = np.zeros(cells)
+    origin_queue = np.zeros(nodes)
+    cell_node = network.cell_node
+    series = {name: np.zeros((records, nodes)) for name in ("vehicle_count", "moving", "present", "occupied", "queue")}
+    # Sums over the current record interval, reduced per intersection when it ends
+    moved_sum, outflow_sum, n_sum, queue_sum = np.zeros(len(move_beta)), np.zeros(cells), np.zeros(cells), np.zeros(nodes)
+    approach_jam = np.bincount(approach_node, weights=jam[approach], minlength=nodes)
+    delay = exited = entered = 0.0
+    max_queue = np.zeros(nodes)
+    # Green shares per movement, computed an hour of steps at a time
+    chunk = max(1, int(3600 / dt))
+
+    for step in range(steps):
+        if step % chunk == 0:
+            t = np.arange(step, min(step + chunk, steps)) * dt
+            move_green = green_shares(plans, t, dt)[:, move_node, move_phase] * move_beta
+        sending = np.minimum(n, capacity)
+        receiving = np.minimum(capacity, wave * (jam - n))
+
+        # Along links
+        along = np.minimum(sending[upstream], receiving[downstream])
+
+        # Through intersections: demand per movement, capped by each outgoing road's supply
+        wanted = sending[move_from] * move_green[step % chunk]
+        into = np.bincount(inner_to_cell, weights=wanted[inner], minlength=cells)
+        cap = np.divide(receiving, into, out=np.ones(cells), where=into > receiving)
+        moved = wanted
+        moved[inner] *= cap[inner_to_cell]
+
+        # Demand enters the entry roads as far as they have room; the rest waits outside
+        origin_queue += arrivals[step]
+        loaded = np.minimum(origin_queue, receiving[entry_first])
+        origin_queue -= loaded
+
+        outflow = np.bincount(upstream, weights=along, minlength=cells) + \
+            np.bincount(move_from, weights=moved, minlength=cells)
+        # A vehicle that does not advance a cell in a step is delayed by that step
+        delay += (n.sum() - outflow.sum() + origin_queue.sum()) * dt
+        queue = np.bincount(approach_node, weights=np.maximum(n[approach] - outflow[approach], 0.0),
+                            minlength=nodes) + origin_queue
+        moved_sum += moved
+        outflow_sum += outflow
+        n_sum += n
+        queue_sum += queue
+        np.maximum(max_queue, queue, out=max_queue)
+
+        n += np.bincount(downstream, weights=along, minlength=cells) - outflow
+        n += np.bincount(inner_to_cell, weights=moved[inner], minlength=cells)
+        n[entry_first] += loaded
+        exited += moved[~inner].sum()
+        entered += loaded.sum()
+
+        if (step + 1) % per_record == 0 and step // per_record < records:
+            record = step // per_record
+            series["vehicle_count"][record] = np.bincount(move_node, weights=moved_sum, minlength=nodes)
+            series["moving"][record] = np.bincount(cell_node, weights=outflow_sum, minlength=nodes)
+            series["present"][record] = np.bincount(cell_node, weights=n_sum, minlength=nodes)
+            series["occupied"][record] = np.bincount(approach_node, weights=n_sum[approach], minlength=nodes)
+            series["queue"][record] = queue_sum / per_record
+            moved_sum, outflow_sum, n_sum, queue_sum = np.zeros(len(move_beta)), np.zeros(cells), np.zeros(cells), np.zeros(nodes)
+
+    # Space-mean speed = free speed x share of vehicles on the incoming roads that advanced a cell
+    speed_share = np.divide(series["moving"], series["present"], out=np.ones((records, nodes)),
+                            where=series["present"] > 1e-9)
+    occupancy = series["occupied"] / per_record / np.maximum(approach_jam, 1e-9)
+    return {
+        "start": start,
+        "record_every": per_record * dt,
+        "timestamps": [start + timedelta(seconds=(r + 1) * per_record * dt) for r in range(records)],
+        "intersection_ids": list(network.ids),
+        "vehicle_count": series["vehicle_count"] * COUNT_WINDOW / (per_record * dt),
+        "average_speed": network.free_speed * np.minimum(speed_share, 1.0),
+        "occupancy": occupancy,
+        "queue": series["queue"],
+        "kpis": {
+            "total_delay_vehicle_hours": round(float(delay) / 3600.0, 1),
+            "average_delay_seconds": round(float(delay / max(entered + origin_queue.sum(), 1.0)), 1),
+            "demand_vehicles": round(float(arrivals.sum())),
+            "throughput_vehicles": round(float(exited)),
+            "throughput_per_hour": round(float(exited) / max(hours, 1e-9)),
+            "vehicles_in_network": round(float(n.sum() + origin_queue.sum())),
+            "max_queue_vehicles": {i: round(float(q), 1) for i, q in zip(network.ids, max_queue)},
+            "average_queue_vehicles": round(float(series["queue"].mean()) if records else 0.0, 1),
+        },
+    }
+
+
+def observation_records(result: Dict[str, Any], city: str, intersections: Sequence[Dict],
+                        rows: Optional[range] = None) -> List[Dict]:
+    """The simulated series (or some of its rows) as traffic_data documents"""
+    by_id = {i["id"]: i for i in intersections}
+    records = []
+    for r in rows if rows is not None else range(len(result["timestamps"])):
+        timestamp = result["timestamps"][r]
+        for n, intersection_id in enumerate(result["intersection_ids"]):
+            intersection = by_id[intersection_id]
+            records.append({
+                "intersection_id": intersection_id,
+                "city": city,
+                "location": {"lat": intersection["lat"], "lng": intersection["lng"]},
+                "vehicle_count": int(round(result["vehicle_count"][r, n])),
+                "average_speed": round(float(result["average_speed"][r, n]), 1),
+                "congestion_level": congestion_level(result["occupancy"][r, n]),
+                "weather_condition": "Clear",
+                "timestamp": timestamp,
+            })
+    return records
+
+
+def observation_frame(result: Dict[str, Any], intersections: Sequence[Dict]):
+    """The simulated series as a columnar frame (the TrainingDataStore columns)"""
+    import pandas as pd
+
+    by_id = {i["id"]: i for i in intersections}
+    ids = result["intersection_ids"]
+    records = len(result["timestamps"])
+    return pd.DataFrame({
+        "timestamp": np.repeat(np.array(result["timestamps"], dtype="datetime64[us]"), len(ids)),
+        "intersection_id": np.tile(ids, records),
+        "latitude": np.tile([by_id[i]["lat"] for i in ids], records),
+        "longitude": np.tile([by_id[i]["lng"] for i in ids], records),
+        "vehicle_count": np.round(result["vehicle_count"].ravel()).astype(int),
+        "average_speed": result["average_speed"].ravel(),
+        "congestion_level": [congestion_level(o) for o in result["occupancy"].ravel()],
+        "weather_condition": "Clear",
+    })
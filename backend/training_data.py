@@ -0,0 +1,160 @@
+# training_data.py
+"""Columnar store of observed traffic for training, exported from Mongo.
+
+Observations from the traffic_data collection are exported once per city
+and day into Hive-style Parquet partitions:
+
+    training_data/<city>/date=2024-05-06/part.parquet
+
+Only complete days (before today, UTC) are exported, so a partition never
+changes after it is written, and each sync fetches only the days that have
+no partition yet. Export streams the Mongo cursor into Parquet row groups,
+so a day is never held as a list of documents. Training reads the
+partitions back with column projection and memory mapping.
+
+pyarrow (and pandas, for the frames handed to training) are imported on use.
+"""
+import logging
+import os
+import shutil
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from typing import List, Optional
+
+from offload import run_blocking
+
+logger = logging.getLogger(__name__)
+
+# Columns exported per observation (flattened from the Mongo document)
+COLUMNS = ["timestamp", "intersection_id", "latitude", "longitude",
+           "vehicle_count", "average_speed", "congestion_level", "weather_condition"]
+
+# Snapshots generated where no detectors feed traffic_data carry synthetic=True;
+# they serve the dashboards and incident checks but are never trained on
+OBSERVED = {"synthetic": {"$ne": True}}
+
+# Rows buffered from the cursor before they are written as one row group
+ROW_GROUP_SIZE = 50_000
+
+
+def _schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("timestamp", pa.timestamp("ms")),
+        ("intersection_id", pa.string()),
+        ("latitude", pa.float64()),
+        ("longitude", pa.float64()),
+        ("vehicle_count", pa.int32()),
+        ("average_speed", pa.float64()),
+        ("congestion_level", pa.string()),
+        ("weather_condition", pa.string()),
+    ])
+
+
+class TrainingDataStore:
+    """Day-partitioned Parquet files of observed traffic per city"""
+
+    def __init__(self, root: str = "training_data"):
+        self.root = Path(root)
+
+    def city_dir(self, city: str) -> Path:
+        return self.root / city.lower()
+
+    def partition_path(self, city: str, day: date) -> Path:
+        return self.city_dir(city) / f"date={day.isoformat()}" / "part.parquet"
+
+    def partitions(self, city: str) -> List[date]:
+        """Days that have been exported, oldest first"""
+        city_dir = self.city_dir(city)
+        if not city_dir.exists():
+            return []
+        return sorted(date.fromisoformat(p.name[len("date="):])
+                      for p in city_dir.iterdir() if p.name.startswith("date=") and (p / "part.parquet").exists())
+
+    async def sync_from_mongo(self, db, city: str, today: Optional[date] = None) -> int:
+        """Export complete days not yet in the store; returns rows written"""
+        today = today or datetime.utcnow().date()
+        exported = self.partitions(city)
+
+        if exported:
+            first_day = exported[-1] + timedelta(days=1)
+        else:
+            oldest = await db.traffic_data.find_one({"city": city, **OBSERVED}, {"timestamp": 1}, sort=[("timestamp", 1)])
+            if not oldest:
+                return 0
+            first_day = oldest["timestamp"].date()
+
+        rows = 0
+        day = first_day
+        while day < today:
+            rows += await self._export_day(db, city, day)
+            day += timedelta(days=1)
+        if rows:
+            logger.info(f"Exported {rows} {city} observations up to {today - timedelta(days=1)}")
+        return rows
+
+    async def _export_day(self, db, city: str, day: date) -> int:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        start = datetime.combine(day, time.min)
+        cursor = db.traffic_data.find(
+            {"city": city, "timestamp": {"$gte": start, "$lt": start + timedelta(days=1)}, **OBSERVED},
+            {"_id": 0, "timestamp": 1, "intersection_id": 1, "location": 1, "vehicle_count": 1,
+             "average_speed": 1, "congestion_level": 1, "weather_condition": 1},
+        ).sort("timestamp", 1)
+
+        path = self.partition_path(city, day)
+        tmp_path = path.with_suffix(".parquet.tmp")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        schema = _schema()
+        writer = pq.ParquetWriter(str(tmp_path), schema, compression="zstd")
+        buffer = {column: [] for column in COLUMNS}
+        rows = 0
+
+        def flush():
+            batch = pa.RecordBatch.from_pydict(buffer, schema=schema)
+            writer.write_batch(batch)
+            for values in buffer.values():
+                values.clear()
+
+        try:
+            async for doc in cursor:
+                location = doc.get("location") or {}
+                buffer["timestamp"].append(doc["timestamp"])
+                buffer["intersection_id"].append(doc.get("intersection_id"))
+                buffer["latitude"].append(location.get("lat"))
+                buffer["longitude"].append(location.get("lng"))
+                buffer["vehicle_count"].append(doc.get("vehicle_count"))
+                buffer["average_speed"].append(doc.get("average_speed"))
+                buffer["congestion_level"].append(doc.get("congestion_level"))
+                buffer["weather_condition"].append(doc.get("weather_condition"))
+                rows += 1
+                if len(buffer["timestamp"]) >= ROW_GROUP_SIZE:
+                    await run_blocking("io", flush)
+            if buffer["timestamp"]:
+                await run_blocking("io", flush)
+        finally:
+            writer.close()
+
+        # Empty days still get a partition so they are not fetched again
+        os.replace(tmp_path, path)
+        return rows
+
+    def load(self, city: str, columns: Optional[List[str]] = None, since: Optional[date] = None) -> "pd.DataFrame":
+        """Read stored observations (optionally only some columns / recent days) into a DataFrame"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        days = [d for d in self.partitions(city) if since is None or d >= since]
+        columns = columns or COLUMNS
+        if not days:
+            return _schema().empty_table().select(columns).to_pandas()
+
+        # Memory-mapped reads of only the projected columns, one partition at a time
+        tables = [pq.read_table(self.partition_path(city, d), columns=columns, memory_map=True) for d in days]
+        return pa.concat_tables(tables).to_pandas()
+
+    def drop(self, city: str):
+        """Remove a city's exported partitions, e.g. to re-export after a schema change"""
+        shutil.rmtree(self.city_dir(city), ignore_errors=True)
@@ -0,0 +1,279 @@
+# tuning.py
+"""Successive-halving hyperparameter search for the TrafficMLEngine estimators.
+
+    python tuning.py --city Accra
+    python tuning.py --city Accra --candidates 27 --eta 3 --workers 4 --latency-budget-ms 20
+    python tuning.py --city Kumasi --models traffic --dry-run
+
+For each model (traffic, speed, congestion) a random sample of candidate
+settings is drawn from SEARCH_SPACES and raced in rungs: every rung trains
+all remaining candidates on a larger slice of each CV fold, and only the
+best 1/eta go on, so the final rung (the full training folds) sees only a
+few candidates. Trials of a rung run in parallel in a process pool. The
+features, targets and fold indices are written once to .npy files which the
+workers memory-map, so the folds are neither recomputed nor pickled per trial.
+
+Besides its CV score, each trial records fit time and inference latency
+(per row in a batch, and for a single row as /ml/predict sees it), and the
+report marks the final-rung candidates on the score/latency Pareto front.
+The winners are stored with ModelStore.save_tuning and train_models uses
+them from the next training run on.
+"""
+import argparse
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Target column, estimator class and grid per model in TrafficMLEngine
+SEARCH_SPACES = {
+    "traffic": {
+        "target": "vehicle_count",
+        "estimator": "GradientBoostingRegressor",
+        "grid": {
+            "n_estimators": [50, 100, 150, 250],
+            "learning_rate": [0.05, 0.1, 0.2],
+            "max_depth": [3, 4, 5, 6],
+            "subsample": [0.8, 1.0],
+        },
+    },
+    "speed": {
+        "target": "average_speed",
+        "estimator": "RandomForestRegressor",
+        "grid": {
+            "n_estimators": [50, 100, 200],
+            "max_depth": [6, 8, 12, None],
+            "min_samples_leaf": [1, 2, 5],
+            "max_features": [1.0, 0.5],
+        },
+    },
+    "congestion": {
+        "target": "congestion_level",
+        "estimator": "RandomForestClassifier",
+        "grid": {
+            "n_estimators": [50, 100, 200],
+            "max_depth": [4, 6, 8, 12],
+            "min_samples_leaf": [1, 2, 5],
+            "max_features": ["sqrt", 0.5],
+        },
+    },
+}
+
+# Smallest training slice a rung may use, whatever the halving schedule says
+MIN_TRAIN_ROWS = 500
+
+# Single-row predictions timed per trial (the median is reported)
+SINGLE_ROW_REPEATS = 20
+
+
+def sample_candidates(grid: Dict[str, list], n: int, seed: int = 42) -> List[Dict]:
+    """Up to n distinct settings drawn from a grid"""
+    names = sorted(grid)
+    combinations = [dict(zip(names, values)) for values in itertools.product(*(grid[k] for k in names))]
+    random.Random(seed).shuffle(combinations)
+    return combinations[:n]
+
+
+def cache_folds(features, targets: Dict[str, Sequence], folds: int, directory: str, seed: int = 42) -> int:
+    """Write features, targets and shuffled K-fold indices as .npy files; returns training rows per fold"""
+    import numpy as np
+
+    # Trees split on thresholds, so the StandardScaler used in training does not
+    # change their fits; the search runs on the unscaled features
+    np.save(os.path.join(directory, "X.npy"), np.asarray(features, dtype=np.float64))
+    for name, y in targets.items():
+        np.save(os.path.join(directory, f"y_{name}.npy"), np.asarray(y))
+
+    order = np.random.default_rng(seed).permutation(len(features))
+    chunks = np.array_split(order, folds)
+    for i, val in enumerate(chunks):
+        # Training indices stay shuffled, so any prefix is a random subsample
+        train = np.concatenate([c for j, c in enumerate(chunks) if j != i])
+        np.save(os.path.join(directory, f"train_{i}.npy"), train)
+        np.save(os.path.join(directory, f"val_{i}.npy"), val)
+    return len(order) - max(len(c) for c in chunks)
+
+
+def _build_estimator(name: str, params: Dict):
+    from sklearn import ensemble
+    return getattr(ensemble, name)(random_state=42, **params)
+
+
+def evaluate_trial(cache_dir: str, model_name: str, params: Dict, train_rows: int, folds: int) -> Dict:
+    """CV score, fit time and inference latency of one candidate on `train_rows` rows per fold"""
+    import numpy as np
+    from sklearn.metrics import accuracy_score, mean_absolute_error
+
+    space = SEARCH_SPACES[model_name]
+    classifier = space["estimator"].endswith("Classifier")
+    X = np.load(os.path.join(cache_dir, "X.npy"), mmap_mode="r")
+    y = np.load(os.path.join(cache_dir, f"y_{model_name}.npy"), mmap_mode="r")
+
+    scores, fit_seconds, batch_seconds, predicted_rows, single_row = [], 0.0, 0.0, 0, []
+    for i in range(folds):
+        train = np.load(os.path.join(cache_dir, f"train_{i}.npy"))[:train_rows]
+        val = np.load(os.path.join(cache_dir, f"val_{i}.npy"))
+        X_val = X[val]
+
+        estimator = _build_estimator(space["estimator"], params)
+        started = time.perf_counter()
+        estimator.fit(X[train], y[train])
+        fit_seconds += time.perf_counter() - started
+
+        started = time.perf_counter()
+        predictions = estimator.predict(X_val)
+        batch_seconds += time.perf_counter() - started
+        predicted_rows += len(val)
+
+        if i == 0:
+            for _ in range(SINGLE_ROW_REPEATS):
+                started = time.perf_counter()
+                estimator.predict(X_val[:1])
+                single_row.append(time.perf_counter() - started)
+
+        if classifier:
+            scores.append(accuracy_score(y[val], predictions))
+        else:
+            scores.append(-mean_absolute_error(y[val], predictions))
+
+    return {
+        "params": params,
+        "train_rows": int(train_rows),
+        "metric": "accuracy" if classifier else "neg_mae",
+        "score": float(np.mean(scores)),
+        "score_std": float(np.std(scores)),
+        "fit_seconds": round(fit_seconds / folds, 3),
+        "predict_us_per_row": round(batch_seconds / predicted_rows * 1e6, 2),
+        "single_row_ms": round(float(np.median(single_row)) * 1000, 3),
+    }
+
+
+def pareto_front(trials: List[Dict]) -> List[Dict]:
+    """Trials not beaten on both score (higher) and single-row latency (lower) by another trial"""
+    return [
+        t for t in trials
+        if not any(o["score"] >= t["score"] and o["single_row_ms"] <= t["single_row_ms"]
+                   and (o["score"] > t["score"] or o["single_row_ms"] < t["single_row_ms"]) for o in trials)
+    ]
+
+
+def successive_halving(pool, cache_dir: str, model_name: str, candidates: List[Dict], full_rows: int,
+                       eta: int = 3, folds: int = 3) -> List[Dict]:
+    """Race candidates in rungs of growing training size; returns every trial, tagged with its rung"""
+    # Enough rungs that eta candidates remain for the last one, which uses the full folds
+    rungs = 1
+    while eta ** (rungs + 1) <= len(candidates):
+        rungs += 1
+
+    trials = []
+    for rung in range(rungs):
+        train_rows = min(full_rows, max(MIN_TRAIN_ROWS, full_rows // eta ** (rungs - 1 - rung)))
+        started = time.perf_counter()
+        futures = [pool.submit(evaluate_trial, cache_dir, model_name, params, train_rows, folds)
+                   for params in candidates]
+        results = [dict(f.result(), rung=rung) for f in futures]
+        trials.extend(results)
+        logger.info(f"{model_name} rung {rung}: {len(candidates)} candidates on {train_rows} rows "
+                    f"in {time.perf_counter() - started:.1f}s")
+
+        if rung < rungs - 1:
+            results.sort(key=lambda t: t["score"], reverse=True)
+            candidates = [t["params"] for t in results[:max(1, len(results) // eta)]]
+    return trials
+
+
+def tune(frame, feature_columns: Sequence[str], models: Sequence[str] = tuple(SEARCH_SPACES),
+         n_candidates: int = 27, eta: int = 3, folds: int = 3, workers: Optional[int] = None,
+         latency_budget_ms: Optional[float] = None, seed: int = 42) -> Dict:
+    """Search settings for each model on a training frame; returns the report stored by ModelStore.save_tuning"""
+    report = {
+        "created_at": datetime.utcnow().isoformat(),
+        "training_rows": len(frame),
+        "search": {"candidates": n_candidates, "eta": eta, "folds": folds,
+                   "latency_budget_ms": latency_budget_ms, "seed": seed},
+        "models": {},
+    }
+    spawn = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory(prefix="tuning_") as cache_dir, \
+            ProcessPoolExecutor(workers or os.cpu_count(), mp_context=spawn) as pool:
+        full_rows = cache_folds(frame[list(feature_columns)].to_numpy(),
+                                {name: frame[SEARCH_SPACES[name]["target"]].to_numpy() for name in models},
+                                folds, cache_dir, seed)
+
+        for name in models:
+            candidates = sample_candidates(SEARCH_SPACES[name]["grid"], n_candidates, seed)
+            trials = successive_halving(pool, cache_dir, name, candidates, full_rows, eta, folds)
+            final = [t for t in trials if t["rung"] == trials[-1]["rung"]]
+
+            # Best score, among the candidates fast enough when a latency budget is set
+            eligible = [t for t in final if latency_budget_ms is None or t["single_row_ms"] <= latency_budget_ms]
+            best = max(eligible or final, key=lambda t: t["score"])
+            front = pareto_front(final)
+            for t in final:
+                t["pareto"] = t in front
+
+            report["models"][name] = {
+                "estimator": SEARCH_SPACES[name]["estimator"],
+                "best_params": best["params"],
+                "best": best,
+                "within_latency_budget": bool(eligible),
+                "trials": trials,
+            }
+    return report
+
+
+def print_report(report: Dict):
+    for name, result in report["models"].items():
+        print(f"\n{name} ({result['estimator']}), best: {json.dumps(result['best_params'])}")
+        print(f"  {'rung':>4} {'rows':>7} {'score':>10} {'fit s':>8} {'us/row':>8} {'1-row ms':>9}  params")
+        for t in sorted(result["trials"], key=lambda t: (-t["rung"], -t["score"])):
+            marker = "*" if t.get("pareto") else " "
+            print(f"{marker} {t['rung']:>4} {t['train_rows']:>7} {t['score']:>10.4f} {t['fit_seconds']:>8.2f} "
+                  f"{t['predict_us_per_row']:>8.2f} {t['single_row_ms']:>9.3f}  {json.dumps(t['params'])}")
+    print("\n* = on the final rung's score/latency Pareto front")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--city", choices=["Accra", "Kumasi"], required=True)
+    parser.add_argument("--models", default=",".join(SEARCH_SPACES), help="comma-separated subset of models")
+    parser.add_argument("--candidates", type=int, default=27, help="candidates sampled per model")
+    parser.add_argument("--eta", type=int, default=3, help="keep the best 1/eta of each rung")
+    parser.add_argument("--folds", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None, help="trial processes (default: CPU count)")
+    parser.add_argument("--latency-budget-ms", type=float, default=None,
+                        help="pick the best candidate whose single-row prediction is this fast")
+    parser.add_argument("--days", type=int, default=90, help="training window")
+    parser.add_argument("--dry-run", action="store_true", help="report only; don't store the winners")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    os.environ.setdefault("ENABLE_RTSP", "false")
+    import server
+
+    # The same data train_models would use: observed traffic if enough is exported, else synthetic
+    frame = server.load_training_frame(args.city, args.days)
+    if frame is None:
+        frame = server.TrafficMLEngine().generate_training_data(args.city, days=args.days)
+    models = [m for m in args.models.split(",") if m]
+
+    report = tune(frame, server.FEATURE_COLUMNS, models, args.candidates, args.eta, args.folds,
+                  args.workers, args.latency_budget_ms)
+    report["city"] = args.city
+    print_report(report)
+    if not args.dry_run:
+        server.model_store.save_tuning(args.city, report)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""Load and latency benchmark for every /api route.
+
+Boots the FastAPI app in-process (no network, no uvicorn) with an in-memory
+Mongo stand-in and drives each route with concurrent async clients. Reports
+requests/second and p50/p95/p99 latency per endpoint, and can save the run
+as a JSON baseline or compare against one:
+
+    python -m benchmarks.api_bench --concurrency 16 --requests 400
+    python -m benchmarks.api_bench --save benchmarks/baselines/api.json
+    python -m benchmarks.api_bench --baseline benchmarks/baselines/api.json --fail-on-regression
+
+Mongo: uses mongomock_motor when installed, or a real server with --mongo-url.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+# Values substituted for path parameters
+SAMPLE_PATH_PARAMS = {
+    "city": "Accra",
+    "intersection_id": "ACC_001",
+    "corridor_id": "ring_road",
+    "cam_id": "cam1",
+    "job_id": "bench",
+}
+
+# Query strings and JSON bodies for routes that need them
+SAMPLE_QUERY = {
+    "/api/signals/optimize/{intersection_id}": {"city": "Accra"},
+    "/api/traffic/history": {"city": "Accra"},
+    "/api/simulation/{city}": {"hours": 1},
+}
+SAMPLE_BODIES = {
+    "/api/route/optimize": {
+        "start_location": {"lat": 5.5600, "lng": -0.1969},
+        "end_location": {"lat": 5.6037, "lng": -0.2267},
+        "city": "Accra",
+        "vehicle_type": "car",
+    },
+    "/api/chat": {"message": "How is traffic at Kwame Nkrumah Circle?"},
+    "/api/chat/stream": {"message": "How is traffic at Kwame Nkrumah Circle?"},
+}
+
+# Routes with side effects that would distort the run (e.g. kicking off training
+# or scenario jobs), admin routes that run for a fixed number of seconds, and
+# event streams that never end
+EXCLUDED_ROUTES = {"/api/ml/train/{city}", "/api/scenarios/{city}", "/api/admin/profile/cpu",
+                   "/api/admin/profile/memory", "/api/incidents/{city}/stream"}
+
+# A route is flagged when its p95 grows by more than this factor over the
+# baseline, and by more than an absolute floor so sub-millisecond noise is ignored
+REGRESSION_FACTOR = 1.25
+REGRESSION_MIN_MS = 1.0
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def load_app(mongo_url: Optional[str], preload_models: bool):
+    """Import server with a Mongo stand-in and return the module"""
+    os.environ.setdefault("ENABLE_RTSP", "false")
+    # The offline chat backend, so /api/chat measures the gateway rather than the LLM
+    os.environ.setdefault("CHAT_BACKEND", "fake")
+    sys.path.insert(0, str(BACKEND_DIR))
+    import server
+
+    if mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        server.client = AsyncIOMotorClient(mongo_url)
+    else:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            sys.exit("Install mongomock-motor or pass --mongo-url for the Mongo stand-in")
+        server.client = AsyncMongoMockClient()
+
+    if preload_models:
+        server.preload_models()
+    return server
+
+
+def build_requests(server, only: Optional[str]) -> List[Dict]:
+    """One request template per /api route"""
+    requests = []
+    for route in server.api_router.routes:
+        path = route.path
+        if path in EXCLUDED_ROUTES or (only and not re.search(only, path)):
+            continue
+        method = sorted(m for m in route.methods if m != "HEAD")[0]
+        try:
+            url = path.format(**SAMPLE_PATH_PARAMS)
+        except KeyError as missing:
+            print(f"  skipping {method} {path}: no sample value for {missing}")
+            continue
+        requests.append({
+            "name": f"{method} {path}",
+            "method": method,
+            "url": url,
+            "params": SAMPLE_QUERY.get(path),
+            "json": SAMPLE_BODIES.get(path),
+        })
+    return requests
+
+
+async def bench_endpoint(client, request: Dict, total: int, concurrency: int, warmup: int) -> Dict:
+    """Fire `total` requests at one endpoint from `concurrency` concurrent clients"""
+    for _ in range(warmup):
+        await client.request(request["method"], request["url"], params=request["params"], json=request["json"])
+
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    remaining = total
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            response = await client.request(request["method"], request["url"],
+                                            params=request["params"], json=request["json"])
+            await response.aread()
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / wall, 1) if wall > 0 else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+        "status_codes": {str(k): v for k, v in sorted(statuses.items())},
+    }
+
+
+async def run(args) -> Dict:
+    import httpx
+
+    server = load_app(args.mongo_url, args.preload_models)
+    requests = build_requests(server, args.only)
+
+    transport = httpx.ASGITransport(app=server.app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        for request in requests:
+            results[request["name"]] = await bench_endpoint(
+                client, request, args.requests, args.concurrency, args.warmup
+            )
+            r = results[request["name"]]
+            print(f"  {request['name']:<55} {r['rps']:>9.1f} rps  p50 {r['p50_ms']:>8.2f}  "
+                  f"p95 {r['p95_ms']:>8.2f}  p99 {r['p99_ms']:>8.2f} ms  {r['status_codes']}")
+
+    return {
+        "created_at": datetime.utcnow().isoformat(),
+        "config": {"requests": args.requests, "concurrency": args.concurrency, "warmup": args.warmup,
+                   "models_preloaded": args.preload_models},
+        "environment": {"python": platform.python_version(), "machine": platform.machine(),
+                        "cpus": os.cpu_count()},
+        "endpoints": results,
+    }
+
+
+def compare(current: Dict, baseline: Dict) -> Tuple[List[str], List[str]]:
+    """Print p95/RPS deltas against a baseline; return regressed and unbaselined endpoints"""
+    regressions, unbaselined = [], []
+    print(f"\n{'endpoint':<55} {'p95 base':>9} {'p95 now':>9} {'delta':>8}   {'rps base':>9} {'rps now':>9}")
+    for name, now in current["endpoints"].items():
+        base = baseline["endpoints"].get(name)
+        if not base:
+            unbaselined.append(name)
+            print(f"{name:<55} {'(new)':>9} {now['p95_ms']:>9.2f}  NOT IN BASELINE")
+            continue
+        delta = (now["p95_ms"] - base["p95_ms"]) / base["p95_ms"] * 100 if base["p95_ms"] else 0.0
+        flag = ""
+        if now["p95_ms"] > base["p95_ms"] * REGRESSION_FACTOR and now["p95_ms"] - base["p95_ms"] > REGRESSION_MIN_MS:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<55} {base['p95_ms']:>9.2f} {now['p95_ms']:>9.2f} {delta:>7.1f}%   "
+              f"{base['rps']:>9.1f} {now['rps']:>9.1f}{flag}")
+    if unbaselined:
+        print(f"\n{len(unbaselined)} endpoint(s) have no baseline and were not checked; "
+              f"re-record it with --save")
+    return regressions, unbaselined
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients per endpoint")
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured requests per endpoint")
+    parser.add_argument("--only", help="regex: only benchmark matching route paths")
+    parser.add_argument("--mongo-url", help="use a real MongoDB instead of mongomock")
+    parser.add_argument("--preload-models", action="store_true", help="load published models first")
+    parser.add_argument("--save", help="write results to this JSON baseline file")
+    parser.add_argument("--baseline", help="compare against this JSON baseline file")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit 1 when a p95 regresses or a route has no baseline")
+    args = parser.parse_args(argv)
+
+    print(f"Benchmarking /api routes: {args.requests} requests x {args.concurrency} clients per endpoint")
+    results = asyncio.run(run(args))
+
+    if args.save:
+        Path(args.save).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved results to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions, unbaselined = compare(results, json.load(f))
+        if (regressions or unbaselined) and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""Micro-benchmarks for the ML pipeline in TrafficMLEngine.
+
+Sweeps the number of intersections, days of training data and prediction
+batch size, and records for each configuration:
+
+- wall time of generate_training_data, train_models, save_models,
+  load_models, and per batch size both predict_traffic row by row and
+  predict_batch (one vectorized call with intervals)
+- peak Python allocations per stage with --trace-alloc (tracemalloc slows
+  sklearn down many times over, so allocations are traced in a second,
+  untimed pass)
+- peak RSS of the whole configuration (each one runs in a fresh process,
+  so ru_maxrss is not polluted by earlier configurations)
+- size of the saved model files
+
+    python -m benchmarks.ml_bench
+    python -m benchmarks.ml_bench --intersections 5,20,50 --days 7,30,90 --batch-sizes 1,100,1000
+    python -m benchmarks.ml_bench --trace-alloc
+    python -m benchmarks.ml_bench --save benchmarks/baselines/ml.json
+    python -m benchmarks.ml_bench --baseline benchmarks/baselines/ml.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+# A stage is flagged when its time grows by more than this factor over the
+# baseline, and by more than an absolute floor so timer noise is ignored
+REGRESSION_FACTOR = 1.25
+REGRESSION_MIN_MS = 5.0
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0.0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+# Set in the benchmark process from --trace-alloc
+TRACE_ALLOCATIONS = False
+
+
+def measure(fn: Callable, *args, **kwargs) -> Dict:
+    """Wall time of one call, plus peak traced allocations of a repeat call when enabled"""
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    measured = {"result": result, "ms": round((time.perf_counter() - started) * 1000, 2)}
+
+    if TRACE_ALLOCATIONS:
+        tracemalloc.start()
+        fn(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        measured["peak_alloc_mb"] = round(peak / 1024 / 1024, 2)
+    return measured
+
+
+def synthetic_intersections(count: int) -> List[Dict]:
+    """Registry of `count` intersections spread around central Accra"""
+    return [
+        {"id": f"BENCH_{i:04d}", "name": f"Bench Junction {i}",
+         "lat": 5.55 + (i % 10) * 0.005, "lng": -0.20 + (i // 10) * 0.005}
+        for i in range(count)
+    ]
+
+
+def run_configuration(intersections: int, days: int, batch_sizes: List[int], trace_alloc: bool = False) -> Dict:
+    """Benchmark one (intersections, days) configuration; runs in a fresh process"""
+    global TRACE_ALLOCATIONS
+    TRACE_ALLOCATIONS = trace_alloc
+    model_dir = tempfile.mkdtemp(prefix="ml_bench_")
+    os.environ["MODEL_DIR"] = model_dir
+    os.environ.setdefault("ENABLE_RTSP", "false")
+    sys.path.insert(0, str(BACKEND_DIR))
+    import logging
+    import server
+    logging.getLogger("server").setLevel(logging.WARNING)
+    logging.getLogger("model_store").setLevel(logging.WARNING)
+
+    server.ACCRA_INTERSECTIONS = synthetic_intersections(intersections)
+    city = "Accra"
+    engine = server.TrafficMLEngine()
+    stages = {}
+
+    generated = measure(engine.generate_training_data, city, days=days)
+    stages["generate_training_data"] = {k: v for k, v in generated.items() if k != "result"}
+    rows = len(generated["result"])
+    del generated
+
+    trained = measure(engine.train_models, city, days=days)
+    if not trained["result"]:
+        raise RuntimeError("train_models failed")
+    stages["train_models"] = {k: v for k, v in trained.items() if k != "result"}
+
+    save_dir = os.path.join(model_dir, "bench_save")
+    saved = measure(engine.save_models, city, directory=save_dir)
+    stages["save_models"] = {k: v for k, v in saved.items() if k != "result"}
+    model_bytes = sum(f.stat().st_size for f in Path(save_dir).iterdir())
+
+    loaded_engine = server.TrafficMLEngine()
+    loaded = measure(loaded_engine.load_models, city, directory=save_dir)
+    stages["load_models"] = {k: v for k, v in loaded.items() if k != "result"}
+
+    registry = server.ACCRA_INTERSECTIONS
+    for batch in batch_sizes:
+        rows_to_predict = [server.build_prediction_features(city, registry[i % len(registry)])
+                           for i in range(batch)]
+        predicted = measure(lambda: [loaded_engine.predict_traffic(r) for r in rows_to_predict])
+        stages[f"predict_traffic[batch={batch}]"] = {
+            **{k: v for k, v in predicted.items() if k != "result"},
+            "per_row_ms": round(predicted["ms"] / batch, 3),
+        }
+        predicted = measure(loaded_engine.predict_batch, rows_to_predict)
+        stages[f"predict_batch[batch={batch}]"] = {
+            **{k: v for k, v in predicted.items() if k != "result"},
+            "per_row_ms": round(predicted["ms"] / batch, 3),
+        }
+
+    return {
+        "intersections": intersections,
+        "days": days,
+        "training_rows": rows,
+        "model_file_mb": round(model_bytes / 1024 / 1024, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "stages": stages,
+    }
+
+
+def run(args) -> Dict:
+    intersections = [int(v) for v in args.intersections.split(",")]
+    days = [int(v) for v in args.days.split(",")]
+    batch_sizes = [int(v) for v in args.batch_sizes.split(",")]
+
+    results = {}
+    spawn = multiprocessing.get_context("spawn")
+    for n in intersections:
+        for d in days:
+            # A fresh interpreter per configuration keeps peak RSS meaningful
+            with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+                config = pool.submit(run_configuration, n, d, batch_sizes, args.trace_alloc).result()
+            key = f"intersections={n} days={d}"
+            results[key] = config
+            print(f"\n{key}: {config['training_rows']} rows, models {config['model_file_mb']} MB, "
+                  f"peak RSS {config['peak_rss_mb']} MB")
+            for stage, m in config["stages"].items():
+                alloc = f"  peak alloc {m['peak_alloc_mb']:>8.2f} MB" if "peak_alloc_mb" in m else ""
+                extra = f"  ({m['per_row_ms']} ms/row)" if "per_row_ms" in m else ""
+                print(f"  {stage:<32} {m['ms']:>11.2f} ms{alloc}{extra}")
+
+    return {
+        "created_at": datetime.utcnow().isoformat(),
+        "config": {"intersections": intersections, "days": days, "batch_sizes": batch_sizes,
+                   "trace_alloc": args.trace_alloc},
+        "environment": {"python": platform.python_version(), "machine": platform.machine(),
+                        "cpus": os.cpu_count()},
+        "configurations": results,
+    }
+
+
+def compare(current: Dict, baseline: Dict) -> List[str]:
+    """Print stage time deltas against a baseline; return regressed stages"""
+    regressions = []
+    print(f"\n{'configuration / stage':<62} {'base ms':>11} {'now ms':>11} {'delta':>8}")
+    for key, config in current["configurations"].items():
+        base_config = baseline["configurations"].get(key)
+        if not base_config:
+            print(f"{key:<62} {'(new)':>11}")
+            continue
+        rows = [("peak_rss_mb", base_config["peak_rss_mb"], config["peak_rss_mb"])]
+        rows += [(stage, base_config["stages"][stage]["ms"], m["ms"])
+                 for stage, m in config["stages"].items() if stage in base_config["stages"]]
+        for stage, base, now in rows:
+            delta = (now - base) / base * 100 if base else 0.0
+            flag = ""
+            if stage != "peak_rss_mb" and now > base * REGRESSION_FACTOR and now - base > REGRESSION_MIN_MS:
+                flag = "  REGRESSION"
+                regressions.append(f"{key} {stage}")
+            print(f"{key + ' ' + stage:<62} {base:>11.2f} {now:>11.2f} {delta:>7.1f}%{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--intersections", default="5,20", help="comma-separated intersection counts")
+    parser.add_argument("--days", default="7,30", help="comma-separated days of training data")
+    parser.add_argument("--batch-sizes", default="1,100,1000", help="comma-separated prediction batch sizes")
+    parser.add_argument("--trace-alloc", action="store_true", help="also record peak allocations per stage")
+    parser.add_argument("--save", help="write results to this JSON baseline file")
+    parser.add_argument("--baseline", help="compare against this JSON baseline file")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit 1 when a stage regresses")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+
+    if args.save:
+        Path(args.save).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved results to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f))
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
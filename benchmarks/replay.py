@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""Replay a traffic recording through the app to benchmark the whole pipeline.
+
+Record a run (one log per process), for example over a morning peak:
+
+    TRAFFIC_SEED=7 TRAFFIC_RECORD_PATH=/tmp/peak-{pid}.tlog python roles.py --role all
+
+then replay it in-process, with the Mongo stand-in of api_bench:
+
+    python -m benchmarks.replay /tmp/peak-1234.tlog                   # real time
+    python -m benchmarks.replay /tmp/peak-1234.tlog --speed 10        # 10x
+    python -m benchmarks.replay /tmp/peak-1234.tlog --speed max       # as fast as possible
+    python -m benchmarks.replay /tmp/peak-1234.tlog --speed 10 --save benchmarks/baselines/replay.json
+
+Observation batches go through server.ingest_observations and requests
+through the ASGI app, each at its recorded offset divided by the speed. The
+traffic clock is seeded with the recording's seed (or --seed), and each event
+runs with the clock fixed to its recorded time. A replay therefore produces
+the same data every run, whatever the speed. Reports latency percentiles per
+route and for ingestion, and how far dispatch fell behind the schedule.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from benchmarks.api_bench import load_app, percentile
+
+INGESTION = "ingest observations"
+
+
+def route_name(server, method: str, path: str) -> str:
+    """METHOD /route/{template} of a request path, so latencies group per route"""
+    from starlette.routing import Match
+
+    scope = {"type": "http", "method": method, "path": path, "root_path": ""}
+    for route in server.api_router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return f"{method} {route.path}"
+    return f"{method} {path}"
+
+
+def summarize(latencies: List[float], statuses: Dict[str, int]) -> Dict:
+    latencies = sorted(latencies)
+    return {
+        "events": len(latencies),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+        "status_codes": dict(sorted(statuses.items())),
+    }
+
+
+async def replay(server, path: str, speed: Optional[float], concurrency: int) -> Dict:
+    """Dispatch every event of a recording on schedule; returns per-route results"""
+    import httpx
+    from recording import at_time, read_records
+
+    latencies: Dict[str, List[float]] = {}
+    statuses: Dict[str, Dict[str, int]] = {}
+    lag: List[float] = []
+    slots = asyncio.Semaphore(concurrency)
+    tasks = set()
+
+    async def dispatch(client, event: Dict):
+        try:
+            await run_event(client, event)
+        finally:
+            slots.release()
+
+    async def run_event(client, event: Dict):
+        started = time.perf_counter()
+        if event["kind"] == "observations":
+            name, status = INGESTION, "ok"
+            try:
+                await server.ingest_observations(event["city"], event["records"])
+            except Exception as e:
+                status = type(e).__name__
+        else:
+            name = route_name(server, event["method"], event["path"])
+            url = event["path"] + (f"?{event['query']}" if event["query"] else "")
+            headers = {"content-type": event["content_type"]} if event["content_type"] else {}
+            try:
+                response = await client.request(event["method"], url, content=event["body"], headers=headers)
+                await response.aread()
+                status = str(response.status_code)
+            except Exception as e:
+                status = type(e).__name__
+        latencies.setdefault(name, []).append((time.perf_counter() - started) * 1000)
+        by_status = statuses.setdefault(name, {})
+        by_status[status] = by_status.get(status, 0) + 1
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://replay", timeout=60) as client:
+        started = time.perf_counter()
+        for offset, event in read_records(path):
+            if event["kind"] == "header":
+                continue
+            if speed:
+                delay = offset / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    lag.append(-delay * 1000)
+            await slots.acquire()
+            with at_time(event["at"]):
+                task = asyncio.create_task(dispatch(client, event))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+        wall = time.perf_counter() - started
+
+    results = {name: summarize(values, statuses[name]) for name, values in sorted(latencies.items())}
+    events = sum(len(values) for values in latencies.values())
+    lag.sort()
+    return {
+        "events": events,
+        "wall_seconds": round(wall, 2),
+        "events_per_second": round(events / wall, 1) if wall > 0 else 0.0,
+        "schedule_lag_p95_ms": round(percentile(lag, 95), 2),
+        "routes": results,
+    }
+
+
+def header(path: str) -> Dict:
+    from recording import read_records
+
+    for _, event in read_records(path):
+        return event
+    raise ValueError(f"{path} is empty")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", help="log written with TRAFFIC_RECORD_PATH")
+    parser.add_argument("--speed", default="1", help="multiple of real time, or 'max' (default 1)")
+    parser.add_argument("--seed", type=int, help="traffic clock seed (default: the recording's)")
+    parser.add_argument("--concurrency", type=int, default=256, help="events in flight at most")
+    parser.add_argument("--mongo-url", help="use a real MongoDB instead of mongomock")
+    parser.add_argument("--preload-models", action="store_true", help="load published models first")
+    parser.add_argument("--save", help="write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    speed = None if args.speed == "max" else float(args.speed)
+    if speed is not None and speed <= 0:
+        parser.error("--speed must be positive or 'max'")
+    # The recording's own writer must not run while replaying
+    os.environ.pop("TRAFFIC_RECORD_PATH", None)
+    server = load_app(args.mongo_url, args.preload_models)
+    recorded = header(args.recording)
+    server.traffic_clock.seed = args.seed if args.seed is not None else recorded.get("seed")
+
+    print(f"Replaying {args.recording} (recorded {recorded['started_at']:%Y-%m-%d %H:%M}) "
+          f"at {'max speed' if speed is None else f'{speed:g}x'}, seed {server.traffic_clock.seed}")
+    result = asyncio.run(replay(server, args.recording, speed, args.concurrency))
+    for name, r in result["routes"].items():
+        print(f"  {name:<55} {r['events']:>7}  p50 {r['p50_ms']:>8.2f}  p95 {r['p95_ms']:>8.2f}  "
+              f"p99 {r['p99_ms']:>8.2f} ms  {r['status_codes']}")
+    print(f"{result['events']} events in {result['wall_seconds']} s ({result['events_per_second']}/s), "
+          f"schedule lag p95 {result['schedule_lag_p95_ms']} ms")
+
+    if args.save:
+        Path(args.save).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump({
+                "created_at": datetime.utcnow().isoformat(),
+                "config": {"recording": args.recording, "speed": args.speed, "seed": server.traffic_clock.seed,
+                           "concurrency": args.concurrency},
+                "environment": {"python": platform.python_version(), "machine": platform.machine(),
+                                "cpus": os.cpu_count()},
+                **result,
+            }, f, indent=2)
+        print(f"Saved results to {args.save}")
+
+
+if __name__ == "__main__":
+    main()
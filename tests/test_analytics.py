@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Traffic patterns from incrementally maintained per-day aggregates."""
+import asyncio
+import collections
+import sys
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import analytics  # noqa: E402
+from tests.test_training_data import FakeDatabase  # noqa: E402
+from training_data import TrainingDataStore  # noqa: E402
+
+REGISTRY = [{"id": "ACC_001", "name": "Circle"}, {"id": "ACC_002", "name": "Kaneshie"}, {"id": "ACC_003", "name": "Achimota"}]
+
+
+def observations(first_day: date, days: int):
+    """Hourly observations where Kaneshie jams every evening at 17:00-19:00"""
+    records = []
+    for offset in range(days):
+        for hour in range(24):
+            for intersection in REGISTRY:
+                jammed = intersection["id"] == "ACC_002" and hour in (17, 18)
+                records.append({
+                    "city": "Accra", "intersection_id": intersection["id"],
+                    "timestamp": datetime.combine(first_day + timedelta(days=offset), datetime.min.time()) + timedelta(hours=hour),
+                    "location": {"lat": 5.5, "lng": -0.2},
+                    "vehicle_count": 150 if jammed else 30, "average_speed": 8.0 if jammed else 40.0,
+                    "congestion_level": "Critical" if jammed else "Low", "weather_condition": "Clear",
+                })
+    return records
+
+
+class PatternAnalyticsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.store = TrainingDataStore(self.root.name)
+        self.today = datetime.utcnow().date()
+        self.records = observations(self.today - timedelta(days=14), 14)
+        asyncio.run(self.store.sync_from_mongo(FakeDatabase(self.records), "Accra", today=self.today))
+        self.analytics = analytics.PatternAnalytics(
+            self.store, {"Accra": REGISTRY}, profile=None, window_days=30, refresh_seconds=3600)
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    def test_patterns_from_store(self):
+        patterns = asyncio.run(self.analytics.patterns("Accra"))
+
+        self.assertEqual(patterns["source"], "observed")
+        self.assertEqual(patterns["time_period"]["days"], 14)
+        self.assertEqual(patterns["time_period"]["observations"], len(self.records))
+        self.assertEqual(patterns["peak_hours"]["weekday"], [17, 18])
+        hotspot = patterns["congestion_hotspots"][0]
+        self.assertEqual((hotspot["intersection_id"], hotspot["worst_time"]["hour"]), ("ACC_002", 17))
+        self.assertAlmostEqual(hotspot["congested_share"], 2 / 24, places=3)
+        self.assertEqual(patterns["by_day_hour"]["typical_congestion"][0][17], "Low")
+        self.assertIn("Weekday traffic in Accra peaks 17:00-19:00.", analytics.pattern_insights(patterns))
+
+        # Cached: the next call neither recomputes nor rereads partitions
+        self.assertIs(asyncio.run(self.analytics.patterns("Accra")), patterns)
+        self.assertEqual(self.analytics.load_partitions("Accra", self.today - timedelta(days=30)), 0)
+
+    def test_mongo_groups_match_store_aggregates(self):
+        frame = pd.DataFrame([{**r, "latitude": 5.5, "longitude": -0.2} for r in self.records])
+        index = {r["id"]: n for n, r in enumerate(REGISTRY)}
+        from_store = analytics.aggregate_frame(frame, index)
+
+        # What aggregate_pipeline's $group stage returns for the same documents
+        groups = collections.defaultdict(lambda: {"vehicles": 0, "speed": 0.0, "count": 0,
+                                                  **{level: 0 for level in analytics.LEVELS}})
+        for r in self.records:
+            group = groups[(r["intersection_id"], r["timestamp"].date().isoformat(), r["timestamp"].hour)]
+            group["vehicles"] += r["vehicle_count"]
+            group["speed"] += r["average_speed"]
+            group["count"] += 1
+            group[r["congestion_level"]] += 1
+        from_mongo = analytics.aggregate_groups(
+            [{"_id": {"intersection_id": i, "day": d, "hour": h}, **g} for (i, d, h), g in groups.items()], index)
+
+        self.assertEqual(sorted(from_store), sorted(from_mongo))
+        for day in from_store:
+            for field in ("vehicles", "speed", "count", "congestion"):
+                np.testing.assert_allclose(getattr(from_store[day], field), getattr(from_mongo[day], field))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Camera thumbnails from on-disk HLS segments, cached per segment."""
+import asyncio
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from camera_snapshots import CameraSnapshots, latest_segment  # noqa: E402
+
+PLAYLIST = """#EXTM3U
+#EXT-X-VERSION:6
+#EXT-X-TARGETDURATION:2
+#EXT-X-MEDIA-SEQUENCE:{first}
+#EXTINF:2.000000,
+cam1{first}.ts
+#EXTINF:2.000000,
+cam1{second}.ts
+#EXT-X-PART:DURATION=0.5,URI="cam1{third}.0.ts"
+"""
+
+
+class CameraSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+
+    def publish(self, first: int):
+        for n in (first, first + 1):
+            (self.dir / f"cam1{n}.ts").write_bytes(b"segment %d" % n)
+        (self.dir / "cam1.m3u8").write_text(PLAYLIST.format(first=first, second=first + 1, third=first + 2))
+
+    def test_latest_complete_segment(self):
+        self.assertIsNone(latest_segment(self.dir / "cam1.m3u8"))
+        self.publish(4)
+        self.assertEqual(latest_segment(self.dir / "cam1.m3u8"), self.dir / "cam15.ts")
+
+    def test_one_extraction_per_segment(self):
+        calls = []
+
+        async def extract(segment, width, image_format):
+            calls.append((segment.name, width, image_format))
+            await asyncio.sleep(0.01)
+            return b"image of " + segment.read_bytes()
+
+        async def tile(snapshots):
+            segment, etag = snapshots.current("cam1", 320, "jpeg")
+            return etag, await snapshots.image(segment, etag, 320, "jpeg")
+
+        async def main():
+            snapshots = CameraSnapshots(self.dir, extract)
+            self.assertIsNone(snapshots.current("cam1", 320, "jpeg"))
+            self.publish(4)
+            wall = await asyncio.gather(*(tile(snapshots) for _ in range(50)))
+            self.publish(5)
+            later = await tile(snapshots)
+            return wall, later
+
+        wall, (later_etag, later_image) = asyncio.run(main())
+        self.assertEqual(len({etag for etag, _ in wall}), 1)
+        self.assertEqual(wall[0][1], b"image of segment 5")
+        self.assertNotEqual(later_etag, wall[0][0])
+        self.assertEqual(later_image, b"image of segment 6")
+        self.assertEqual(calls, [("cam15.ts", 320, "jpeg"), ("cam16.ts", 320, "jpeg")])
+
+
+if __name__ == "__main__":
+    unittest.main()
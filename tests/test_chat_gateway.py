@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Chat gateway: context, response cache, limits and SSE, on the offline backend."""
+import asyncio
+import json
+import os
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("ENABLE_RTSP", "false")
+
+import server  # noqa: E402
+from chat_gateway import ChatBackend, ChatBusy, ChatGateway, ChatTimeout, FakeBackend  # noqa: E402
+from snapshots import SnapshotCache  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+
+class SlowBackend(ChatBackend):
+    name = "slow"
+
+    def __init__(self, first_token_delay: float):
+        self.first_token_delay = first_token_delay
+
+    async def stream(self, prompt):
+        await asyncio.sleep(self.first_token_delay)
+        yield "late"
+
+
+def make_gateway(backend, **options):
+    return ChatGateway(backend, SnapshotCache(server.generate_realistic_traffic_data),
+                       {"Accra": server.ACCRA_INTERSECTIONS, "Kumasi": server.KUMASI_INTERSECTIONS}, **options)
+
+
+class ChatGatewayTest(unittest.TestCase):
+
+    def test_paraphrases_share_cached_reply(self):
+        backend = FakeBackend()
+        gateway = make_gateway(backend)
+
+        async def ask():
+            first = await gateway.reply("How is traffic at Circle?")
+            second = await gateway.reply("what's the traffic like at Kwame Nkrumah Circle")
+            other = await gateway.reply("How is traffic at Tech Junction?")
+            return first, second, other
+
+        first, second, other = asyncio.run(ask())
+        self.assertEqual((first["city"], first["cached"]), ("Accra", False))
+        self.assertIn("Kwame Nkrumah Circle", first["reply"])
+        self.assertEqual(second, {**first, "cached": True})
+        self.assertEqual((other["city"], other["cached"]), ("Kumasi", False))
+        self.assertEqual(backend.calls, 2)
+
+    def test_context_is_compact(self):
+        gateway = make_gateway(FakeBackend())
+        city, mentioned, _ = gateway.resolve("Is Kejetia busy right now?")
+        context = gateway.context(gateway.snapshots.get(city), mentioned).splitlines()
+        self.assertEqual((city, mentioned), ("Kumasi", ["KUM_001"]))
+        self.assertIn("Kejetia Market Junction", context[1])
+        self.assertLessEqual(len(context), 2 + 3)
+
+    def test_queue_and_first_token_timeouts(self):
+        async def run():
+            gateway = make_gateway(SlowBackend(0.3), max_concurrency=1, queue_timeout=0.05, first_token_timeout=1)
+            slow = asyncio.create_task(gateway.reply("traffic at Adum"))
+            await asyncio.sleep(0.05)
+            with self.assertRaises(ChatBusy):
+                await gateway.reply("traffic at Tech")
+            self.assertEqual((await slow)["reply"], "late")
+
+            gateway = make_gateway(SlowBackend(1), first_token_timeout=0.05)
+            with self.assertRaises(ChatTimeout):
+                await gateway.reply("traffic at Adum")
+            # The slot is released after a timeout
+            self.assertFalse(gateway._slots.locked())
+
+        asyncio.run(run())
+
+    def test_sse_endpoint(self):
+        original = server.chat_gateway
+        server.chat_gateway = make_gateway(FakeBackend())
+        try:
+            with TestClient(server.app) as client:
+                response = client.post("/api/chat/stream", json={"message": "How is traffic at Circle?"})
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.headers["content-type"].startswith("text/event-stream"))
+                events = [block for block in response.text.split("\n\n") if block]
+                deltas = [json.loads(e[len("data: "):])["delta"] for e in events[:-1]]
+                self.assertTrue(events[-1].startswith("event: done\n"))
+
+                reply = client.post("/api/chat", json={"message": "how's traffic at circle"}).json()
+                self.assertEqual(reply["reply"], "".join(deltas))
+                self.assertTrue(reply["cached"])
+                self.assertEqual(client.post("/api/chat", json={"message": " "}).status_code, 400)
+        finally:
+            server.chat_gateway = original
+
+
+if __name__ == "__main__":
+    unittest.main()
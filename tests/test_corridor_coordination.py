@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Green-wave offsets and bandwidth of the corridor coordinator."""
+import asyncio
+import os
+import sys
+import unittest
+from unittest import mock
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from corridor_coordination import CorridorCoordinator  # noqa: E402
+
+
+class CorridorCoordinatorTest(unittest.TestCase):
+
+    def test_travel_time_a_multiple_of_the_cycle_gives_full_bandwidth(self):
+        # Two cycles from one signal to the next: both see green at the same time
+        result = CorridorCoordinator().solve([0.5, 0.5], [120], min_cycle=60, max_cycle=60)
+        self.assertEqual(result["cycle_length"], 60)
+        self.assertEqual(result["offsets"], [0, 0])
+        self.assertEqual((result["outbound_bandwidth"], result["inbound_bandwidth"]), (30, 30))
+        self.assertEqual(result["efficiency"], 0.5)
+
+    def test_offsets_are_relative_to_the_first_signal(self):
+        outbound = CorridorCoordinator(inbound_weight=0).solve([0.5] * 3, [20, 30], 60, 60)
+        self.assertEqual(outbound["offsets"], [0, 20, 50])
+        self.assertEqual(outbound["outbound_bandwidth"], 30)
+
+        # An inbound wave starts at the last signal, yet is still reported from signal 0
+        inbound = CorridorCoordinator(inbound_weight=10).solve([0.5] * 3, [20, 30], 60, 60)
+        self.assertEqual(inbound["offsets"], [0, 40, 10])
+        self.assertEqual(inbound["inbound_bandwidth"], 30)
+
+    def test_one_travel_time_per_link(self):
+        for travel_times in ([], [20, 30]):
+            with self.assertRaises(ValueError):
+                CorridorCoordinator().solve([0.5, 0.5], travel_times, 60)
+
+
+class CorridorSplitTest(unittest.TestCase):
+    """The corridor's configured arterial share sets the split of its signal plans"""
+
+    def test_configured_share_changes_the_plan(self):
+        os.environ.setdefault("ENABLE_RTSP", "false")
+        import server
+
+        corridor = server.CORRIDORS["Accra"]["n1_achimota"]
+        self.assertNotEqual(corridor["arterial_share"], server.ARTERIAL_SHARE)
+
+        def plan(share):
+            result = asyncio.run(server.coordinate_corridor("Accra", corridor["intersections"], arterial_share=share))
+            return [(s["arterial_green"], s["cross_street_green"]) for s in result["signals"]]
+
+        default, configured = plan(server.ARTERIAL_SHARE), plan(corridor["arterial_share"])
+        self.assertNotEqual(configured, default)
+        # More of the flow on the arterial gives it a larger share of each cycle
+        self.assertGreater(*[sum(a for a, _ in p) / sum(a + c for a, c in p) for p in (configured, default)])
+
+        from fastapi.testclient import TestClient
+        with mock.patch.object(server, "coordinate_corridor", mock.AsyncMock(return_value={})) as coordinate:
+            response = TestClient(server.app).post("/api/signals/coordinate/Accra/n1_achimota")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(coordinate.call_args.kwargs["arterial_share"], corridor["arterial_share"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""The vectorized forecast feature matrix must match the per-row features."""
+import os
+import sys
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("ENABLE_RTSP", "false")
+
+import server  # noqa: E402
+
+
+class ForecastFeaturesTest(unittest.TestCase):
+
+    def test_matrix_matches_row_builder(self):
+        intersections = server.get_intersections("Kumasi")[:3]
+        timestamps = pd.date_range(datetime(2024, 3, 8, 16, 0), periods=40, freq="15min")
+
+        matrix = server.build_forecast_features("Kumasi", intersections, timestamps)
+        rows = pd.DataFrame([
+            server.build_prediction_features("Kumasi", intersection, t.to_pydatetime())
+            for intersection in intersections for t in timestamps
+        ], columns=server.FEATURE_COLUMNS)
+
+        self.assertEqual(list(matrix.columns), server.FEATURE_COLUMNS)
+        pd.testing.assert_frame_equal(matrix, rows, check_dtype=False)
+
+
+if __name__ == "__main__":
+    unittest.main()
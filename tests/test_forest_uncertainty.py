@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""Per-tree forest outputs must reproduce the forests' own predictions."""
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from forest_uncertainty import ForestLeafTable, classification_summary, regression_summary  # noqa: E402
+
+
+class ForestUncertaintyTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.X = rng.normal(size=(300, 4))
+        self.y = self.X[:, 0] * 3 + rng.normal(size=300)
+
+    def test_regressor_mean_matches_predict(self):
+        forest = RandomForestRegressor(n_estimators=20, max_depth=5, random_state=0).fit(self.X, self.y)
+        per_tree = ForestLeafTable(forest).per_tree(self.X[:50])
+
+        self.assertEqual(per_tree.shape, (50, 20))
+        summary = regression_summary(per_tree, (0.1, 0.9))
+        np.testing.assert_allclose(summary["mean"], forest.predict(self.X[:50]))
+        self.assertTrue(np.all(summary["low"] <= summary["high"]))
+
+    def test_classifier_probabilities_match_predict_proba(self):
+        labels = np.digitize(self.y, [-2, 0, 2])
+        forest = RandomForestClassifier(n_estimators=20, max_depth=5, random_state=0).fit(self.X, labels)
+        summary = classification_summary(ForestLeafTable(forest).per_tree(self.X[:50]))
+
+        np.testing.assert_allclose(summary["probabilities"], forest.predict_proba(self.X[:50]))
+        np.testing.assert_array_equal(forest.classes_[summary["predicted"]], forest.predict(self.X[:50]))
+        self.assertTrue(np.all((summary["agreement"] > 0) & (summary["agreement"] <= 1)))
+
+
+if __name__ == "__main__":
+    unittest.main()
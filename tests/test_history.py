@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""Traffic history: keyset pages and streaming LTTB downsampling."""
+import asyncio
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from bson import ObjectId
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import history  # noqa: E402
+
+try:
+    from mongomock_motor import AsyncMongoMockClient
+except ImportError:  # test dependency (requirements.txt)
+    AsyncMongoMockClient = None
+
+
+async def aiter(documents):
+    for document in documents:
+        yield document
+
+
+async def collect(lines):
+    return [json.loads(line) async for line in lines]
+
+
+def keyset(documents, after, limit):
+    """What Mongo returns for history_filter's keyset condition, sorted by (timestamp, _id)"""
+    ordered = sorted(documents, key=lambda d: (d["timestamp"], d["_id"]))
+    if after:
+        ordered = [d for d in ordered if (d["timestamp"], d["_id"]) > after]
+    return ordered[:limit]
+
+
+class HistoryTest(unittest.TestCase):
+
+    def test_keyset_pages_cover_every_document_once(self):
+        start = datetime(2024, 3, 1)
+        # Several documents share each timestamp, so _id breaks the ties
+        documents = [{"_id": ObjectId(), "timestamp": start + timedelta(minutes=5 * (n // 3)),
+                      "intersection_id": "ACC_001", "vehicle_count": n} for n in range(25)]
+
+        seen, after, pages = [], None, 0
+        while True:
+            lines = asyncio.run(collect(history.page_lines(aiter(keyset(documents, after, 7 + 1)), 7)))
+            pages += 1
+            seen += [line["vehicle_count"] for line in lines[:-1]]
+            if lines[-1]["next_cursor"] is None:
+                break
+            after = history.decode_cursor(lines[-1]["next_cursor"])
+
+        self.assertEqual(pages, 4)
+        self.assertEqual(seen, list(range(25)))
+        with self.assertRaises(ValueError):
+            history.decode_cursor("not-a-cursor")
+
+        query = history.history_filter("Accra", "ACC_001", start, start + timedelta(days=1), after)
+        self.assertEqual(query["$or"][1], {"timestamp": after[0], "_id": {"$gt": after[1]}})
+
+    def test_lttb_keeps_shape_in_requested_points(self):
+        start = datetime(2024, 3, 1)
+        end = start + timedelta(days=7)
+        documents = [{"_id": ObjectId(), "timestamp": start + timedelta(minutes=n),
+                      "average_speed": 5.0 if n == 4321 else 40.0 + (n % 7)} for n in range(7 * 24 * 60)]
+
+        lines = asyncio.run(collect(history.lttb_lines(aiter(documents), start, end, 100, "average_speed")))
+        points, summary = lines[:-1], lines[-1]
+
+        self.assertEqual(summary["count"], len(points))
+        self.assertLessEqual(len(points), 100)
+        self.assertGreater(len(points), 90)
+        self.assertEqual((points[0]["_id"], points[-1]["_id"]), (str(documents[0]["_id"]), str(documents[-1]["_id"])))
+        self.assertIn(5.0, [p["average_speed"] for p in points])
+        timestamps = [p["timestamp"] for p in points]
+        self.assertEqual(timestamps, sorted(set(timestamps)))
+
+
+@unittest.skipIf(AsyncMongoMockClient is None, "mongomock-motor is not installed")
+class HistoryEndpointTest(unittest.TestCase):
+    """Query times with a UTC offset against the naive UTC timestamps Mongo stores"""
+
+    START = datetime(2026, 10, 1)
+
+    @classmethod
+    def setUpClass(cls):
+        os.environ.setdefault("ENABLE_RTSP", "false")
+        import server
+        from fastapi.testclient import TestClient
+
+        cls.server = server
+        cls.original_client = server.client
+        server.client = AsyncMongoMockClient()
+        documents = [{"city": "Accra", "intersection_id": "ACC_001", "timestamp": cls.START + timedelta(minutes=5 * n),
+                      "vehicle_count": n, "average_speed": 40.0 + n % 7} for n in range(100)]
+        asyncio.run(server.db.traffic_data.insert_many(documents))
+        cls.client = TestClient(server.app)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.client = cls.original_client
+
+    def history(self, **params):
+        response = self.client.get("/api/traffic/history", params={"city": "Accra", "intersection_id": "ACC_001",
+                                                                   **params})
+        self.assertEqual(response.status_code, 200, response.text)
+        return [json.loads(line) for line in response.text.splitlines()]
+
+    def test_aware_times_in_every_mode(self):
+        bucket_pipeline = history.bucket_pipeline
+        for start, end in (("2026-10-01T00:00:00Z", "2026-10-01T04:00:00Z"),
+                           ("2026-10-01T00:00:00+00:00", "2026-10-01T04:00:00+00:00"),
+                           ("2026-10-01T02:00:00+02:00", "2026-10-01T06:00:00+02:00")):
+            page = self.history(start=start, end=end, limit=1000)
+            self.assertEqual([line["vehicle_count"] for line in page[:-1]], list(range(48)))
+
+            # mongomock cannot add to a date: leave out the stage labelling buckets with their start
+            label = lambda *args: [stage for stage in bucket_pipeline(*args) if "$addFields" not in stage]
+            with mock.patch.object(history, "bucket_pipeline", label):
+                buckets = self.history(start=start, end=end, points=4, method="average")
+            self.assertEqual(sum(bucket["count"] for bucket in buckets[:-1]), 48)
+
+            lttb = self.history(start=start, end=end, points=10, method="lttb")
+            self.assertEqual(lttb[-1]["count"], len(lttb) - 1)
+            self.assertEqual((lttb[0]["vehicle_count"], lttb[-2]["vehicle_count"]), (0, 47))
+
+    def test_aware_start_without_end(self):
+        page = self.history(start="2026-10-01T00:00:00Z", limit=1000)
+        self.assertEqual(len(page) - 1, 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Streaming incident detection against the hour-of-week baseline."""
+import asyncio
+import os
+import sys
+import unittest
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import analytics  # noqa: E402
+from incidents import IncidentDetector, IncidentFeed, IncidentMonitor  # noqa: E402
+
+try:
+    from mongomock_motor import AsyncMongoMockClient
+except ImportError:  # test dependency (requirements.txt)
+    AsyncMongoMockClient = None
+
+
+class FakeIncidents:
+
+    def __init__(self):
+        self.inserted, self.updated = [], []
+
+    async def insert_many(self, documents):
+        self.inserted += documents
+
+    async def update_one(self, query, update):
+        self.updated.append((query, update))
+
+
+class FakeDatabase:
+
+    def __init__(self):
+        self.incidents = FakeIncidents()
+
+
+class IncidentDetectorTest(unittest.TestCase):
+
+    def test_flags_only_sudden_changes(self):
+        n = 3000
+        rng = np.random.default_rng(7)
+        detector = IncidentDetector([f"I{i}" for i in range(n)])
+        positions = np.arange(n)
+        expected = np.array([np.full(n, 40.0), np.full(n, 50.0)])
+
+        def step(speed_factor=None):
+            observed = expected * rng.normal(1.0, 0.05, expected.shape)
+            if speed_factor is not None:
+                observed[0, :3] = expected[0, :3] * speed_factor
+            return detector.update(positions, observed, expected)
+
+        # Ordinary noise, including a one-off dip, never opens an incident
+        self.assertEqual(sum(len(step()) for _ in range(40)), 0)
+        self.assertEqual(step(0.4), [])
+
+        events = step(0.4)
+        self.assertEqual(sorted((e["intersection_id"], e["kind"], e["status"]) for e in events),
+                         [(f"I{i}", "speed_drop", "open") for i in range(3)])
+        self.assertEqual(step(0.4), [])
+
+        resolved = [step() for _ in range(5)]
+        self.assertEqual(sorted(e["intersection_id"] for batch in resolved for e in batch if e["status"] == "resolved"),
+                         ["I0", "I1", "I2"])
+
+    def test_monitor_stores_and_publishes(self):
+        registry = [{"id": "ACC_001", "name": "Circle"}, {"id": "ACC_002", "name": "Kaneshie"}]
+        baseline = {"vehicle_count": np.full((2, 168), 30.0), "average_speed": np.full((2, 168), 40.0)}
+
+        async def get_baseline(city):
+            return baseline
+
+        async def run():
+            feed = IncidentFeed()
+            monitor = IncidentMonitor({"Accra": registry}, get_baseline, feed, alpha=1.0, persistence=1, warmup=1)
+            queue = feed.subscribe()
+            db = FakeDatabase()
+            when = datetime(2024, 3, 4, 8)
+            await monitor.observe("Accra", [
+                {"intersection_id": "ACC_001", "timestamp": when, "vehicle_count": 31, "average_speed": 39.0},
+                {"intersection_id": "ACC_002", "timestamp": when, "vehicle_count": 140, "average_speed": 38.0},
+            ], db)
+            return monitor, queue, db
+
+        monitor, queue, db = asyncio.run(run())
+        incident = queue.get_nowait()
+        self.assertEqual((incident["intersection_id"], incident["kind"], incident["severity"]),
+                         ("ACC_002", "count_spike", "Critical"))
+        self.assertIn("Kaneshie: 140 vehicles (usually 30)", incident["message"])
+        self.assertEqual([i["incident_id"] for i in db.incidents.inserted], [incident["incident_id"]])
+        self.assertEqual(monitor.current("Accra"), [incident])
+        self.assertTrue(queue.empty())
+
+
+class BaselineTest(unittest.TestCase):
+
+    def test_unobserved_hours_fall_back(self):
+        monday = date(2024, 3, 4)
+        aggregate = analytics.DayAggregate(2)
+        aggregate.vehicles[0, 8], aggregate.count[0, 8] = 100, 2
+        aggregate.vehicles[1, 9], aggregate.count[1, 9] = 60, 1
+        baseline = analytics.hour_of_week_baseline(2, {monday: aggregate})["vehicle_count"]
+
+        self.assertEqual(baseline.shape, (2, 168))
+        self.assertEqual(baseline[0, 8], 50)             # Monday 08:00
+        self.assertEqual(baseline[0, 24 + 8], 50)        # Tuesday 08:00, from the same hour on any day
+        self.assertEqual(baseline[1, 8], 50)             # never observed at 08:00: city-wide mean
+        self.assertEqual(baseline[0, 9], 60)
+
+
+
+@unittest.skipIf(AsyncMongoMockClient is None, "mongomock-motor is not installed")
+class IncidentListTest(unittest.TestCase):
+
+    def test_limit_is_between_1_and_500(self):
+        os.environ.setdefault("ENABLE_RTSP", "false")
+        import server
+        from fastapi.testclient import TestClient
+
+        original = server.client
+        server.client = AsyncMongoMockClient()
+        try:
+            start = datetime(2026, 10, 1, 8)
+            asyncio.run(server.db.incidents.insert_many([
+                {"incident_id": f"inc{n}", "city": "Accra", "status": "open", "detected_at": start + timedelta(minutes=n)}
+                for n in range(3)]))
+            client = TestClient(server.app)
+            for limit in (-1, 0, 501):
+                self.assertEqual(client.get("/api/incidents/Accra", params={"limit": limit}).status_code, 422)
+            response = client.get("/api/incidents/Accra", params={"limit": 2})
+        finally:
+            server.client = original
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([i["incident_id"] for i in response.json()["incidents"]], ["inc2", "inc1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
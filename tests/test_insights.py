@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""Declarative insight rules: ranking, deduplication and per-snapshot caching."""
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from insights import InsightEngine  # noqa: E402
+from snapshots import SnapshotCache  # noqa: E402
+
+INTERSECTIONS = {"Accra": [{"id": "ACC_001", "name": "Circle"}, {"id": "ACC_002", "name": "Kaneshie"},
+                           {"id": "ACC_003", "name": "Achimota"}]}
+
+
+def record(intersection_id, level, speed, weather="Clear"):
+    return {"intersection_id": intersection_id, "congestion_level": level, "vehicle_count": 120,
+            "average_speed": speed, "weather_condition": weather}
+
+
+class InsightEngineTest(unittest.TestCase):
+
+    def engine(self, records):
+        self.takes = 0
+
+        def take(city):
+            self.takes += 1
+            return records
+
+        return InsightEngine(SnapshotCache(take, refresh_seconds=3600), INTERSECTIONS)
+
+    def test_ranked_and_deduplicated(self):
+        engine = self.engine([record("ACC_001", "Critical", 8, "Rainy"), record("ACC_002", "High", 15),
+                              record("ACC_003", "Low", 30)])
+        dashboard = [i["rule"] for i in engine.select("Accra", audience="dashboard", scope="city")]
+        self.assertEqual(dashboard, ["deploy_controllers", "issue_alerts", "signal_timing", "public_transport"])
+
+        circle = [i["rule"] for i in engine.select("Accra", subject="ACC_001")]
+        # Critical wins over heavy in the congestion group; other rules stand on their own
+        self.assertEqual(circle, ["critical_congestion", "crawling", "rain_congestion"])
+        route = engine.select("Accra", audience="route")
+        self.assertEqual(route[0]["text"], "Avoid Circle and Kaneshie if you can; they are the most congested right now.")
+
+    def test_otherwise_rule_and_cache(self):
+        engine = self.engine([record("ACC_001", "Low", 40), record("ACC_002", "Medium", 30)])
+        first = engine.select("Accra", audience="dashboard")
+        self.assertEqual([i["rule"] for i in first], ["all_clear"])
+        self.assertIs(engine.for_city("Accra")["insights"], engine.for_city("Accra")["insights"])
+        self.assertEqual(self.takes, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
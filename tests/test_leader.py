@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""Leader election between worker processes with an exclusive file lock."""
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import leader  # noqa: E402
+from leader import LeaderLock  # noqa: E402
+
+
+@unittest.skipIf(leader.fcntl is None, "no flock on this platform")
+class LeaderLockTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "leader.lock")
+
+    def test_second_acquirer_fails_while_the_first_holds_the_lock(self):
+        first, second = LeaderLock(self.path), LeaderLock(self.path)
+        self.assertTrue(first.try_acquire())
+        self.assertTrue(first.try_acquire())  # re-entrant for the holder
+        self.assertFalse(second.try_acquire())
+        self.assertFalse(second.is_leader)
+        with open(self.path) as f:
+            self.assertEqual(f.read(), str(os.getpid()))
+
+        first.release()
+        self.assertFalse(first.is_leader)
+        self.assertTrue(second.try_acquire())
+        second.release()
+
+    def test_other_process_takes_over_when_the_leader_exits(self):
+        held = LeaderLock(self.path)
+        self.assertTrue(held.try_acquire())
+
+        def child_acquires() -> bool:
+            pid = os.fork()
+            if pid == 0:
+                os._exit(0 if LeaderLock(self.path).try_acquire() else 1)
+            _, status = os.waitpid(pid, 0)
+            return os.WEXITSTATUS(status) == 0
+
+        self.assertFalse(child_acquires())
+        held.release()
+        self.assertTrue(child_acquires())
+
+
+if __name__ == "__main__":
+    unittest.main()
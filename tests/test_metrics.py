@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Prometheus exposition of the in-process metrics registry."""
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import metrics  # noqa: E402
+
+
+class MetricsExpositionTest(unittest.TestCase):
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = metrics.Registry()
+        latency = registry.histogram("demo_seconds", "Demo latency", ("route",), buckets=(0.1, 1.0))
+        series = latency.labels("/a")
+        for value in (0.05, 0.5, 0.5, 5.0):
+            series.observe(value)
+
+        text = registry.expose()
+        self.assertIn('demo_seconds_bucket{route="/a",le="0.1"} 1', text)
+        self.assertIn('demo_seconds_bucket{route="/a",le="1.0"} 3', text)
+        self.assertIn('demo_seconds_bucket{route="/a",le="+Inf"} 4', text)
+        self.assertIn('demo_seconds_count{route="/a"} 4', text)
+        self.assertIs(latency.labels("/a"), series)
+
+    def test_middleware_labels_requests_by_route_template(self):
+        class Route:
+            path = "/api/items/{item_id}"
+            methods = {"GET"}
+
+        class App:
+            routes = [Route()]
+
+        async def endpoint(scope, receive, send):
+            scope["route"] = Route()
+            await send({"type": "http.response.start", "status": 404})
+
+        async def send(message):
+            pass
+
+        middleware = metrics.MetricsMiddleware(endpoint)
+        scope = {"type": "http", "method": "GET", "app": App()}
+        asyncio.run(middleware(scope, None, send))
+
+        text = metrics.REGISTRY.expose()
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="/api/items/{item_id}"} 1', text)
+        self.assertIn('http_requests_total{method="GET",route="/api/items/{item_id}",status="404"} 1', text)
+
+
+if __name__ == "__main__":
+    unittest.main()
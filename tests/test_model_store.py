@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Versioned model store: publishing, loading and hot-swapping model sets."""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("ENABLE_RTSP", "false")
+
+from model_store import ModelStore  # noqa: E402
+
+
+class FakeEngine:
+    """The engine interface the store uses, with a JSON file for the models"""
+
+    def __init__(self, weights=None):
+        self.weights = weights
+        self.model_accuracy = {"traffic_mae": 1.5}
+        self.model_version = None
+        self.calibration = {}
+
+    def save_models(self, city, directory):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"{city.lower()}_models.json"), "w") as f:
+            json.dump(self.weights, f)
+        return True
+
+    def load_models(self, city, directory):
+        try:
+            with open(os.path.join(directory, f"{city.lower()}_models.json")) as f:
+                self.weights = json.load(f)
+        except FileNotFoundError:
+            return False
+        return True
+
+
+class ModelStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.store = ModelStore(self.root.name, keep_versions=2)
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    def test_publish_then_load(self):
+        version = self.store.publish("Accra", FakeEngine([1, 2, 3]), {"calibration": {"traffic": 0.9}})
+        manifest = self.store.current_version("Accra")
+        self.assertEqual(manifest["version"], version)
+
+        engine = FakeEngine()
+        self.assertTrue(self.store.load("Accra", engine))
+        self.assertEqual((engine.weights, engine.model_version), ([1, 2, 3], version))
+        self.assertEqual((engine.model_accuracy, engine.calibration), ({"traffic_mae": 1.5}, {"traffic": 0.9}))
+        self.assertFalse(self.store.load("Kumasi", FakeEngine()))
+
+    def test_concurrent_publishers(self):
+        versions, errors = [], []
+
+        def publish(n):
+            try:
+                versions.append(self.store.publish("Accra", FakeEngine([n])))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=publish, args=(n,)) for n in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(versions), 16)
+        self.assertEqual(sorted(p.name for p in Path(self.root.name).iterdir() if p.is_file()),
+                         [".accra.lock", "accra_manifest.json"])
+        # Pruned to the newest two and the current one, and nothing left staged
+        current = self.store.current_version("Accra")["version"]
+        self.assertIn(current, versions)
+        kept = sorted(p.name for p in Path(self.root.name, "accra").iterdir())
+        self.assertEqual(kept, sorted(set(sorted(versions)[-2:] + [current])))
+        engine = FakeEngine()
+        self.assertTrue(self.store.load("Accra", engine))
+
+
+class HotSwapTest(unittest.TestCase):
+
+    def setUp(self):
+        import server
+
+        self.server = server
+        self.root = tempfile.TemporaryDirectory()
+        self.original = (server.model_store, dict(server.ml_engines))
+        server.model_store = ModelStore(self.root.name)
+
+    def tearDown(self):
+        self.server.model_store, engines = self.original
+        self.server.ml_engines.clear()
+        self.server.ml_engines.update(engines)
+        self.root.cleanup()
+
+    def test_new_manifest_version_is_swapped_in(self):
+        server = self.server
+        serving = server.TrafficMLEngine()
+        server.ml_engines["Kumasi"] = serving
+        self.assertFalse(asyncio.run(server.reload_models_if_published("Kumasi")))
+
+        trained = server.TrafficMLEngine()
+        self.assertTrue(trained.train_models("Kumasi", days=2))
+        self.assertTrue(asyncio.run(server.reload_models_if_published("Kumasi")))
+        swapped = server.ml_engines["Kumasi"]
+        self.assertIsNot(swapped, serving)
+        self.assertTrue(swapped.is_trained)
+        self.assertEqual(swapped.model_version, trained.model_version)
+
+        # The same version again is not reloaded
+        self.assertFalse(asyncio.run(server.reload_models_if_published("Kumasi")))
+        self.assertIs(server.ml_engines["Kumasi"], swapped)
+
+
+if __name__ == "__main__":
+    unittest.main()
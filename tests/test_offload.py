@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""Bounded offload pools and the event loop watchdog."""
+import asyncio
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from offload import LoopWatchdog, offload  # noqa: E402
+
+
+@offload("cpu")
+def current_thread_name():
+    return threading.current_thread().name
+
+
+def block_loop(seconds):
+    time.sleep(seconds)
+
+
+class OffloadTest(unittest.TestCase):
+
+    def test_offloaded_call_runs_on_its_pool(self):
+        name = asyncio.run(current_thread_name())
+        self.assertTrue(name.startswith("offload-cpu"))
+        self.assertEqual(current_thread_name.__wrapped__(), threading.current_thread().name)
+
+    def test_watchdog_captures_blocking_stack(self):
+        watchdog = LoopWatchdog(threshold=0.1, interval=0.02)
+
+        async def main():
+            task = asyncio.create_task(watchdog.run())
+            await asyncio.sleep(0.05)
+            block_loop(0.3)
+            await asyncio.sleep(0.05)
+            task.cancel()
+
+        asyncio.run(main())
+        self.assertEqual(len(watchdog.stalls), 1)
+        stall = watchdog.stalls[0]
+        self.assertIn("in block_loop", stall["stack"])
+        self.assertGreaterEqual(stall["duration_ms"], 250)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""Incremental model updates from observed traffic."""
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("ENABLE_RTSP", "false")
+
+import server  # noqa: E402
+from model_store import ModelStore  # noqa: E402
+
+
+class OnlineUpdateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store_dir = tempfile.TemporaryDirectory()
+        self.original_store = server.model_store
+        server.model_store = ModelStore(self.store_dir.name)
+
+    def tearDown(self):
+        server.model_store = self.original_store
+        self.store_dir.cleanup()
+
+    def test_update_grows_models_and_publishes(self):
+        engine = server.TrafficMLEngine()
+        self.assertTrue(engine.train_models("Kumasi", days=2))
+        base_version = engine.model_version
+        trees_before = len(engine.models["speed"].estimators_)
+        stages_before = engine.models["traffic"].n_estimators
+
+        start = datetime(2024, 5, 6, 6, 0)
+        records = []
+        for minute in range(0, 240, 5):
+            for n, record in enumerate(server.generate_realistic_traffic_data("Kumasi")):
+                record["timestamp"] = start + timedelta(minutes=minute)
+                record["congestion_level"] = ["Low", "Medium", "High", "Critical"][(minute // 5 + n) % 4]
+                records.append(record)
+
+        frame = server.observations_to_frame("Kumasi", records)
+        self.assertEqual(list(frame.columns[:len(server.FEATURE_COLUMNS)]), server.FEATURE_COLUMNS)
+        self.assertTrue(engine.update_models("Kumasi", frame, records[-1]["timestamp"]))
+
+        self.assertEqual(len(engine.models["speed"].estimators_), trees_before + server.ONLINE_TREES_PER_UPDATE)
+        self.assertEqual(engine.models["traffic"].n_estimators, stages_before + server.ONLINE_STAGES_PER_UPDATE)
+        manifest = server.model_store.current_version("Kumasi")
+        self.assertEqual(manifest["version"], engine.model_version)
+        self.assertEqual(manifest["online_update"]["base_version"], base_version)
+        self.assertEqual(manifest["observations_through"], records[-1]["timestamp"].isoformat())
+
+        reloaded = server.TrafficMLEngine()
+        self.assertTrue(server.model_store.load("Kumasi", reloaded))
+        prediction = reloaded.predict_traffic(server.build_prediction_features("Kumasi", server.KUMASI_INTERSECTIONS[0]))
+        self.assertTrue(0 <= prediction["confidence_score"] <= 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
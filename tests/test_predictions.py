@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""Prediction endpoints: horizons are bounded."""
+import os
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("ENABLE_RTSP", "false")
+
+import server  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+
+class PredictionHorizonTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = TestClient(server.app)
+
+    def test_minutes_ahead_are_bounded(self):
+        for path in ("/api/ml/predict/Accra/ACC_001", "/api/ml/batch-predict/Accra"):
+            for horizon in (-99999999, -1, server.MAX_HORIZON_HOURS * 60 + 1, 99999999999):
+                self.assertEqual(self.client.get(path, params={"horizon": horizon}).status_code, 422)
+            response = self.client.get(path, params={"horizon": server.MAX_HORIZON_HOURS * 60})
+            self.assertEqual(response.status_code, 200)
+
+    def test_hours_ahead_are_bounded_like_the_forecast(self):
+        path = "/api/traffic/predict/Accra/ACC_001"
+        for hours in (-5, 0, server.MAX_FORECAST_HOURS + 1, 999999999):
+            self.assertEqual(self.client.get(path, params={"hours_ahead": hours}).status_code, 422)
+        self.assertEqual(self.client.get(path, params={"hours_ahead": server.MAX_FORECAST_HOURS}).status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
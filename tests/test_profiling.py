@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""Folded-stack output of the on-demand profilers."""
+import sys
+import threading
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import profiling  # noqa: E402
+
+
+def busy_loop(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class ProfilingTest(unittest.TestCase):
+
+    def test_cpu_profile_finds_busy_thread(self):
+        stop = threading.Event()
+        worker = threading.Thread(target=busy_loop, args=(stop,), name="busy")
+        worker.start()
+        try:
+            result = profiling.sample_cpu(0.2, interval=0.002)
+        finally:
+            stop.set()
+            worker.join()
+
+        busy = [stack for stack in result["stacks"] if stack.startswith("busy;")]
+        self.assertTrue(busy)
+        self.assertTrue(all("busy_loop (test_profiling.py:" in stack for stack in busy))
+        for line in profiling.collapsed(result["stacks"]).splitlines():
+            stack, weight = line.rsplit(" ", 1)
+            self.assertTrue(stack and int(weight) > 0)
+
+    def test_allocation_profile_weights_stacks_by_bytes(self):
+        held = []
+
+        def allocate():
+            held.append(bytearray(2 * 1024 * 1024))
+
+        timer = threading.Timer(0.05, allocate)
+        timer.start()
+        result = profiling.trace_allocations(0.3)
+        timer.join()
+
+        self.assertGreaterEqual(max(result["stacks"].values()), 2 * 1024 * 1024)
+        self.assertTrue(result["top"][0]["location"].endswith("test_profiling.py:" + str(allocate.__code__.co_firstlineno + 1)))
+
+
+if __name__ == "__main__":
+    unittest.main()
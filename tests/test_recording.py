@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Recording logs and the seeded traffic clock used for deterministic replay."""
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import recording  # noqa: E402
+
+
+class RecordingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "run.tlog")
+
+    def test_log_round_trip_and_truncated_tail(self):
+        when = datetime(2024, 3, 4, 8, 15)
+        writer = recording.RecordWriter(self.path, seed=7)
+        writer.write("observations", {"city": "Accra", "records": [
+            {"intersection_id": "ACC_001", "timestamp": when, "vehicle_count": 42, "average_speed": 31.5}]})
+        writer.write("request", {"method": "GET", "path": "/api/traffic/current/Accra", "query": "",
+                                 "content_type": "", "body": b""})
+        writer.close()
+
+        events = list(recording.read_records(self.path))
+        self.assertEqual([e["kind"] for _, e in events], ["header", "observations", "request"])
+        self.assertEqual(events[0][1]["seed"], 7)
+        self.assertEqual(events[1][1]["records"][0]["timestamp"], when)
+        self.assertEqual([offset for offset, _ in events], sorted(offset for offset, _ in events))
+
+        import gzip
+        with gzip.open(self.path) as f:
+            data = f.read()
+        with gzip.open(self.path, "wb") as f:
+            f.write(data[:-5])
+        self.assertEqual(len(list(recording.read_records(self.path))), 2)
+
+    def test_middleware_records_and_forwards_the_body(self):
+        writer = recording.RecordWriter(self.path)
+        received = []
+
+        async def app(scope, receive, send):
+            received.append((await receive())["body"])
+
+        async def main():
+            middleware = recording.RecordingMiddleware(app, writer)
+            chunks = [{"type": "http.request", "body": b'{"city":', "more_body": True},
+                      {"type": "http.request", "body": b' "Accra"}', "more_body": False}]
+
+            async def receive():
+                return chunks.pop(0)
+
+            await middleware({"type": "http", "method": "POST", "path": "/api/route/optimize",
+                              "query_string": b"x=1", "headers": [(b"content-type", b"application/json")]},
+                             receive, None)
+
+        asyncio.run(main())
+        writer.close()
+        (_, request), = [e for e in recording.read_records(self.path) if e[1]["kind"] == "request"]
+        self.assertEqual(received, [b'{"city": "Accra"}'])
+        self.assertEqual((request["path"], request["query"], request["content_type"], request["body"]),
+                         ("/api/route/optimize", "x=1", "application/json", b'{"city": "Accra"}'))
+
+    def test_process_recorder_opens_one_log_per_process(self):
+        template = os.path.join(os.path.dirname(self.path), "run-{pid}.tlog")
+        recorder = recording.ProcessRecorder(template, seed=7)
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), [])  # nothing opened before the first event
+        recorder.write("request", {"path": "/api/parent"})
+
+        pid = os.fork()
+        if pid == 0:  # a forked worker writes and closes its own log, not the parent's
+            recorder.write("request", {"path": "/api/child"})
+            recorder.close()
+            os._exit(0)
+        os.waitpid(pid, 0)
+        recorder.write("request", {"path": "/api/parent"})
+        recorder.close()
+
+        paths = lambda p: [e["path"] for _, e in recording.read_records(template.format(pid=p))
+                           if e["kind"] == "request"]
+        self.assertEqual(paths(os.getpid()), ["/api/parent", "/api/parent"])
+        self.assertEqual(paths(pid), ["/api/child"])
+
+    def test_seeded_clock_is_reproducible(self):
+        clock = recording.TrafficClock(seed=7)
+        draws = [clock.random("traffic", "Accra", "08:15").uniform(0, 1) for _ in range(2)]
+        self.assertEqual(draws[0], draws[1])
+        self.assertNotEqual(draws[0], clock.random("traffic", "Kumasi", "08:15").uniform(0, 1))
+
+        when = datetime(2024, 3, 4, 17, 30)
+        with recording.at_time(when):
+            self.assertEqual(clock.now(), when)
+        self.assertNotEqual(clock.now(), when)
+
+
+    def test_ml_insights_follow_the_replayed_time(self):
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:  # test dependency (requirements.txt)
+            self.skipTest("mongomock-motor is not installed")
+        os.environ.setdefault("ENABLE_RTSP", "false")
+        import server
+
+        original = server.client
+        server.client = AsyncMongoMockClient()
+        try:
+            with recording.at_time(datetime(2024, 3, 4, 7, 30)):
+                insights = asyncio.run(server.get_ml_insights("Accra", 2))
+        finally:
+            server.client = original
+        self.assertEqual((insights["timestamp"], insights["generated_at"]), ("2024-03-04T07:30:00",) * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Stream supervisor restarts of FFmpeg processes."""
+import asyncio
+import os
+import sys
+import types
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("ENABLE_RTSP", "false")
+
+import roles  # noqa: E402
+from roles import RestartBackoff  # noqa: E402
+
+
+class RestartBackoffTest(unittest.TestCase):
+
+    def test_backs_off_while_the_process_dies_young(self):
+        backoff = RestartBackoff(5, max_seconds=60, healthy_seconds=30)
+        now, delays = 0.0, []
+        for _ in range(6):
+            self.assertTrue(backoff.ready("cam1", now))
+            backoff.started("cam1", now)
+            now += 1  # exits a second after starting
+            delays.append(backoff.stopped("cam1", now))
+            self.assertFalse(backoff.ready("cam1", now))
+            now += delays[-1]
+        self.assertEqual(delays, [10, 20, 40, 60, 60, 60])
+        self.assertTrue(backoff.ready("cam2", now))  # other cameras are not affected
+
+    def test_a_healthy_run_resets_the_backoff(self):
+        backoff = RestartBackoff(5, healthy_seconds=30)
+        backoff.started("cam1", 0)
+        self.assertEqual(backoff.stopped("cam1", 1), 10)
+        backoff.started("cam1", 11)
+        self.assertEqual(backoff.stopped("cam1", 100), 0)
+        self.assertTrue(backoff.ready("cam1", 100))
+        backoff.started("cam1", 100)
+        self.assertEqual(backoff.stopped("cam1", 101), 10)
+
+    def test_failed_starts_back_off_too(self):
+        backoff = RestartBackoff(5)
+        self.assertEqual([backoff.stopped("cam1", 0) for _ in range(3)], [10, 20, 40])
+
+
+class AnalyzerTest(unittest.TestCase):
+
+    def test_snapshots_are_stored_as_synthetic(self):
+        stored = {}
+
+        async def ingest_observations(city, records):
+            stored[city] = records
+
+        async def ensure_simulated_day(city):
+            pass
+
+        server = types.SimpleNamespace(
+            ml_engines={"Accra": None, "Kumasi": None}, ingest_observations=ingest_observations,
+            ensure_simulated_day=ensure_simulated_day,
+            generate_realistic_traffic_data=lambda city: [{"city": city, "vehicle_count": 10}])
+        asyncio.run(roles.record_traffic_snapshots(server))
+        self.assertEqual(sorted(stored), ["Accra", "Kumasi"])
+        self.assertTrue(all(r["synthetic"] and "timestamp" in r for records in stored.values() for r in records))
+
+
+class ExitedProcess:
+    returncode = 1
+
+    def poll(self):
+        return self.returncode
+
+    def terminate(self):
+        pass
+
+
+class StreamSupervisorTest(unittest.TestCase):
+
+    def test_process_that_exits_immediately_is_not_restarted_every_check(self):
+        import server
+
+        starts = []
+
+        def start_hls_stream(cam, restart=False):
+            starts.append(cam["id"])
+            return ExitedProcess()
+
+        original = (server.cameras, server.start_hls_stream, os.environ.get("STREAM_CHECK_SECONDS"))
+        server.cameras = [{"id": "cam1", "source_rtsp": "rtsp://10.0.0.10/stream"}]
+        server.start_hls_stream = start_hls_stream
+        os.environ["STREAM_CHECK_SECONDS"] = "0.01"
+        try:
+            async def main():
+                with self.assertRaises(asyncio.TimeoutError):
+                    await asyncio.wait_for(roles.run_stream_supervisor(), 0.6)
+            asyncio.run(main())
+        finally:
+            server.cameras, server.start_hls_stream = original[:2]
+            if original[2] is None:
+                os.environ.pop("STREAM_CHECK_SECONDS")
+            else:
+                os.environ["STREAM_CHECK_SECONDS"] = original[2]
+
+        # Restarts after 0.02, 0.04, 0.08, 0.16 and 0.32 s, not one per 0.01 s check
+        self.assertLessEqual(len(starts), 7)
+        self.assertGreaterEqual(len(starts), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
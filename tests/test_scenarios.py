@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""What-if scenarios: validation, comparison and runs shared by hash."""
+import asyncio
+import sys
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import scenarios  # noqa: E402
+
+NETWORK = {
+    "intersections": [
+        {"id": "A", "name": "A", "lat": 5.600, "lng": -0.200},
+        {"id": "B", "name": "B", "lat": 5.606, "lng": -0.200},
+        {"id": "C", "name": "C", "lat": 5.612, "lng": -0.200},
+    ],
+    "corridors": {"main": {"name": "Main", "intersections": ["A", "B", "C"]}},
+    "dt": 5.0,
+}
+START = datetime(2024, 3, 4, 16)
+
+
+class ScenarioTest(unittest.TestCase):
+
+    def test_interventions_are_validated(self):
+        compiled = scenarios.compile_interventions(NETWORK, [
+            {"type": "lane_closure", "from": "B", "to": "A", "lanes": 1, "both_directions": True},
+            {"type": "demand", "multiplier": 1.5},
+            {"type": "demand", "intersection_id": "C", "multiplier": 2},
+        ])
+        self.assertEqual(compiled["lane_overrides"], {("B", "A"): 1, ("A", "B"): 1})
+        self.assertEqual(compiled["demand_scale"], {"A": 1.5, "B": 1.5, "C": 3.0})
+
+        for invalid in ({"type": "lane_closure", "from": "A", "to": "C"},
+                        {"type": "signal_timing", "intersection_id": "A",
+                         "timing": {"cycle_length": 60, "north_south_green": 40, "east_west_green": 20}},
+                        {"type": "special_event", "intersection_id": "Z", "multiplier": 2},
+                        {"type": "flood"}):
+            with self.assertRaises(ValueError):
+                scenarios.compile_interventions(NETWORK, [invalid])
+
+    def test_closure_worsens_delay(self):
+        baseline = scenarios.run_scenario({"network": NETWORK, "start": START, "hours": 1, "seed": 1,
+                                           "interventions": []})
+        closed = scenarios.run_scenario({"network": NETWORK, "start": START, "hours": 1, "seed": 1, "interventions": [
+            {"type": "lane_closure", "from": "A", "to": "B", "lanes": 1, "both_directions": True},
+            {"type": "special_event", "intersection_id": "A", "multiplier": 3},
+        ]})
+        change = scenarios.compare(closed, baseline)
+        self.assertGreater(change["delay_change_pct"], 0)
+        self.assertEqual(set(closed["intersections"]), {"A", "B", "C"})
+
+    def test_identical_runs_are_shared(self):
+        calls = []
+
+        async def run(spec):
+            calls.append(spec["interventions"])
+            await asyncio.sleep(0.01)
+            delay = 10.0 + 5 * len(spec["interventions"])
+            return {"kpis": {"total_delay_vehicle_hours": delay, "average_delay_seconds": delay,
+                             "throughput_vehicles": 1000.0, "average_queue_vehicles": delay}}
+
+        async def main():
+            service = scenarios.ScenarioService(run)
+            batch = [{"name": "event", "interventions": [{"type": "demand", "multiplier": 2}]},
+                     {"name": "same event", "interventions": [{"type": "demand", "multiplier": 2}]}]
+            first = service.submit("Accra", NETWORK, START, 1, 0, batch)
+            second = service.submit("Accra", NETWORK, START, 1, 0, batch[:1])
+            await asyncio.gather(*service._tasks)
+            third = service.submit("Accra", NETWORK, START, 1, 0, batch[:1])
+            await asyncio.gather(*service._tasks)
+            with self.assertRaises(ValueError):
+                service.submit("Accra", NETWORK, START, 1, 0, [{"name": "baseline", "interventions": []}])
+            return first, second, third
+
+        first, second, third = asyncio.run(main())
+        self.assertEqual(len(calls), 2)  # the baseline and the event, once each
+        self.assertEqual([j["status"] for j in (first, second, third)], ["completed"] * 3)
+        self.assertTrue(third["scenarios"][0]["cached"])
+        comparison = first["results"]["scenarios"][0]["compared_to_baseline"]
+        self.assertEqual((comparison["delay_change_pct"], comparison["throughput_change_pct"]), (50.0, 0.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Single-intersection signal timing: Webster plans and the simulated search."""
+import os
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from signal_optimizer import (  # noqa: E402
+    DEFAULT_SIGNAL_TIMING, LOST_TIME_PER_PHASE, MAX_CYCLE, MIN_CYCLE, MIN_GREEN,
+    SignalTimingOptimizer, degree_of_saturation,
+)
+
+
+class WebsterPlanTest(unittest.TestCase):
+
+    def test_cycle_grows_with_flow_within_bounds(self):
+        optimizer = SignalTimingOptimizer()
+        cycles = [optimizer.webster_plan(flow * 0.55, flow * 0.45)["cycle_length"]
+                  for flow in range(0, 4001, 250)]
+        self.assertEqual(cycles, sorted(cycles))
+        self.assertGreater(cycles[-1], cycles[0])
+        self.assertTrue(all(MIN_CYCLE <= c <= MAX_CYCLE + 1 for c in cycles))
+
+    def test_greens_follow_flow_ratio_and_fill_the_cycle(self):
+        plan = SignalTimingOptimizer().webster_plan(1200, 400)
+        self.assertGreater(plan["north_south_green"], plan["east_west_green"])
+        self.assertGreaterEqual(plan["east_west_green"], MIN_GREEN)
+        lost = 2 * LOST_TIME_PER_PHASE + plan["pedestrian_phase"]
+        self.assertAlmostEqual(plan["north_south_green"] + plan["east_west_green"] + lost,
+                               plan["cycle_length"], delta=1)
+
+    def test_one_sided_flow(self):
+        plan = SignalTimingOptimizer(lanes=1).webster_plan(900, 0)
+        self.assertEqual(plan["east_west_green"], MIN_GREEN)
+
+
+class OptimizeTest(unittest.TestCase):
+
+    def test_optimized_delay_not_worse_than_current(self):
+        optimizer = SignalTimingOptimizer(latency_budget_ms=10_000)
+        for ns_flow, ew_flow in ((1400, 500), (600, 600), (300, 1100)):
+            result = optimizer.optimize(ns_flow, ew_flow, DEFAULT_SIGNAL_TIMING)
+            improvement = result["expected_improvement"]
+            self.assertLessEqual(improvement["optimized_average_delay_s"],
+                                 improvement["current_average_delay_s"])
+            self.assertGreaterEqual(improvement["delay_reduction_percent"], 0)
+            timing = result["optimized_timing"]
+            self.assertTrue(MIN_CYCLE <= timing["cycle_length"] <= MAX_CYCLE)
+
+    def test_same_inputs_same_plan(self):
+        first = SignalTimingOptimizer(latency_budget_ms=10_000).optimize(1000, 700)
+        second = SignalTimingOptimizer(latency_budget_ms=10_000).optimize(1000, 700)
+        self.assertEqual(first["optimized_timing"], second["optimized_timing"])
+
+    def test_current_plan_runs_at_its_cycle_length(self):
+        optimizer = SignalTimingOptimizer(latency_budget_ms=10_000)
+        tight = {"cycle_length": 60, "north_south_green": 24, "east_west_green": 20, "pedestrian_phase": 8}
+        padded = {**tight, "cycle_length": 120}  # the same phases and 60 s of all-red
+
+        delays = [optimizer.optimize(700, 500, timing)["expected_improvement"]["current_average_delay_s"]
+                  for timing in (tight, padded)]
+        self.assertGreater(delays[1], delays[0] * 1.5)
+        self.assertAlmostEqual(degree_of_saturation(700, 500, padded), 2 * degree_of_saturation(700, 500, tight),
+                               delta=0.02)
+
+    def test_degree_of_saturation(self):
+        timing = {"north_south_green": 40, "east_west_green": 24, "pedestrian_phase": 8}
+        # Cycle 80 s: N-S capacity 3600 * 40/80 = 1800 veh/h
+        self.assertEqual(degree_of_saturation(900, 270, timing, lanes=2), 0.5)
+
+
+class SignalOptimizationEndpointTest(unittest.TestCase):
+
+    def test_phases_must_fit_the_cycle(self):
+        os.environ.setdefault("ENABLE_RTSP", "false")
+        import server
+        from fastapi.testclient import TestClient
+
+        client = TestClient(server.app)
+        path = "/api/signals/optimize/ACC_001?city=Accra"
+        timing = {"cycle_length": 85, "north_south_green": 40, "east_west_green": 30, "pedestrian_phase": 12}
+        self.assertEqual(client.post(path, json={"current_timing": timing}).status_code, 422)
+
+        timing["cycle_length"] = 40 + 30 + 12 + 2 * LOST_TIME_PER_PHASE
+        response = client.post(path, json={"current_timing": timing})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["current_timing"], timing)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""FFmpeg HLS commands per camera stream profile."""
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from camera_snapshots import latest_segment  # noqa: E402
+from stream_profiles import hls_command  # noqa: E402
+
+OUT = Path("/streams")
+SOURCE = "rtsp://10.0.0.10:554/stream"
+
+
+def option(cmd, name):
+    return cmd[cmd.index(name) + 1]
+
+
+class StreamProfileTest(unittest.TestCase):
+
+    def test_default_copies_the_source(self):
+        cmd = hls_command({"id": "cam1", "source_rtsp": SOURCE}, OUT)
+        self.assertEqual(cmd, ["ffmpeg", "-i", SOURCE, "-c:v", "copy", "-c:a", "aac", "-f", "hls",
+                               "-hls_time", "2", "-hls_list_size", "3", "-hls_flags", "delete_segments",
+                               "/streams/cam1.m3u8"])
+
+    def test_low_latency_ladder_decodes_once(self):
+        cam = {"id": "cam2", "source_rtsp": SOURCE,
+               "stream": {"low_latency": True, "renditions": ["240p", "1080p", "480p"]}}
+        cmd = hls_command(cam, OUT)
+
+        self.assertEqual(cmd.count("-i"), 1)
+        self.assertEqual(option(cmd, "-filter_complex"),
+                         "[0:v]split=3[v0][v1][v2];[v0]scale=-2:1080[out0];[v1]scale=-2:480[out1];"
+                         "[v2]scale=-2:240[out2]")
+        self.assertEqual(option(cmd, "-var_stream_map"), "v:0,name:1080p v:1,name:480p v:2,name:240p")
+        self.assertEqual(option(cmd, "-master_pl_name"), "cam2.m3u8")
+        self.assertEqual((option(cmd, "-hls_time"), option(cmd, "-tune")), ("1", "zerolatency"))
+        self.assertEqual(option(cmd, "-force_key_frames"), "expr:gte(t,n_forced*1)")
+        self.assertEqual(option(cmd, "-b:v:2"), "400k")
+
+    def test_invalid_options_are_rejected(self):
+        for stream in ({"renditions": ["4k"]}, {"segment_seconds": 0.1}, {"bitrate": 100}):
+            with self.assertRaises(ValueError):
+                hls_command({"id": "cam3", "source_rtsp": SOURCE, "stream": stream}, OUT)
+
+    def test_snapshots_follow_the_master_playlist(self):
+        out = Path(tempfile.mkdtemp())
+        (out / "cam2.m3u8").write_text("#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=5500000\ncam2_1080p.m3u8\n"
+                                      "#EXT-X-STREAM-INF:BANDWIDTH=440000\ncam2_240p.m3u8\n")
+        (out / "cam2_240p.m3u8").write_text("#EXTM3U\n#EXTINF:2.0,\ncam2_240p_7.ts\n#EXTINF:2.0,\ncam2_240p_8.ts\n")
+        self.assertEqual(latest_segment(out / "cam2.m3u8"), out / "cam2_240p_8.ts")
+
+
+if __name__ == "__main__":
+    unittest.main()
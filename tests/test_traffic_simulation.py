@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Cell transmission model: conservation, spillback, signals and speed."""
+import asyncio
+import os
+import sys
+import threading
+import time
+import unittest
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("ENABLE_RTSP", "false")
+
+import server  # noqa: E402
+import traffic_simulation as ts  # noqa: E402
+from recording import at_time  # noqa: E402
+
+MONDAY = datetime(2024, 3, 4)
+
+
+class TrafficSimulationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.network = ts.RoadNetwork(server.ACCRA_INTERSECTIONS, server.CORRIDORS["Accra"])
+
+    def test_day_is_fast_conserving_and_deterministic(self):
+        started = time.perf_counter()
+        result = ts.simulate(self.network, MONDAY, hours=24, record_every=300, seed=3)
+        elapsed = time.perf_counter() - started
+        print(f"\nCTM day, {self.network.cells} cells at {self.network.dt:.0f} s: {elapsed:.2f} s")
+        self.assertLess(elapsed, 10)
+
+        kpis = result["kpis"]
+        self.assertAlmostEqual(kpis["demand_vehicles"], kpis["throughput_vehicles"] + kpis["vehicles_in_network"], delta=2)
+        self.assertEqual(result["vehicle_count"].shape, (288, 5))
+        # Rush hour is slower and fuller than midday
+        rush, midday = 8 * 12 + 6, 12 * 12 + 6
+        self.assertLess(result["average_speed"][rush].mean(), result["average_speed"][midday].mean())
+        self.assertGreater(result["occupancy"][rush].mean(), 2 * result["occupancy"][midday].mean())
+
+        again = ts.simulate(self.network, MONDAY, hours=24, record_every=300, seed=3)
+        np.testing.assert_array_equal(result["vehicle_count"], again["vehicle_count"])
+
+    def test_lane_closure_spills_back_upstream(self):
+        # Circle (ACC_002) to 37 Military Hospital (ACC_001) on the Ring Road down to one lane
+        closed = ts.RoadNetwork(server.ACCRA_INTERSECTIONS, server.CORRIDORS["Accra"],
+                                lane_overrides={("ACC_002", "ACC_001"): 1})
+        base = ts.simulate(self.network, MONDAY.replace(hour=16), hours=3, record_every=600, seed=1)
+        worse = ts.simulate(closed, MONDAY.replace(hour=16), hours=3, record_every=600, seed=1)
+
+        self.assertGreater(worse["kpis"]["total_delay_vehicle_hours"], base["kpis"]["total_delay_vehicle_hours"])
+        circle = self.network.ids.index("ACC_002")
+        self.assertGreater(worse["queue"][:, circle].max(), base["queue"][:, circle].max())
+
+    def test_green_shares_follow_the_plan(self):
+        plans = ts.signal_plan_array(self.network, {"ACC_002": None})
+        # Five 83 s cycles of DEFAULT_SIGNAL_TIMING in 5 s steps: each phase is green 30 s per cycle
+        shares = ts.green_shares(plans, np.arange(0, 83 * 5, 5.0), 5.0)
+        np.testing.assert_allclose(shares[:, 0].sum(axis=0) * 5.0, [30 * 5, 30 * 5])
+        # Unsignalised is always green
+        np.testing.assert_allclose(shares[:, self.network.ids.index("ACC_002")], 1.0)
+
+    def test_observations_match_traffic_data(self):
+        result = ts.simulate(self.network, MONDAY.replace(hour=7), hours=1, record_every=900, seed=0)
+        records = ts.observation_records(result, "Accra", server.ACCRA_INTERSECTIONS, rows=range(1, 2))
+        self.assertEqual([r["intersection_id"] for r in records], self.network.ids)
+        self.assertEqual(set(records[0]), {"intersection_id", "city", "location", "vehicle_count", "average_speed",
+                                           "congestion_level", "weather_condition", "timestamp"})
+        frame = ts.observation_frame(result, server.ACCRA_INTERSECTIONS)
+        self.assertEqual(len(frame), 4 * 5)
+        self.assertTrue(set(frame["congestion_level"]) <= {"Low", "Medium", "High", "Critical"})
+
+
+class SimulatedDayTest(unittest.TestCase):
+
+    def test_day_is_simulated_once_off_the_event_loop(self):
+        calls = []
+
+        def simulated_day(city, day):
+            calls.append((city, day, threading.current_thread() is threading.main_thread()))
+            time.sleep(0.1)
+            server._simulated_days[city] = {"start": datetime.combine(day, datetime.min.time())}
+
+        async def requests():
+            # Concurrent requests wait for one simulation, and the loop keeps running meanwhile
+            ticks = 0
+
+            async def tick():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0.01)
+
+            ticker = asyncio.create_task(tick())
+            await asyncio.gather(*(server.ensure_simulated_day("Kumasi") for _ in range(5)))
+            ticker.cancel()
+            await server.ensure_simulated_day("Kumasi")
+            return ticks
+
+        cached = dict(server._simulated_days)
+        try:
+            with mock.patch.object(server, "TRAFFIC_SOURCE", "simulation"), \
+                    mock.patch.object(server, "simulated_day", simulated_day):
+                # The day is the traffic clock's, so a replay simulates the recorded day
+                with at_time(MONDAY.replace(hour=8)):
+                    ticks = asyncio.run(requests())
+        finally:
+            server._simulated_days.clear()
+            server._simulated_days.update(cached)
+
+        self.assertEqual(calls, [("Kumasi", MONDAY.date(), False)])
+        self.assertGreater(ticks, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
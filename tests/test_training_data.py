@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Incremental Parquet export of observations and training frames read back from it."""
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("ENABLE_RTSP", "false")
+
+import server  # noqa: E402
+from training_data import TrainingDataStore  # noqa: E402
+
+
+class FakeCursor:
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction):
+        return FakeCursor(sorted(self.docs, key=lambda d: d[key], reverse=direction < 0))
+
+    def __aiter__(self):
+        self._iter = iter(self.docs)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class FakeCollection:
+    """The find/find_one subset of a Motor collection used by the store"""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = []
+
+    def _match(self, query):
+        window = query.get("timestamp", {})
+        return [d for d in self.docs if d["city"] == query["city"]
+                and not (d.get("synthetic") and "synthetic" in query)
+                and d["timestamp"] >= window.get("$gte", datetime.min)
+                and d["timestamp"] < window.get("$lt", datetime.max)]
+
+    def find(self, query, projection=None):
+        self.queries.append(query)
+        return FakeCursor(self._match(query))
+
+    async def find_one(self, query, projection=None, sort=None):
+        matches = sorted(self._match(query), key=lambda d: d["timestamp"])
+        return matches[0] if matches else None
+
+
+class FakeDatabase:
+
+    def __init__(self, docs):
+        self.traffic_data = FakeCollection(docs)
+
+
+class TrainingDataStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.store = TrainingDataStore(self.root.name)
+        start = datetime(2024, 5, 6)
+        self.records = []
+        for hour in range(0, 72, 2):
+            for record in server.generate_realistic_traffic_data("Kumasi"):
+                record["timestamp"] = start + timedelta(hours=hour)
+                self.records.append(record)
+        self.db = FakeDatabase(self.records)
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    def test_exports_complete_days_once(self):
+        # 2024-05-08 is "today", so only the 6th and 7th are complete
+        rows = asyncio.run(self.store.sync_from_mongo(self.db, "Kumasi", today=date(2024, 5, 8)))
+        self.assertEqual(self.store.partitions("Kumasi"), [date(2024, 5, 6), date(2024, 5, 7)])
+        self.assertEqual(rows, len([r for r in self.records if r["timestamp"] < datetime(2024, 5, 8)]))
+
+        self.db.traffic_data.queries.clear()
+        rows = asyncio.run(self.store.sync_from_mongo(self.db, "Kumasi", today=date(2024, 5, 9)))
+        self.assertEqual(self.store.partitions("Kumasi")[-1], date(2024, 5, 8))
+        self.assertEqual([q["timestamp"]["$gte"] for q in self.db.traffic_data.queries], [datetime(2024, 5, 8)])
+        self.assertEqual(rows, len([r for r in self.records if r["timestamp"].date() == date(2024, 5, 8)]))
+
+    def test_synthetic_snapshots_are_not_exported(self):
+        for record in self.records:
+            record["synthetic"] = record["timestamp"] < datetime(2024, 5, 7)
+        rows = asyncio.run(self.store.sync_from_mongo(self.db, "Kumasi", today=date(2024, 5, 8)))
+        self.assertEqual(self.store.partitions("Kumasi"), [date(2024, 5, 7)])
+        self.assertEqual(rows, len([r for r in self.records if r["timestamp"].date() == date(2024, 5, 7)]))
+
+    def test_stored_features_match_documents(self):
+        asyncio.run(self.store.sync_from_mongo(self.db, "Kumasi", today=date(2024, 5, 9)))
+
+        projected = self.store.load("Kumasi", columns=["timestamp", "vehicle_count"], since=date(2024, 5, 7))
+        self.assertEqual(list(projected.columns), ["timestamp", "vehicle_count"])
+        self.assertEqual(len(projected), len([r for r in self.records if r["timestamp"] >= datetime(2024, 5, 7)]))
+
+        stored = server.observation_features("Kumasi", self.store.load("Kumasi"))
+        expected = server.observations_to_frame("Kumasi", self.records)
+        self.assertEqual(list(stored.columns), list(expected.columns))
+        pd.testing.assert_frame_equal(stored, expected, check_dtype=False)
+
+
+if __name__ == "__main__":
+    unittest.main()
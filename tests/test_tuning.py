@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""Successive-halving search and the tuned settings it stores for training."""
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import tuning  # noqa: E402
+from model_store import ModelStore  # noqa: E402
+
+
+class TuningTest(unittest.TestCase):
+
+    def test_halving_keeps_best_third_and_stores_winner(self):
+        rng = np.random.default_rng(0)
+        frame = pd.DataFrame(rng.normal(size=(1500, 3)), columns=["a", "b", "c"])
+        frame["average_speed"] = frame["a"] * 5 + rng.normal(size=1500)
+
+        report = tuning.tune(frame, ["a", "b", "c"], models=["speed"], n_candidates=9, eta=3, workers=2)
+        result = report["models"]["speed"]
+        rungs = [t["rung"] for t in result["trials"]]
+        self.assertEqual((rungs.count(0), rungs.count(1)), (9, 3))
+        final = [t for t in result["trials"] if t["rung"] == 1]
+        self.assertEqual(result["best"]["score"], max(t["score"] for t in final))
+        self.assertTrue(any(t["pareto"] for t in final))
+        self.assertTrue(all(t["single_row_ms"] > 0 and t["predict_us_per_row"] > 0 for t in final))
+
+        with tempfile.TemporaryDirectory() as root:
+            store = ModelStore(root)
+            store.save_tuning("Accra", {"models": {"traffic": {"best_params": {"max_depth": 3}}}})
+            store.save_tuning("Accra", report)
+            self.assertEqual(store.tuned_params("Accra"),
+                             {"traffic": {"max_depth": 3}, "speed": result["best_params"]})
+
+
+if __name__ == "__main__":
+    unittest.main()